@@ -0,0 +1,62 @@
+"""Атомарная публикация каталогов-артефактов (справочник, агрегаты, данные скоринга).
+
+Опубликованный путь — симлинк на скрытый каталог версии рядом с ним.
+Новая версия пишется целиком в свой каталог, затем симлинк подменяется
+одним os.replace: читатель видит либо старую версию, либо новую, без окна,
+когда пути нет. Предыдущая версия остаётся на диске до следующей публикации,
+чтобы читатель, уже разрешивший путь (resolve_dir), дочитал её файлы.
+"""
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+
+def _version_prefix(out_dir: str) -> str:
+    return f".{os.path.basename(os.path.abspath(out_dir))}-"
+
+
+def resolve_dir(out_dir: str) -> str:
+    """Каталог текущей версии: все файлы артефакта читаем из него, а не через симлинк."""
+    return os.path.realpath(out_dir)
+
+
+@contextmanager
+def publish_dir(out_dir: str):
+    """Отдаёт пустой каталог новой версии; по выходу без ошибки публикует его как out_dir."""
+    out_dir = os.path.abspath(out_dir)
+    parent = os.path.dirname(out_dir)
+    os.makedirs(parent, exist_ok=True)
+    version_dir = tempfile.mkdtemp(dir=parent, prefix=_version_prefix(out_dir))
+    try:
+        yield version_dir
+    except BaseException:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise
+    _switch(out_dir, version_dir)
+
+
+def _switch(out_dir: str, version_dir: str):
+    parent = os.path.dirname(out_dir)
+    prefix = _version_prefix(out_dir)
+    previous = None
+    if os.path.islink(out_dir):
+        previous = resolve_dir(out_dir)
+    elif os.path.exists(out_dir):
+        # Каталог старого формата (не симлинк) один раз становится версией
+        previous = os.path.join(parent, prefix + "legacy")
+        shutil.rmtree(previous, ignore_errors=True)
+        os.rename(out_dir, previous)
+
+    link = os.path.join(parent, f".{os.path.basename(out_dir)}.link-{os.getpid()}")
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, out_dir)
+
+    # Версии старше предыдущей уже никто не читает
+    keep = {resolve_dir(version_dir), resolve_dir(previous) if previous else None}
+    for name in os.listdir(parent):
+        path = os.path.join(parent, name)
+        if name.startswith(prefix) and not os.path.islink(path) and resolve_dir(path) not in keep:
+            shutil.rmtree(path, ignore_errors=True)
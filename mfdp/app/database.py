@@ -1,25 +1,161 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dotenv import load_dotenv
 import os
+import threading
 import time
 from sqlalchemy.exc import OperationalError
+from app.metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine
+from app.profiling import trace_engine
 
 load_dotenv()
 
 # Подключение к БД
 SQLALCHEMY_DATABASE_URL = f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
+ASYNC_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
 
-# Ждём, пока БД будет доступна
-engine = None
-for _ in range(10):
-    try:
-        engine = create_engine(SQLALCHEMY_DATABASE_URL)
-        break
-    except OperationalError:
-        print("Ожидание БД...")
-        time.sleep(1)
+# Настройки пула по ролям процесса; переопределяются через DB_<ROLE>_<PARAM> или DB_<PARAM>
+ROLE_DEFAULTS = {
+    "api": {"pool_size": 5, "max_overflow": 5, "statement_timeout": 5000},
+    "bot": {"pool_size": 2, "max_overflow": 2, "statement_timeout": 5000},
+    "worker": {"pool_size": 4, "max_overflow": 2, "statement_timeout": 10000},
+    # Импорт: одно соединение, долгий COPY не должен упираться в таймаут
+    "importer": {"pool_size": 1, "max_overflow": 1, "statement_timeout": 0},
+}
+COMMON_DEFAULTS = {"pool_recycle": 1800, "pool_timeout": 10, "pool_pre_ping": 1}
+
+_role = os.getenv("DB_ROLE", "api")
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
+_sessionmaker = sessionmaker(autocommit=False, autoflush=False)
+_async_sessionmaker = sessionmaker(
+    class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
+
+def configure(role: str):
+    """Выбирает роль процесса (api, bot, worker, importer) до первого подключения."""
+    global _role
+    if role not in ROLE_DEFAULTS:
+        raise ValueError(f"Неизвестная роль БД: {role}")
+    with _engine_lock:
+        if (_engine is not None or _async_engine is not None) and role != _role:
+            raise RuntimeError("Движок БД уже создан, роль менять поздно")
+        _role = role
+
+
+def _setting(name: str) -> int:
+    for key in (f"DB_{_role.upper()}_{name.upper()}", f"DB_{name.upper()}"):
+        if os.getenv(key) is not None:
+            return int(os.getenv(key))
+    return ROLE_DEFAULTS[_role].get(name, COMMON_DEFAULTS.get(name))
+
+
+def engine_options() -> dict:
+    connect_args = {"application_name": f"mfdp-{_role}"}
+    statement_timeout = _setting("statement_timeout")
+    if statement_timeout:
+        connect_args["options"] = f"-c statement_timeout={statement_timeout}"
+    return {
+        "pool_size": _setting("pool_size"),
+        "max_overflow": _setting("max_overflow"),
+        "pool_recycle": _setting("pool_recycle"),
+        "pool_timeout": _setting("pool_timeout"),
+        # Проверка соединения при выдаче из пула: после рестарта Postgres не ловим мёртвые сокеты
+        "pool_pre_ping": bool(_setting("pool_pre_ping")),
+        # Пул с замером ожидания соединения (db_pool_checkout_wait_seconds)
+        "poolclass": TimedQueuePool,
+        "connect_args": connect_args,
+    }
+
+
+def async_engine_options() -> dict:
+    options = engine_options()
+    connect_args = options.pop("connect_args")
+    # asyncpg принимает параметры сессии через server_settings
+    server_settings = {"application_name": connect_args["application_name"]}
+    statement_timeout = _setting("statement_timeout")
+    if statement_timeout:
+        server_settings["statement_timeout"] = str(statement_timeout)
+    options["connect_args"] = {"server_settings": server_settings}
+    options["poolclass"] = TimedAsyncQueuePool
+    return options
+
+
+def get_engine():
+    """Движок создаётся при первом обращении, один на процесс."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options())
+                instrument_engine(_engine)
+                trace_engine(_engine)
+    return _engine
+
+
+def get_async_engine():
+    """Асинхронный движок (asyncpg) для read-эндпоинтов, один на процесс."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                _async_engine = create_async_engine(
+                    ASYNC_DATABASE_URL, **async_engine_options()
+                )
+                instrument_engine(_async_engine)
+                trace_engine(_async_engine)
+    return _async_engine
+
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
+
+
+def SessionLocal(**kwargs):
+    return _sessionmaker(bind=get_engine(), **kwargs)
+
+
+def AsyncSessionLocal(**kwargs) -> AsyncSession:
+    return _async_sessionmaker(bind=get_async_engine(), **kwargs)
+
+
+def get_db():
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def wait_for_db(retries: int = 10, delay: float = 1):
+    # create_engine не подключается — проверяем реальным запросом
+    for _ in range(retries):
+        try:
+            with get_engine().connect() as connection:
+                connection.execute(text("SELECT 1"))
+            return
+        except OperationalError:
+            print("Ожидание БД...")
+            time.sleep(delay)
+    raise Exception("Database not available")
+
+
+def __getattr__(name):
+    # Совместимость: app.database.engine
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(name)
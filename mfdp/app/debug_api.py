@@ -1,13 +1,41 @@
-from fastapi import APIRouter
-from app.database import SessionLocal
+"""Отладочные эндпоинты; подключаются только с DEBUG_API=1.
+
+При заданном DEBUG_API_TOKEN каждый запрос должен нести заголовок
+X-Debug-Token. Профиль для flamegraph:
+curl -X POST 'localhost:8000/debug/profile?seconds=30' > api.folded
+flamegraph.pl api.folded > api.svg
+"""
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from sqlalchemy.orm import Session
+
+from app.database import get_db
 from app.models import UserRequest
+from app.profiling import (
+    DEBUG_API_TOKEN,
+    PROFILE_MAX_SECONDS,
+    PROFILE_SAMPLE_INTERVAL,
+    SLOW_REQUESTS_KEEP,
+    clear_slow_requests,
+    slow_requests,
+    start_profile,
+    stop_profile,
+)
+
 
-router = APIRouter(prefix="/debug", tags=["Debug"])
+def check_debug_token(x_debug_token: Optional[str] = Header(None)):
+    if DEBUG_API_TOKEN and not hmac.compare_digest(x_debug_token or "", DEBUG_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Нужен X-Debug-Token")
+
+
+router = APIRouter(prefix="/debug", tags=["Debug"], dependencies=[Depends(check_debug_token)])
 
 
 @router.get("/check_requests")
-def check_requests():
-    db = SessionLocal()
+def check_requests(db: Session = Depends(get_db)):
     requests = db.query(UserRequest).limit(5).all()
     return {
         "count": len(requests),
@@ -21,3 +49,47 @@ def check_requests():
             for r in requests
         ],
     }
+
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: Optional[float] = Query(None, gt=0),
+    requests: Optional[int] = Query(None, gt=0),
+    interval: float = Query(PROFILE_SAMPLE_INTERVAL, gt=0),
+    idle: bool = False,
+):
+    """Сэмплирует стеки процесса seconds секунд или до requests запросов.
+
+    Ответ — collapsed-стеки (flamegraph.pl, speedscope); idle=true — вместе
+    с ожидающими потоками. Дольше PROFILE_MAX_SECONDS профиль не идёт.
+    """
+    if seconds is None and requests is None:
+        seconds = 10
+    try:
+        profiler = start_profile(interval, requests, idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        await profiler.wait(min(seconds or PROFILE_MAX_SECONDS, PROFILE_MAX_SECONDS))
+    finally:
+        stop_profile()
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={
+            "X-Profile-Samples": str(profiler.samples),
+            "X-Profile-Requests": str(profiler.requests),
+            "X-Profile-Seconds": f"{profiler.elapsed:.3f}",
+        },
+    )
+
+
+@router.get("/slow_requests")
+def read_slow_requests(limit: int = Query(SLOW_REQUESTS_KEEP, ge=1)):
+    """Самые медленные недавние запросы: разбивка времени, SQL и стеки."""
+    return {"requests": slow_requests(limit)}
+
+
+@router.delete("/slow_requests")
+def delete_slow_requests():
+    clear_slow_requests()
+    return {"status": "cleared"}
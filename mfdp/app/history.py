@@ -0,0 +1,164 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.database import SessionLocal
+from app.models import UserRequest
+
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "500"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "1.0"))
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", "10000"))
+HISTORY_WRITE_RETRIES = 3
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Буферизованная запись истории запросов в user_requests.
+
+    События копятся в ограниченной очереди, фоновый поток пишет их
+    многострочными INSERT'ами по достижении batch_size или раз в
+    flush_interval секунд. Переполненная очередь — backpressure:
+    submit ждёт не дольше timeout и возвращает False.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = HISTORY_BATCH_SIZE,
+        flush_interval: float = HISTORY_FLUSH_INTERVAL,
+        max_queue: int = HISTORY_QUEUE_SIZE,
+        session_factory=SessionLocal,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="history-writer", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def submit(
+        self,
+        telegram_login: str,
+        requested_user_id: int,
+        request_type: str,
+        block: bool = True,
+        timeout: Optional[float] = 1.0,
+    ) -> bool:
+        # Время фиксируем в момент события, а не в момент записи пачки, —
+        # наивным UTC, как его сравнивает requests_api.naive_utc, в любом поясе хоста
+        event = {
+            "telegram_login": telegram_login,
+            "requested_user_id": requested_user_id,
+            "request_type": request_type,
+            "timestamp": datetime.now(timezone.utc).replace(tzinfo=None),
+        }
+        try:
+            self._queue.put(event, block=block, timeout=timeout)
+            return True
+        except queue.Full:
+            logging.warning(f"Очередь истории переполнена, запрос не сохранён: {event}")
+            return False
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Дописывает всё, что накопилось, и останавливает поток."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stopping.set()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            # Маркер только будит поток; при полной очереди он и так не спит
+            # и увидит флаг после текущей пачки
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def _run(self):
+        while True:
+            batch = []
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    event = self._queue.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    break
+                if event is _STOP:
+                    stop = True
+                    break
+                batch.append(event)
+            if batch:
+                self._write(batch)
+            if stop or self._stopping.is_set():
+                # Всё, что успели положить до остановки
+                rest = []
+                while True:
+                    try:
+                        event = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if event is not _STOP:
+                        rest.append(event)
+                for start in range(0, len(rest), self.batch_size):
+                    self._write(rest[start : start + self.batch_size])
+                return
+
+    def _write(self, batch):
+        for attempt in range(HISTORY_WRITE_RETRIES):
+            db = self.session_factory()
+            try:
+                # executemany → многострочный INSERT ... VALUES у psycopg2
+                db.execute(UserRequest.__table__.insert(), batch)
+                db.commit()
+                return
+            except Exception as e:
+                db.rollback()
+                logging.error(
+                    f"Ошибка записи истории ({len(batch)} событий), попытка {attempt + 1}: {e}"
+                )
+                time.sleep(0.5 * 2**attempt)
+            finally:
+                db.close()
+        logging.error(f"История не записана, потеряно событий: {len(batch)}")
+
+
+_writer: Optional[HistoryWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_history_writer() -> HistoryWriter:
+    """Общий для процесса писатель истории (запускается при первом обращении)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter().start()
+            atexit.register(_writer.close)
+        return _writer
+
+
+def close_history_writer():
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.close()
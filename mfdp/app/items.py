@@ -1,15 +1,179 @@
+import fcntl
+import json
+import os
+import sys
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
 import pandas as pd
-from typing import Dict
 
-ITEMS_MAPPING: Dict[int, Dict[str, str]] = {}
+from app.artifacts import publish_dir, resolve_dir
+
+ITEMS_PATH = "data/dict_items.xls"
+CATALOG_DIR = os.getenv("CATALOG_DIR", "data/catalog")
+
+UNKNOWN_CATEGORY = "Unknown"
+UNKNOWN_EMOJI = "❓"
+
+
+class Catalog:
+    """Справочник товаров поверх отсортированного массива PRODUCT_ID.
+
+    Категории и эмодзи интернированы в небольшие таблицы, для каждого товара
+    хранятся только их коды. Массивы открываются через mmap, поэтому все
+    воркеры gunicorn делят одни и те же страницы в page cache.
+    """
+
+    def __init__(
+        self,
+        product_ids: np.ndarray,
+        category_codes: np.ndarray,
+        emoji_codes: np.ndarray,
+        categories: List[str],
+        emojis: List[str],
+    ):
+        self.product_ids = product_ids
+        self.category_codes = category_codes
+        self.emoji_codes = emoji_codes
+        self.categories = categories
+        self.emojis = emojis
+
+    def __len__(self):
+        return len(self.product_ids)
+
+    def lookup(self, product_ids) -> np.ndarray:
+        """Позиции товаров в справочнике, -1 для отсутствующих."""
+        ids = np.asarray(product_ids, dtype=np.int64)
+        if not len(self.product_ids):
+            return np.full(len(ids), -1, dtype=np.int64)
+        pos = np.searchsorted(self.product_ids, ids)
+        pos = np.minimum(pos, len(self.product_ids) - 1)
+        return np.where(self.product_ids[pos] == ids, pos, -1)
+
+    def info(self, product_id: int) -> Dict[str, str]:
+        pos = self.lookup([product_id])[0]
+        if pos < 0:
+            return {"category": UNKNOWN_CATEGORY, "emoji": UNKNOWN_EMOJI}
+        return {
+            "category": self.categories[self.category_codes[pos]],
+            "emoji": self.emojis[self.emoji_codes[pos]],
+        }
+
+    def render(self, product_ids) -> List[str]:
+        """Строки "{emoji} {id} ({category})" для целого списка товаров."""
+        if not len(self.product_ids):
+            return [f"{UNKNOWN_EMOJI} {pid} ({UNKNOWN_CATEGORY})" for pid in product_ids]
+        pos = self.lookup(product_ids)
+        found = pos >= 0
+        safe = np.where(found, pos, 0)
+        categories = self.categories
+        emojis = self.emojis
+        result = []
+        for pid, ok, c, e in zip(
+            np.asarray(product_ids).tolist(),
+            found.tolist(),
+            self.category_codes[safe].tolist(),
+            self.emoji_codes[safe].tolist(),
+        ):
+            if ok:
+                result.append(f"{emojis[e]} {pid} ({categories[c]})")
+            else:
+                result.append(f"{UNKNOWN_EMOJI} {pid} ({UNKNOWN_CATEGORY})")
+        return result
+
+
+EMPTY_CATALOG = Catalog(
+    np.empty(0, dtype=np.int64),
+    np.empty(0, dtype=np.int32),
+    np.empty(0, dtype=np.int32),
+    [],
+    [],
+)
+
+CATALOG: Catalog = EMPTY_CATALOG
+
+
+def build_catalog(path: str = ITEMS_PATH, out_dir: str = CATALOG_DIR):
+    """Одноразовая конвертация XLS-справочника в бинарный артефакт."""
+    df = pd.read_excel(path, usecols=["PRODUCT_ID", "DEPARTMENT", "EMODZI"])
+    df = df.dropna(subset=["PRODUCT_ID"])
+    df["PRODUCT_ID"] = df["PRODUCT_ID"].astype(np.int64)
+    df = df.drop_duplicates("PRODUCT_ID", keep="last").sort_values("PRODUCT_ID")
+
+    category_codes, categories = pd.factorize(
+        df["DEPARTMENT"].fillna(UNKNOWN_CATEGORY).astype(str)
+    )
+    emoji_codes, emojis = pd.factorize(df["EMODZI"].fillna(UNKNOWN_EMOJI).astype(str))
+
+    # Читатели не видят полузаписанный артефакт: версия публикуется целиком
+    with publish_dir(out_dir) as tmp_dir:
+        np.save(os.path.join(tmp_dir, "product_ids.npy"), df["PRODUCT_ID"].to_numpy())
+        np.save(os.path.join(tmp_dir, "category_codes.npy"), category_codes.astype(np.int32))
+        np.save(os.path.join(tmp_dir, "emoji_codes.npy"), emoji_codes.astype(np.int32))
+        with open(os.path.join(tmp_dir, "tables.json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {"categories": list(categories), "emojis": list(emojis)},
+                f,
+                ensure_ascii=False,
+            )
+    print(f"Справочник {path} сконвертирован в {out_dir}: {len(df)} товаров")
+
+
+def open_catalog(catalog_dir: str = CATALOG_DIR) -> Catalog:
+    # Все файлы из одной версии, даже если её подменят посреди чтения
+    catalog_dir = resolve_dir(catalog_dir)
+    with open(os.path.join(catalog_dir, "tables.json"), encoding="utf-8") as f:
+        tables = json.load(f)
+    return Catalog(
+        np.load(os.path.join(catalog_dir, "product_ids.npy"), mmap_mode="r"),
+        np.load(os.path.join(catalog_dir, "category_codes.npy"), mmap_mode="r"),
+        np.load(os.path.join(catalog_dir, "emoji_codes.npy"), mmap_mode="r"),
+        tables["categories"],
+        tables["emojis"],
+    )
+
+
+def _is_stale(path: str, catalog_dir: str) -> bool:
+    marker = os.path.join(catalog_dir, "tables.json")
+    if not os.path.exists(marker):
+        return True
+    return os.path.exists(path) and os.path.getmtime(path) > os.path.getmtime(marker)
+
+
+@contextmanager
+def _build_lock(catalog_dir: str):
+    """Межпроцессная блокировка сборки: воркеры gunicorn и импортёр стартуют вместе."""
+    lock_path = os.path.abspath(catalog_dir) + ".lock"
+    os.makedirs(os.path.dirname(lock_path), exist_ok=True)
+    with open(lock_path, "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def ensure_catalog(path: str = ITEMS_PATH, catalog_dir: str = CATALOG_DIR):
+    """Собирает артефакт, если он устарел; остальные процессы ждут и берут готовый."""
+    if not _is_stale(path, catalog_dir):
+        return
+    with _build_lock(catalog_dir):
+        # Пока ждали блокировку, артефакт мог собрать другой процесс
+        if _is_stale(path, catalog_dir):
+            build_catalog(path, catalog_dir)
+
+
+def load_items_mapping(path: str = ITEMS_PATH, catalog_dir: Optional[str] = None):
+    global CATALOG
+    catalog_dir = catalog_dir or CATALOG_DIR
+    ensure_catalog(path, catalog_dir)
+    CATALOG = open_catalog(catalog_dir)
+    print(f"Загружено {len(CATALOG)} товаров из справочника")
 
 
-def load_items_mapping(path: str = "data/dict_items.xls"):
-    global ITEMS_MAPPING
-    df = pd.read_excel(path)
-    for _, row in df.iterrows():
-        product_id = int(row["PRODUCT_ID"])
-        category = row["DEPARTMENT"]
-        emoji = row["EMODZI"]
-        ITEMS_MAPPING[product_id] = {"category": category, "emoji": emoji}
-    print(f"Загружено {len(ITEMS_MAPPING)} товаров из справочника")
+if __name__ == "__main__":
+    # python -m app.items [data/dict_items.xls] [data/catalog]
+    args = sys.argv[1:3]
+    with _build_lock(args[1] if len(args) > 1 else CATALOG_DIR):
+        build_catalog(*args)
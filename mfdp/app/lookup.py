@@ -0,0 +1,78 @@
+from typing import List
+
+from sqlalchemy import ARRAY, Integer, any_, bindparam
+
+from app.database import SessionLocal
+from app.field_mapping import PROFILE_FIELD_NAMES
+from app.models import UserRecommendation, model_to_dict
+from app.snapshot import SNAPSHOT_MISS_DB, get_snapshot
+from app.utils import render_payload, render_products, render_telegram_text
+
+BATCH_DB_CHUNK = 5000
+
+
+def recommendation_to_dict(user: UserRecommendation):
+    profile = {
+        PROFILE_FIELD_NAMES[key]: value
+        for key, value in model_to_dict(user).items()
+        if key in PROFILE_FIELD_NAMES
+    }
+
+    recommendations_with_info = render_products(user.recommendations or [])
+
+    return {
+        "household_key": user.household_key,
+        "profile": profile,
+        "recommendations": recommendations_with_info,
+    }
+
+
+def render_user(user: UserRecommendation):
+    """(payload, telegram_text) из строки; старые импорты рендерим на лету."""
+    if user.payload is not None and user.telegram_text is not None:
+        return bytes(user.payload), user.telegram_text
+    result = recommendation_to_dict(user)
+    args = (result["household_key"], result["profile"], result["recommendations"])
+    return render_payload(*args), render_telegram_text(*args)
+
+
+def iter_payloads(household_keys: List[int]):
+    """Отдаёт пары (household_key, готовое JSON-тело или None) для списка ключей."""
+    snapshot = get_snapshot()
+    if snapshot is None:
+        yield from _iter_db_payloads(household_keys)
+        return
+
+    missing = []
+    for key in household_keys:
+        payload = snapshot.payload(key)
+        if payload is None and SNAPSHOT_MISS_DB:
+            missing.append(key)
+        else:
+            yield key, payload
+    # Промахи снапшота мог дописать в БД скоринг по запросу
+    yield from _iter_db_payloads(missing)
+
+
+def _iter_db_payloads(household_keys: List[int]):
+    """Один запрос = ANY(:keys) на каждый чанк ключей."""
+    if not household_keys:
+        return
+    db = SessionLocal()
+    try:
+        for start in range(0, len(household_keys), BATCH_DB_CHUNK):
+            chunk = household_keys[start : start + BATCH_DB_CHUNK]
+            users = (
+                db.query(UserRecommendation)
+                .filter(
+                    UserRecommendation.household_key
+                    == any_(bindparam("keys", chunk, type_=ARRAY(Integer)))
+                )
+                .all()
+            )
+            found = {user.household_key: user for user in users}
+            for key in chunk:
+                user = found.get(key)
+                yield key, render_user(user)[0] if user else None
+    finally:
+        db.close()
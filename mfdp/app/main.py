@@ -1,13 +1,29 @@
 from fastapi import FastAPI
 from app.api import router as api_router
 from app.requests_api import router as requests_router
-from app.database import Base, engine
+from app.database import (
+    Base,
+    configure,
+    dispose_async_engine,
+    get_engine,
+    wait_for_db,
+)
 from app.items import load_items_mapping
+from app.snapshot import SNAPSHOT_ENABLED, refresh_snapshot, start_snapshot_refresher
+from app.segments import refresh_segments, start_segments_refresher
 from dotenv import load_dotenv
 import os
-import time
-from sqlalchemy.exc import OperationalError
 from app.debug_api import router as debug_router
+from app.history import close_history_writer
+from app.metrics import MetricsMiddleware, router as metrics_router
+from app.profiling import (
+    DEBUG_API,
+    ProfilingMiddleware,
+    start_slow_request_monitor,
+    trace_threadpool,
+)
+from app.publisher import get_publisher
+from app.results import start_results_listener
 
 # Загрузка переменных окружения
 load_dotenv()
@@ -16,20 +32,59 @@ load_dotenv()
 try:
     load_items_mapping()
 except Exception as e:
-    print(f"Предупреждение: Не удалось загрузить ITEMS_MAPPING — {e}")
+    print(f"Предупреждение: Не удалось загрузить справочник товаров — {e}")
 
 # Ждём, пока БД будет доступна и создаём таблицы
-for _ in range(10):
+configure("api")
+try:
+    wait_for_db()
+    Base.metadata.create_all(bind=get_engine(), checkfirst=True)
+    print("Все таблицы созданы или уже существуют")
+except Exception as e:
+    print(f"Предупреждение: БД недоступна при старте — {e}")
+
+# Снапшот рекомендаций в памяти: загружаем один раз и следим за новыми импортами
+if SNAPSHOT_ENABLED:
     try:
-        Base.metadata.create_all(bind=engine, checkfirst=True)
-        print("Все таблицы созданы или уже существуют")
-        break
-    except OperationalError:
-        print("Ожидаем базу...")
-        time.sleep(1)
+        refresh_snapshot(force=True)
+    except Exception as e:
+        print(f"Предупреждение: Не удалось загрузить снапшот рекомендаций — {e}")
+    start_snapshot_refresher()
+
+# Запасные рекомендации по сегментам нужны и без снапшота: промахи чтения из БД
+try:
+    refresh_segments(force=True)
+except Exception as e:
+    print(f"Предупреждение: Не удалось загрузить запасные рекомендации — {e}")
+start_segments_refresher()
+
+# Результаты воркера: без Redis каждый процесс слушает fanout results сам
+results_listener = start_results_listener()
 
 # Создание приложения
 app = FastAPI(title="MFDP Recommendation Service")
 app.include_router(api_router, prefix="/api/v1")
 app.include_router(requests_router, prefix="/api/v1")
-app.include_router(debug_router)
+app.include_router(metrics_router)
+# Отладка и профилирование живого процесса — только по флагу
+if DEBUG_API:
+    app.include_router(debug_router)
+    app.add_middleware(ProfilingMiddleware)
+    trace_threadpool()
+    slow_request_monitor = start_slow_request_monitor()
+# Латентность по маршрутам для /metrics
+app.add_middleware(MetricsMiddleware)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    results_listener.set()
+    if DEBUG_API:
+        slow_request_monitor.set()
+    close_history_writer()
+    get_publisher().close()
+
+
+@app.on_event("shutdown")
+async def close_async_engine():
+    await dispose_async_engine()
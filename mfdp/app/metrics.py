@@ -0,0 +1,233 @@
+"""Метрики Prometheus для API, воркера и бота.
+
+- http_request_duration_seconds — латентность API по шаблону маршрута;
+- db_query_duration_seconds — запросы SQLAlchemy (события движка);
+- db_pool_checkout_wait_seconds — ожидание соединения из пула;
+- rabbitmq_publish_duration_seconds — публикации задач, пачек и результатов;
+- worker_batch_duration_seconds, worker_messages_total, worker_queue_lag_seconds,
+  worker_queue_depth — обработка пачек воркером и отставание очереди;
+- ondemand_scoring_batch_seconds, ondemand_scoring_batch_users — скоринг по
+  запросу в воркере (микро-пачки);
+- render_products_duration_seconds — рендер товаров справочником;
+- bot_api_request_duration_seconds — запросы бота к API.
+
+API отдаёт /metrics, воркер и бот поднимают свой экспортёр (start_exporter).
+Несколько процессов gunicorn — через PROMETHEUS_MULTIPROC_DIR (режим
+multiprocess prometheus_client).
+"""
+import os
+import time
+
+from fastapi import APIRouter, Response
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+BOT_METRICS_PORT = int(os.getenv("BOT_METRICS_PORT", "9101"))
+
+# Запросы из снапшота — доли миллисекунды, поэтому шкала начинается ниже стандартной
+FAST_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Латентность запросов API",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "Время выполнения SQL-запросов",
+    ["operation"],
+    buckets=FAST_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "Ошибки SQL-запросов", ["operation"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Ожидание соединения из пула (включая открытие нового)",
+    ["pool"],
+    buckets=FAST_BUCKETS,
+)
+RABBITMQ_PUBLISH_SECONDS = Histogram(
+    "rabbitmq_publish_duration_seconds",
+    "Публикация в RabbitMQ с подтверждением брокера",
+    ["kind"],
+    buckets=FAST_BUCKETS,
+)
+RABBITMQ_PUBLISH_ERRORS = Counter(
+    "rabbitmq_publish_errors_total", "Неудачные попытки публикации в RabbitMQ"
+)
+WORKER_BATCH_SECONDS = Histogram(
+    "worker_batch_duration_seconds", "Обработка пачки сообщений воркером", buckets=FAST_BUCKETS
+)
+WORKER_BATCH_MESSAGES = Histogram(
+    "worker_batch_size", "Сообщений в пачке", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+WORKER_MESSAGES = Counter("worker_messages_total", "Обработанные сообщения", ["result"])
+WORKER_QUEUE_LAG_SECONDS = Histogram(
+    "worker_queue_lag_seconds",
+    "От публикации задачи до начала её обработки",
+    buckets=LAG_BUCKETS,
+)
+WORKER_QUEUE_DEPTH = Gauge(
+    "worker_queue_depth", "Сообщений в очереди запросов", multiprocess_mode="max"
+)
+ONDEMAND_SCORING_SECONDS = Histogram(
+    "ondemand_scoring_batch_seconds",
+    "Скоринг микро-пачки ранкером, включая запись в БД",
+    buckets=FAST_BUCKETS,
+)
+ONDEMAND_SCORING_USERS = Histogram(
+    "ondemand_scoring_batch_users",
+    "Домохозяйств в микро-пачке скоринга",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+RENDER_PRODUCTS_SECONDS = Histogram(
+    "render_products_duration_seconds", "Рендер товаров справочником", buckets=FAST_BUCKETS
+)
+BOT_API_SECONDS = Histogram(
+    "bot_api_request_duration_seconds",
+    "Запросы бота к API, включая повторы",
+    ["status"],
+    buckets=FAST_BUCKETS,
+)
+
+
+def registry():
+    """Реестр для выдачи: в режиме multiprocess — сумма по всем процессам."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        collected = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collected)
+        return collected
+    return REGISTRY
+
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(content=generate_latest(registry()), media_type=CONTENT_TYPE_LATEST)
+
+
+def start_exporter(port: int):
+    """HTTP-экспортёр /metrics в фоновом потоке для процессов без API; 0 — выключен."""
+    if port:
+        start_http_server(port, registry=registry())
+        print(f"Метрики Prometheus на порту {port}")
+
+
+_route_paths = {}
+
+
+def route_template(scope) -> str:
+    """Шаблон пути (/api/v1/recommendations/{user_id}), а не сам URL — метки не размножаются."""
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    path = _route_paths.get(endpoint)
+    if path is None:
+        path = next(
+            (
+                route.path
+                for route in scope["app"].routes
+                if getattr(route, "endpoint", None) is endpoint
+            ),
+            "unmatched",
+        )
+        _route_paths[endpoint] = path
+    return path
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время запроса до последнего байта ответа, включая стримы."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Роутер дописывает endpoint в тот же scope
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"], route_template(scope), str(status)
+            ).observe(time.perf_counter() - started)
+
+
+SQL_OPERATIONS = {"SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "COPY"}
+
+
+def statement_operation(statement: str) -> str:
+    words = statement.lstrip().split(None, 1)
+    operation = words[0].upper() if words else ""
+    return operation if operation in SQL_OPERATIONS else "OTHER"
+
+
+def instrument_engine(engine):
+    """Таймеры SQL-запросов на событиях движка; AsyncEngine — через его sync_engine."""
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._metrics_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, "_metrics_started", None)
+        if started is not None:
+            DB_QUERY_SECONDS.labels(statement_operation(statement)).observe(
+                time.perf_counter() - started
+            )
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        statement = exception_context.statement or ""
+        DB_QUERY_ERRORS.labels(statement_operation(statement)).inc()
+
+    return engine
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool, замеряющий ожидание свободного соединения при checkout."""
+
+    metrics_label = "sync"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT_SECONDS.labels(self.metrics_label).observe(
+                time.perf_counter() - started
+            )
+
+
+class TimedAsyncQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    metrics_label = "async"
@@ -1,4 +1,16 @@
-from sqlalchemy import Column, Integer, String, ARRAY, DateTime, func
+from sqlalchemy import (
+    Column,
+    Integer,
+    Float,
+    String,
+    Text,
+    LargeBinary,
+    ARRAY,
+    DateTime,
+    Index,
+    func,
+    text,
+)
 from app.database import Base
 from sqlalchemy.orm import class_mapper
 from app.field_mapping import PROFILE_FIELD_NAMES
@@ -17,19 +29,69 @@ class UserRecommendation(Base):
     household_size_desc = Column(String)
     kid_category_desc = Column(String)
     recommendations = Column(ARRAY(Integer))
+    # Расширенный ранжированный список (top-50) для фильтрации по корзине
+    candidates = Column(ARRAY(Integer))
+    candidate_scores = Column(ARRAY(Float))
+    # Готовые ответы, рендерятся при импорте
+    payload = Column(LargeBinary)  # JSON-тело /recommendations/{user_id}
+    telegram_text = Column(Text)  # Сообщение бота
 
 
 class UserRequest(Base):
     __tablename__ = "user_requests"
 
     id = Column(Integer, primary_key=True)
-    telegram_login = Column(String, index=True)  # Например: artemlyushin
+    telegram_login = Column(String)  # Например: artemlyushin
     requested_user_id = Column(Integer)  # household_key
     timestamp = Column(DateTime, default=func.now())
     request_type = Column(String)  # 'manual' или 'random'
 
+    # История логина уже отсортирована в индексе: без сортировки и с keyset-пагинацией
+    __table_args__ = (
+        Index(
+            "ix_user_requests_login_ts",
+            "telegram_login",
+            timestamp.desc(),
+            id.desc(),
+        ),
+    )
+
+
+class SnapshotVersion(Base):
+    __tablename__ = "snapshot_versions"
+
+    id = Column(Integer, primary_key=True)  # Растёт с каждым импортом
+    row_count = Column(Integer)
+    rejected_count = Column(Integer)
+    source_file = Column(String)
+    source_hash = Column(String(64))  # sha256 исходного CSV
+    status = Column(String, default="loading")  # loading/loaded/active/failed/deleted
+    loaded_at = Column(DateTime, default=func.now())
+    activated_at = Column(DateTime)
+
+    # Активный снапшот всегда один
+    __table_args__ = (
+        Index(
+            "ux_snapshot_versions_active",
+            "status",
+            unique=True,
+            postgresql_where=text("status = 'active'"),
+        ),
+    )
+
+
+class SegmentRecommendation(Base):
+    __tablename__ = "segment_recommendations"
+
+    snapshot_id = Column(Integer, primary_key=True)
+    # Значения колонок сегмента через «|» (app.segments.segment_key); «*» — популярное
+    segment_key = Column(String, primary_key=True)
+    households = Column(Integer)
+    recommendations = Column(ARRAY(Integer))
+
 
 def model_to_dict(model):
     from sqlalchemy.orm import class_mapper
 
     return {c.key: getattr(model, c.key) for c in class_mapper(model.__class__).columns}
+
@@ -0,0 +1,338 @@
+"""Профилирование живого процесса API: сэмплер стеков и медленные запросы.
+
+Включается только с DEBUG_API=1 — без флага ни middleware, ни хуки движка
+не устанавливаются. Стеки снимаются через sys._current_frames() из фонового
+потока, без внешних профилировщиков и перезапуска процесса.
+
+- SamplingProfiler — стеки всех потоков раз в interval секунд, вывод в
+  collapsed-формате (frame;frame;frame count) для flamegraph.pl / speedscope;
+- ProfilingMiddleware — трассировка каждого запроса: время до первого байта
+  и до конца ответа, SQL-запросы с длительностью (хуки движка, контекстная
+  переменная доходит и до потоков threadpool);
+- запросы дольше SLOW_REQUEST_THRESHOLD попадают в кольцевой буфер на
+  SLOW_REQUESTS_KEEP записей; пока такой запрос выполняется, монитор
+  сэмплирует стеки его потоков: цикла событий и потока threadpool, пока в нём
+  идёт синхронный маршрут или зависимость (trace_threadpool); у async-маршрутов
+  в стек попадает всё, что в этот момент делает цикл.
+
+Состояние своё у каждого процесса gunicorn.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+from starlette.concurrency import run_in_threadpool
+
+DEBUG_API = os.getenv("DEBUG_API", "0") == "1"
+DEBUG_API_TOKEN = os.getenv("DEBUG_API_TOKEN", "")  # пусто — без проверки заголовка
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.005"))  # секунд
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", "0.5"))  # секунд
+SLOW_REQUESTS_KEEP = int(os.getenv("SLOW_REQUESTS_KEEP", "50"))
+SLOW_SAMPLE_INTERVAL = float(os.getenv("SLOW_SAMPLE_INTERVAL", "0.01"))
+SLOW_SQL_KEEP = 100  # запросов на одну трассу
+SQL_MAX_LENGTH = 1000
+
+# Служебные маршруты сами по себе долгие (профиль ждёт N секунд) — не трассируем
+UNTRACED_PREFIXES = ("/debug", "/metrics")
+
+# Листовые кадры потоков, которые просто ждут: пул, цикл событий, очереди
+IDLE_FRAMES = {
+    ("threading", "wait"),
+    ("selectors", "select"),
+    ("queue", "get"),
+    ("concurrent.futures.thread", "_worker"),
+}
+
+
+def frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_name}"
+
+
+def collapse_stack(frame) -> str:
+    """Стек от корня к листу через «;», как в collapsed-формате flamegraph."""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return ";".join(names)
+
+
+def is_idle(frame) -> bool:
+    return (frame.f_globals.get("__name__"), frame.f_code.co_name) in IDLE_FRAMES
+
+
+def format_collapsed(counts: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик всех потоков процесса.
+
+    Останавливается по stop(), по истечении времени или после max_requests
+    завершённых запросов (их отсчитывает ProfilingMiddleware).
+    """
+
+    def __init__(
+        self,
+        interval: float = PROFILE_SAMPLE_INTERVAL,
+        max_requests: Optional[int] = None,
+        idle: bool = False,
+    ):
+        self.interval = interval
+        self.max_requests = max_requests
+        self.idle = idle
+        self.counts = Counter()
+        self.samples = 0
+        self.requests = 0
+        self.started = None
+        self.elapsed = 0.0
+        self.done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def request_finished(self):
+        self.requests += 1
+        if self.max_requests is not None and self.requests >= self.max_requests:
+            self.done.set()
+
+    async def wait(self, timeout: float):
+        """Ждёт конца профиля, не блокируя цикл событий."""
+        deadline = time.monotonic() + timeout
+        while not self.done.is_set() and time.monotonic() < deadline:
+            await asyncio.sleep(min(0.05, self.interval * 10))
+
+    def collapsed(self) -> str:
+        return format_collapsed(self.counts)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self.done.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not self.idle and is_idle(frame)):
+                    continue
+                # Корень стека — имя потока: цикл событий и threadpool видны раздельно
+                stack = collapse_stack(frame)
+                self.counts[f"{names.get(ident, ident)};{stack}"] += 1
+            self.samples += 1
+
+
+_profiler: Optional[SamplingProfiler] = None
+_profiler_lock = threading.Lock()
+
+
+def start_profile(interval: float, max_requests: Optional[int], idle: bool) -> SamplingProfiler:
+    """Запускает профиль процесса; RuntimeError, если уже идёт другой."""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            raise RuntimeError("Профилирование уже запущено")
+        _profiler = SamplingProfiler(interval, max_requests, idle).start()
+        return _profiler
+
+
+def stop_profile():
+    global _profiler
+    with _profiler_lock:
+        profiler, _profiler = _profiler, None
+    if profiler is not None:
+        profiler.stop()
+
+
+class RequestTrace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now()
+        self.started = time.perf_counter()
+        self.first_byte = None
+        self.duration = None
+        self.status = 500
+        self.queries: List[Dict] = []
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.threads = {threading.get_ident()}
+        self.stacks = Counter()
+
+    def add_query(self, statement: str, seconds: float):
+        self.sql_count += 1
+        self.sql_seconds += seconds
+        if len(self.queries) < SLOW_SQL_KEEP:
+            self.queries.append(
+                {"statement": statement[:SQL_MAX_LENGTH], "seconds": round(seconds, 6)}
+            )
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "seconds": round(self.duration, 6),
+            "first_byte_seconds": round(self.first_byte, 6) if self.first_byte else None,
+            "sql_seconds": round(self.sql_seconds, 6),
+            "other_seconds": round(max(self.duration - self.sql_seconds, 0.0), 6),
+            "sql_count": self.sql_count,
+            "queries": self.queries,
+            "stacks": format_collapsed(self.stacks),
+        }
+
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+_active = set()
+_active_lock = threading.Lock()
+_slow_requests = deque(maxlen=SLOW_REQUESTS_KEEP)
+_slow_lock = threading.Lock()
+
+
+def slow_requests(limit: int = SLOW_REQUESTS_KEEP) -> List[dict]:
+    """Самые медленные из последних медленных запросов, по убыванию времени."""
+    with _slow_lock:
+        traces = list(_slow_requests)
+    traces.sort(key=lambda trace: trace.duration, reverse=True)
+    return [trace.to_dict() for trace in traces[:limit]]
+
+
+def clear_slow_requests():
+    with _slow_lock:
+        _slow_requests.clear()
+
+
+class ProfilingMiddleware:
+    """ASGI-middleware: трасса запроса, медленные — в кольцевой буфер."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(UNTRACED_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        trace = RequestTrace(scope["method"], scope["path"])
+        token = _current_trace.set(trace)
+        with _active_lock:
+            _active.add(trace)
+
+        async def send_with_trace(message):
+            if message["type"] == "http.response.start":
+                trace.status = message["status"]
+                trace.first_byte = time.perf_counter() - trace.started
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_trace)
+        finally:
+            trace.duration = time.perf_counter() - trace.started
+            _current_trace.reset(token)
+            with _active_lock:
+                _active.discard(trace)
+            if trace.duration >= SLOW_REQUEST_THRESHOLD:
+                with _slow_lock:
+                    _slow_requests.append(trace)
+            profiler = _profiler
+            if profiler is not None:
+                profiler.request_finished()
+
+
+def _monitor_loop(stop: threading.Event, interval: float):
+    while not stop.wait(interval):
+        now = time.perf_counter()
+        with _active_lock:
+            slow = [trace for trace in _active if now - trace.started >= SLOW_REQUEST_THRESHOLD]
+        if not slow:
+            continue
+        frames = sys._current_frames()
+        for trace in slow:
+            for ident in list(trace.threads):
+                frame = frames.get(ident)
+                if frame is not None and not is_idle(frame):
+                    trace.stacks[collapse_stack(frame)] += 1
+
+
+def start_slow_request_monitor(interval: float = SLOW_SAMPLE_INTERVAL):
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_monitor_loop,
+        args=(stop, interval),
+        name="slow-request-monitor",
+        daemon=True,
+    )
+    thread.start()
+    return stop
+
+
+def _in_trace(func):
+    """Функция для threadpool: на время вызова её поток — поток текущего запроса."""
+
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        # run_in_threadpool копирует контекст, трасса видна и в потоке пула
+        trace = _current_trace.get()
+        if trace is None:
+            return func(*args, **kwargs)
+        ident = threading.get_ident()
+        trace.threads.add(ident)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            trace.threads.discard(ident)
+
+    return call
+
+
+async def run_in_threadpool_traced(func, *args, **kwargs):
+    return await run_in_threadpool(_in_trace(func), *args, **kwargs)
+
+
+def trace_threadpool():
+    """Монитор медленных запросов видит и синхронные маршруты без SQL.
+
+    FastAPI отправляет синхронные маршруты и зависимости в пул через
+    run_in_threadpool — подменяем его в модулях, которые его вызывают.
+    """
+    import fastapi.dependencies.utils
+    import fastapi.routing
+
+    for module in (fastapi.routing, fastapi.dependencies.utils):
+        module.run_in_threadpool = run_in_threadpool_traced
+
+
+def trace_engine(engine):
+    """SQL-запросы в трассу текущего запроса; без DEBUG_API=1 ничего не вешает."""
+    if not DEBUG_API:
+        return engine
+    engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        if trace is not None and context is not None:
+            context._trace_started = time.perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        trace = _current_trace.get()
+        started = getattr(context, "_trace_started", None)
+        if trace is not None and started is not None:
+            trace.add_query(statement, time.perf_counter() - started)
+
+    return engine
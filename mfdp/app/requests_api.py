@@ -1,14 +1,102 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+import base64
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models import UserRequest
-from app.database import SessionLocal
+from app.database import get_async_db
+from app.history import get_history_writer
+from pydantic import BaseModel
 
 router = APIRouter()
 
+HISTORY_PAGE_MAX = 500
+
+
+class RequestEvent(BaseModel):
+    telegram_login: str
+    requested_user_id: int
+    request_type: str  # 'manual' или 'random'
+
+
+@router.post("/requests", status_code=202)
+def record_request(event: RequestEvent):
+    # Запись идёт пачками в фоне; переполненный буфер — 503, клиент повторит позже
+    accepted = get_history_writer().submit(
+        event.telegram_login, event.requested_user_id, event.request_type
+    )
+    if not accepted:
+        raise HTTPException(status_code=503, detail="Очередь истории переполнена")
+    return {"status": "accepted"}
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Значение со смещением (…Z, +03:00) — в UTC без пояса, как колонка timestamp.
+
+    Иначе asyncpg не сравнит его с колонкой без часового пояса (DataError, 500).
+    """
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
 
-def get_db():
-    db = SessionLocal()
+
+def encode_cursor(req: UserRequest) -> str:
+    raw = f"{req.timestamp.isoformat()}|{req.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
     try:
-        yield db
-    finally:
-        db.close()
+        timestamp, request_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return naive_utc(datetime.fromisoformat(timestamp)), int(request_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Некорректный курсор")
+
+
+@router.get("/requests/{telegram_login}/history")
+async def get_requests_history(
+    telegram_login: str,
+    limit: int = Query(20, ge=1, le=HISTORY_PAGE_MAX),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+):
+    """История запросов с keyset-пагинацией по (timestamp, id), от новых к старым.
+
+    Каждая страница — диапазонное чтение индекса ix_user_requests_login_ts,
+    стоимость не зависит от глубины страницы.
+    """
+    since, until = naive_utc(since), naive_utc(until)
+    query = select(UserRequest).where(UserRequest.telegram_login == telegram_login)
+    if since is not None:
+        query = query.where(UserRequest.timestamp >= since)
+    if until is not None:
+        query = query.where(UserRequest.timestamp < until)
+    if cursor is not None:
+        query = query.where(
+            tuple_(UserRequest.timestamp, UserRequest.id) < tuple_(*decode_cursor(cursor))
+        )
+
+    # Берём на одну строку больше, чтобы понять, есть ли следующая страница
+    result = await db.execute(
+        query.order_by(UserRequest.timestamp.desc(), UserRequest.id.desc()).limit(
+            limit + 1
+        )
+    )
+    rows = result.scalars().all()
+    page = rows[:limit]
+
+    return {
+        "requests": [
+            {
+                "requested_user_id": req.requested_user_id,
+                "request_type": req.request_type,
+                "timestamp": req.timestamp.isoformat(),
+            }
+            for req in page
+        ],
+        "next_cursor": encode_cursor(page[-1]) if len(rows) > limit else None,
+    }
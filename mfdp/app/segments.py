@@ -0,0 +1,222 @@
+"""Запасные рекомендации по демографическим сегментам.
+
+Импортёр после загрузки снапшота считает top-N товаров для каждого
+сочетания значений SEGMENT_COLUMNS и общий список популярного (сегмент «*»)
+и пишет их в segment_recommendations рядом со снапшотом. Товары сегмента
+ранжируются по числу домохозяйств, у которых они в рекомендациях, при
+равенстве — по сумме мест в списках.
+
+API держит таблицу активного снапшота в памяти (словарь по ключу сегмента)
+и отвечает из неё на промахи: домохозяйство с профилем в query-параметрах
+получает список своего сегмента, без профиля или с незнакомым сегментом —
+популярное. Ответ помечен полем fallback.
+
+Пересчитать для уже загруженного снапшота (по умолчанию активного):
+python -m app.segments [snapshot_id]
+"""
+import os
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from app.database import SessionLocal
+from app.field_mapping import PROFILE_FIELD_NAMES
+from app.models import SegmentRecommendation
+from app.snapshot import SNAPSHOT_REFRESH_INTERVAL, get_snapshot_version
+from app.snapshot_versions import SEGMENTS_TABLE, snapshot_table_name
+from app.utils import build_profile, render_payload, render_products, render_telegram_text
+
+SEGMENT_COLUMNS = [
+    column
+    for column in os.getenv("SEGMENT_COLUMNS", ",".join(PROFILE_FIELD_NAMES)).split(",")
+    if column
+]
+SEGMENT_TOP_N = int(os.getenv("SEGMENT_TOP_N", "10"))
+GLOBAL_SEGMENT = "*"
+SEPARATOR = "|"
+
+# Имена колонок попадают в SQL — только из профиля
+_unknown = set(SEGMENT_COLUMNS) - set(PROFILE_FIELD_NAMES)
+if _unknown:
+    raise ValueError(f"SEGMENT_COLUMNS: неизвестные колонки профиля {sorted(_unknown)}")
+
+
+def segment_key(values) -> str:
+    """Ключ сегмента по значениям профиля; отсутствующие значения — пустые."""
+    return SEPARATOR.join(values.get(column) or "" for column in SEGMENT_COLUMNS)
+
+
+# Ключ считается в SQL так же, как segment_key()
+_SEGMENT_KEY_SQL = "concat_ws('{}', {})".format(
+    SEPARATOR, ", ".join(f"coalesce({column}, '')" for column in SEGMENT_COLUMNS)
+)
+
+_INSERT_SQL = """
+INSERT INTO {segments} (snapshot_id, segment_key, households, recommendations)
+WITH households AS (
+    SELECT {key} AS segment_key, recommendations FROM {table}
+),
+sizes AS (
+    SELECT segment_key, count(*) AS households FROM households GROUP BY segment_key
+),
+products AS (
+    SELECT h.segment_key, r.product_id, count(*) AS hits, sum(r.place) AS place_sum
+    FROM households h,
+         unnest(h.recommendations) WITH ORDINALITY AS r(product_id, place)
+    GROUP BY h.segment_key, r.product_id
+),
+ranked AS (
+    SELECT segment_key, product_id,
+           row_number() OVER (
+               PARTITION BY segment_key ORDER BY hits DESC, place_sum, product_id
+           ) AS place
+    FROM products
+)
+SELECT %(snapshot_id)s, s.segment_key, s.households,
+       coalesce(
+           array_agg(r.product_id ORDER BY r.place) FILTER (WHERE r.product_id IS NOT NULL),
+           '{{}}'
+       )
+FROM sizes s
+LEFT JOIN ranked r ON r.segment_key = s.segment_key AND r.place <= %(top_n)s
+GROUP BY s.segment_key, s.households
+"""
+
+
+def compute_segments(cursor, snapshot_id: int, top_n: int = SEGMENT_TOP_N) -> int:
+    """Пересчитывает сегменты снапшота в той же транзакции; возвращает их число без «*»."""
+    cursor.execute(f"DELETE FROM {SEGMENTS_TABLE} WHERE snapshot_id = %s", (snapshot_id,))
+    params = {"snapshot_id": snapshot_id, "top_n": top_n}
+    table = snapshot_table_name(snapshot_id)
+    for key in (_SEGMENT_KEY_SQL, f"'{GLOBAL_SEGMENT}'"):
+        cursor.execute(
+            _INSERT_SQL.format(segments=SEGMENTS_TABLE, key=key, table=table), params
+        )
+    cursor.execute(
+        f"SELECT count(*) FROM {SEGMENTS_TABLE} WHERE snapshot_id = %s AND segment_key <> %s",
+        (snapshot_id, GLOBAL_SEGMENT),
+    )
+    return cursor.fetchone()[0]
+
+
+class SegmentFallback:
+    """Списки сегментов активного снапшота, уже отрендеренные справочником."""
+
+    def __init__(self, version: int, segments: Dict[str, List[str]]):
+        self.version = version
+        self.segments = segments
+
+    def __len__(self):
+        return len(self.segments)
+
+    def lookup(self, values) -> Tuple[str, List[str]]:
+        """("segment" | "popular", рекомендации) для значений профиля."""
+        if values:
+            recommendations = self.segments.get(segment_key(values))
+            if recommendations:
+                return "segment", recommendations
+        return "popular", self.segments[GLOBAL_SEGMENT]
+
+    def render(self, household_key: int, values, telegram: bool = False):
+        """Тело ответа для домохозяйства без рекомендаций и тип запасного списка."""
+        kind, recommendations = self.lookup(values)
+        profile = build_profile(values)
+        if telegram:
+            return render_telegram_text(household_key, profile, recommendations), kind
+        payload = render_payload(household_key, profile, recommendations)
+        # Готовое тело без повторной сериализации: дописываем флаг в конец объекта
+        return payload[:-1] + b',"fallback":"%s"}' % kind.encode("utf-8"), kind
+
+
+def load_segments(db, version: int) -> SegmentFallback:
+    rows = (
+        db.query(SegmentRecommendation.segment_key, SegmentRecommendation.recommendations)
+        .filter(SegmentRecommendation.snapshot_id == version)
+        .all()
+    )
+    # Каждый товар рендерим один раз на все сегменты
+    product_ids = list(dict.fromkeys(pid for row in rows for pid in row.recommendations or []))
+    labels = dict(zip(product_ids, render_products(product_ids)))
+    return SegmentFallback(
+        version,
+        {row.segment_key: [labels[pid] for pid in row.recommendations or []] for row in rows},
+    )
+
+
+_segments: Optional[SegmentFallback] = None
+_refresh_lock = threading.Lock()
+
+
+def get_segments() -> Optional[SegmentFallback]:
+    """Запасные списки; None — не загружены или у снапшота их нет."""
+    segments = _segments
+    if segments is None or GLOBAL_SEGMENT not in segments.segments:
+        return None
+    return segments
+
+
+def refresh_segments(force: bool = False) -> bool:
+    """Перечитывает сегменты, если сменился активный снапшот."""
+    global _segments
+    with _refresh_lock:
+        db = SessionLocal()
+        try:
+            version = get_snapshot_version(db)
+            if not force and _segments is not None and _segments.version == version:
+                return False
+            segments = load_segments(db, version)
+        finally:
+            db.close()
+        _segments = segments
+    print(f"Запасные рекомендации v{segments.version}: {len(segments)} сегментов")
+    return True
+
+
+def _refresh_loop(stop: threading.Event, interval: float):
+    while not stop.wait(interval):
+        try:
+            refresh_segments()
+        except Exception as e:
+            print(f"Не удалось обновить запасные рекомендации — {e}")
+
+
+def start_segments_refresher(interval: float = SNAPSHOT_REFRESH_INTERVAL):
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_refresh_loop,
+        args=(stop, interval),
+        name="segments-refresher",
+        daemon=True,
+    )
+    thread.start()
+    return stop
+
+
+def main(argv):
+    from app.database import configure, get_engine
+    from app.snapshot_versions import active_snapshot
+
+    configure("importer")
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        if argv:
+            snapshot_id = int(argv[0])
+        else:
+            active = active_snapshot(cursor)
+            if active is None:
+                print("Активного снапшота нет")
+                return
+            snapshot_id = active[0]
+        count = compute_segments(cursor, snapshot_id)
+        connection.commit()
+        print(f"Снапшот {snapshot_id}: {count} сегментов и список популярного")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
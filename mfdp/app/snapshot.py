@@ -0,0 +1,269 @@
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+
+from app.database import SessionLocal
+from app.field_mapping import PROFILE_FIELD_NAMES
+from app.models import SnapshotVersion, UserRecommendation
+from app.snapshot_versions import snapshot_table
+from app.utils import (
+    build_profile,
+    render_payload,
+    render_products,
+    render_telegram_text,
+)
+
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENABLED", "1") == "1"
+SNAPSHOT_REFRESH_INTERVAL = float(os.getenv("SNAPSHOT_REFRESH_INTERVAL", "30"))
+# Промах снапшота перепроверяется в БД: строки, дописанные после загрузки
+# снапшота (скоринг по запросу в воркере), иначе не видны до нового импорта
+SNAPSHOT_MISS_DB = os.getenv("SNAPSHOT_MISS_DB", os.getenv("ONDEMAND_SCORING", "0")) == "1"
+
+PROFILE_COLUMNS = list(PROFILE_FIELD_NAMES)
+
+
+class RecommendationSnapshot:
+    """Read-only копия user_recommendations в памяти процесса.
+
+    Ключи домохозяйств лежат в отсортированном массиве, ранжированные
+    кандидаты — в плоских массивах (CSR: offsets + product_ids/label_ids),
+    первые rec_lengths[i] из них — обычные рекомендации. Одинаковые
+    профили и отрендеренные строки товаров хранятся один раз. Готовые
+    тела ответов (payloads) и тексты для бота отдаются без сериализации.
+    """
+
+    def __init__(
+        self,
+        version: int,
+        keys: np.ndarray,
+        profile_ids: np.ndarray,
+        profiles: List[Dict[str, str]],
+        offsets: np.ndarray,
+        product_ids: np.ndarray,
+        label_ids: np.ndarray,
+        rec_lengths: np.ndarray,
+        labels: List[str],
+    ):
+        self.version = version
+        self.keys = keys
+        self.profile_ids = profile_ids
+        self.profiles = profiles
+        self.offsets = offsets
+        self.product_ids = product_ids
+        self.label_ids = label_ids
+        self.rec_lengths = rec_lengths
+        self.labels = labels
+        self.payloads: List[bytes] = []
+        self.telegram_texts: List[str] = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def position(self, household_key: int) -> int:
+        pos = int(np.searchsorted(self.keys, household_key))
+        if pos < len(self.keys) and self.keys[pos] == household_key:
+            return pos
+        return -1
+
+    def get(self, household_key: int) -> Optional[dict]:
+        pos = self.position(household_key)
+        if pos < 0:
+            return None
+        labels = self.labels
+        start = self.offsets[pos]
+        end = start + self.rec_lengths[pos]
+        return {
+            "household_key": household_key,
+            "profile": self.profiles[self.profile_ids[pos]],
+            "recommendations": [labels[i] for i in self.label_ids[start:end]],
+        }
+
+    def etag(self, household_key: int) -> str:
+        return f'"{self.version}-{household_key}"'
+
+    def payload(self, household_key: int) -> Optional[bytes]:
+        pos = self.position(household_key)
+        return self.payloads[pos] if pos >= 0 else None
+
+    def telegram_text(self, household_key: int) -> Optional[str]:
+        pos = self.position(household_key)
+        return self.telegram_texts[pos] if pos >= 0 else None
+
+    def get_for_cart(self, household_key: int, cart: frozenset, top_n: int):
+        """Top-N кандидатов без товаров из корзины; None, если ключа нет."""
+        pos = self.position(household_key)
+        if pos < 0:
+            return None
+        start, end = self.offsets[pos], self.offsets[pos + 1]
+        labels = self.labels
+        picked_ids, picked_labels = [], []
+        for pid, lid in zip(
+            self.product_ids[start:end].tolist(), self.label_ids[start:end].tolist()
+        ):
+            if pid in cart:
+                continue
+            picked_ids.append(pid)
+            picked_labels.append(labels[lid])
+            if len(picked_ids) == top_n:
+                break
+        return picked_ids, picked_labels
+
+
+def get_snapshot_version(db) -> int:
+    """Id активного снапшота; 0 — база без версий (таблица из create_all)."""
+    return (
+        db.query(func.coalesce(func.max(SnapshotVersion.id), 0))
+        .filter(SnapshotVersion.status == "active")
+        .scalar()
+    )
+
+
+def build_snapshot(version: int, rows) -> RecommendationSnapshot:
+    keys = []
+    profile_ids = []
+    offsets = [0]
+    product_ids = []
+    label_ids = []
+    rec_lengths = []
+    payloads: List[Optional[bytes]] = []
+    telegram_texts: List[Optional[str]] = []
+    profile_index: Dict[Tuple, int] = {}
+    profiles: List[Dict[str, str]] = []
+    label_index: Dict[int, int] = {}
+
+    for row in rows:
+        keys.append(row.household_key)
+
+        # Одинаковые профили храним один раз
+        profile_key = tuple(getattr(row, column) for column in PROFILE_COLUMNS)
+        pid = profile_index.get(profile_key)
+        if pid is None:
+            pid = profile_index[profile_key] = len(profiles)
+            profiles.append(build_profile(dict(zip(PROFILE_COLUMNS, profile_key))))
+        profile_ids.append(pid)
+
+        # Старые импорты без кандидатов: кандидаты = рекомендации
+        recommendations = row.recommendations or []
+        candidates = row.candidates or recommendations
+        rec_lengths.append(len(recommendations))
+
+        for product_id in candidates:
+            lid = label_index.get(product_id)
+            if lid is None:
+                lid = label_index[product_id] = len(label_index)
+            product_ids.append(product_id)
+            label_ids.append(lid)
+        offsets.append(len(label_ids))
+
+        payloads.append(row.payload)
+        telegram_texts.append(row.telegram_text)
+
+    # Каждый товар рендерим один раз на весь снапшот, одним вызовом справочника
+    labels = render_products(list(label_index))
+
+    snapshot = RecommendationSnapshot(
+        version=version,
+        keys=np.asarray(keys, dtype=np.int64),
+        profile_ids=np.asarray(profile_ids, dtype=np.int32),
+        profiles=profiles,
+        offsets=np.asarray(offsets, dtype=np.int64),
+        product_ids=np.asarray(product_ids, dtype=np.int64),
+        label_ids=np.asarray(label_ids, dtype=np.int32),
+        rec_lengths=np.asarray(rec_lengths, dtype=np.int16),
+        labels=labels,
+    )
+
+    # Импорты без готовых ответов дорендериваем один раз при загрузке
+    for pos, key in enumerate(keys):
+        if payloads[pos] is None or telegram_texts[pos] is None:
+            result = snapshot.get(key)
+            payloads[pos] = render_payload(key, result["profile"], result["recommendations"])
+            telegram_texts[pos] = render_telegram_text(
+                key, result["profile"], result["recommendations"]
+            )
+    snapshot.payloads = payloads
+    snapshot.telegram_texts = telegram_texts
+    return snapshot
+
+
+def load_snapshot(db) -> RecommendationSnapshot:
+    version = get_snapshot_version(db)
+    # Читаем таблицу версии напрямую, а не представление: промоут во время
+    # загрузки не ждёт нас и не подменяет данные посреди чтения
+    table = snapshot_table(version).c if version else UserRecommendation
+    columns = [getattr(table, c) for c in PROFILE_COLUMNS]
+    rows = (
+        db.query(
+            table.household_key,
+            *columns,
+            table.recommendations,
+            table.candidates,
+            table.payload,
+            table.telegram_text,
+        )
+        .order_by(table.household_key)
+        .yield_per(10000)
+    )
+    return build_snapshot(version, rows)
+
+
+_snapshot: Optional[RecommendationSnapshot] = None
+_refresh_lock = threading.Lock()
+
+
+def get_snapshot() -> Optional[RecommendationSnapshot]:
+    return _snapshot
+
+
+def set_snapshot(snapshot: Optional[RecommendationSnapshot]):
+    """Подменяет снапшот процесса готовым (например, собранным из CSV без БД).
+
+    None — читать из БД, как при SNAPSHOT_ENABLED=0.
+    """
+    global _snapshot
+    with _refresh_lock:
+        _snapshot = snapshot
+
+
+def refresh_snapshot(force: bool = False) -> bool:
+    """Перечитывает снапшот, если сменился активный снапшот (промоут или откат).
+
+    Новый снапшот собирается целиком в стороне, затем подменяется
+    одной операцией присваивания — читатели видят либо старую, либо новую версию.
+    """
+    global _snapshot
+    with _refresh_lock:
+        db = SessionLocal()
+        try:
+            version = get_snapshot_version(db)
+            if not force and _snapshot is not None and _snapshot.version == version:
+                return False
+            snapshot = load_snapshot(db)
+        finally:
+            db.close()
+        _snapshot = snapshot
+    print(f"Снапшот рекомендаций v{snapshot.version}: {len(snapshot)} домохозяйств")
+    return True
+
+
+def _refresh_loop(stop: threading.Event, interval: float):
+    while not stop.wait(interval):
+        try:
+            refresh_snapshot()
+        except Exception as e:
+            print(f"Не удалось обновить снапшот рекомендаций — {e}")
+
+
+def start_snapshot_refresher(interval: float = SNAPSHOT_REFRESH_INTERVAL):
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=_refresh_loop,
+        args=(stop, interval),
+        name="snapshot-refresher",
+        daemon=True,
+    )
+    thread.start()
+    return stop
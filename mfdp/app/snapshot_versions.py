@@ -0,0 +1,248 @@
+"""Версионированные снапшоты рекомендаций.
+
+Каждый импорт пишет свою таблицу user_recommendations_s<id> и строку в
+snapshot_versions (число строк, хэш исходного файла, время загрузки).
+user_recommendations — представление поверх активного снапшота: промоут и
+откат — это CREATE OR REPLACE VIEW и смена статуса в одной транзакции.
+
+Статусы: loading → loaded → active; loaded ↔ active при промоуте/откате;
+failed — импорт упал; deleted — таблица удалена сборщиком мусора.
+Запасные списки сегментов (app.segments) живут и удаляются вместе со снапшотом.
+
+CLI: python -m app.snapshot_versions list | promote <id> | rollback | gc [N]
+"""
+import hashlib
+import os
+import sys
+
+from sqlalchemy import Column, MetaData, Table
+
+from app.models import SegmentRecommendation, SnapshotVersion, UserRecommendation
+
+TABLE = UserRecommendation.__tablename__
+VERSIONS_TABLE = SnapshotVersion.__tablename__
+SEGMENTS_TABLE = SegmentRecommendation.__tablename__
+# Сколько неактивных снапшотов держать для отката
+SNAPSHOT_RETENTION = int(os.getenv("SNAPSHOT_RETENTION", "3"))
+
+
+def snapshot_table_name(snapshot_id: int) -> str:
+    return f"{TABLE}_s{int(snapshot_id)}"
+
+
+def snapshot_table(snapshot_id: int) -> Table:
+    """Таблица снапшота со схемой модели, без индексов и ограничений."""
+    return Table(
+        snapshot_table_name(snapshot_id),
+        MetaData(),
+        *[Column(c.name, c.type) for c in UserRecommendation.__table__.columns],
+    )
+
+
+def drop_snapshot_data(cursor, snapshot_id: int):
+    """Таблица снапшота и его запасные списки сегментов."""
+    cursor.execute(f"DROP TABLE IF EXISTS {snapshot_table_name(snapshot_id)}")
+    cursor.execute(f"DELETE FROM {SEGMENTS_TABLE} WHERE snapshot_id = %s", (snapshot_id,))
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def active_snapshot(cursor):
+    """(id, source_hash) активного снапшота или None."""
+    cursor.execute(
+        f"SELECT id, source_hash FROM {VERSIONS_TABLE} WHERE status = 'active'"
+    )
+    return cursor.fetchone()
+
+
+def register_snapshot(cursor, source_file: str, source_hash: str) -> int:
+    cursor.execute(
+        f"INSERT INTO {VERSIONS_TABLE} (source_file, source_hash, status) "
+        "VALUES (%s, %s, 'loading') RETURNING id",
+        (source_file, source_hash),
+    )
+    return cursor.fetchone()[0]
+
+
+def mark_loaded(cursor, snapshot_id: int, row_count: int, rejected_count: int):
+    cursor.execute(
+        f"UPDATE {VERSIONS_TABLE} SET status = 'loaded', row_count = %s, "
+        "rejected_count = %s, loaded_at = now() WHERE id = %s",
+        (row_count, rejected_count, snapshot_id),
+    )
+
+
+def mark_failed(cursor, snapshot_id: int):
+    drop_snapshot_data(cursor, snapshot_id)
+    cursor.execute(
+        f"UPDATE {VERSIONS_TABLE} SET status = 'failed' WHERE id = %s",
+        (snapshot_id,),
+    )
+
+
+def _adopt_live_table(cursor):
+    """Живая таблица без версии (база без миграций) становится снапшотом.
+
+    Снапшотом становится только таблица с данными и текущими колонками;
+    пустую (из create_all) или старой схемы удаляем — на её место встанет
+    представление. Возвращает id активного снапшота или None.
+    """
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (TABLE,))
+    found = cursor.fetchone()
+    if found is None or found[0] != "r":
+        return None
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns "
+        "WHERE table_schema = current_schema() AND table_name = %s",
+        (TABLE,),
+    )
+    columns = {row[0] for row in cursor.fetchall()}
+    cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {TABLE})")
+    has_rows = cursor.fetchone()[0]
+    if not has_rows or not set(UserRecommendation.__table__.columns.keys()) <= columns:
+        cursor.execute(f"DROP TABLE {TABLE}")
+        return None
+    cursor.execute(
+        f"INSERT INTO {VERSIONS_TABLE} (source_file, row_count, status, activated_at) "
+        f"SELECT 'legacy', count(*), 'active', now() FROM {TABLE} RETURNING id"
+    )
+    snapshot_id = cursor.fetchone()[0]
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {snapshot_table_name(snapshot_id)}")
+    return snapshot_id
+
+
+def promote(cursor, snapshot_id: int):
+    """Делает снапшот активным. Вызывающий коммитит транзакцию.
+
+    Таблица снапшота уже загружена, проиндексирована и проанализирована,
+    поэтому переключение — только замена представления.
+    """
+    cursor.execute("SET LOCAL lock_timeout = '10s'")
+    # Промоуты и откаты идут строго по одному
+    cursor.execute(f"LOCK TABLE {VERSIONS_TABLE} IN SHARE ROW EXCLUSIVE MODE")
+    cursor.execute(
+        f"SELECT status FROM {VERSIONS_TABLE} WHERE id = %s", (snapshot_id,)
+    )
+    found = cursor.fetchone()
+    if found is None or found[0] not in ("loaded", "active"):
+        raise ValueError(f"Снапшот {snapshot_id} нельзя сделать активным: {found}")
+    if found[0] == "active":
+        return
+
+    if active_snapshot(cursor) is None:
+        _adopt_live_table(cursor)
+    cursor.execute(
+        f"UPDATE {VERSIONS_TABLE} SET status = 'loaded' WHERE status = 'active'"
+    )
+    cursor.execute(
+        f"CREATE OR REPLACE VIEW {TABLE} AS "
+        f"SELECT * FROM {snapshot_table_name(snapshot_id)}"
+    )
+    cursor.execute(
+        f"UPDATE {VERSIONS_TABLE} SET status = 'active', activated_at = now() "
+        "WHERE id = %s",
+        (snapshot_id,),
+    )
+
+
+def rollback_target(cursor):
+    """Id снапшота, на который откатится rollback, или None."""
+    cursor.execute(
+        f"SELECT id FROM {VERSIONS_TABLE} WHERE status = 'loaded' "
+        "AND activated_at IS NOT NULL ORDER BY activated_at DESC, id DESC LIMIT 1"
+    )
+    found = cursor.fetchone()
+    return found[0] if found else None
+
+
+def rollback(cursor) -> int:
+    """Возвращает снапшот, который был активен до текущего. Отдаёт его id.
+
+    Порядок — по времени активации, а не по id: снапшот, загруженный с
+    --no-promote и ни разу не бывший активным, откатом не выбирается.
+    """
+    active = active_snapshot(cursor)
+    if active is None:
+        raise ValueError("Нет активного снапшота")
+    previous = rollback_target(cursor)
+    if previous is None:
+        raise ValueError(f"Нет снапшота, активного до {active[0]}, для отката")
+    promote(cursor, previous)
+    return previous
+
+
+def collect_garbage(cursor, retention: int = SNAPSHOT_RETENTION):
+    """Удаляет таблицы снапшотов сверх retention последних неактивных.
+
+    Цель отката (последний бывший активным) хранится всегда и в retention
+    не считается: иначе серия импортов с --no-promote вытеснила бы его.
+    Метаданные остаются в snapshot_versions как история импортов.
+    Возвращает список удалённых id.
+    """
+    keep = rollback_target(cursor)
+    cursor.execute(
+        f"SELECT id FROM {VERSIONS_TABLE} WHERE status = 'loaded' "
+        "AND id IS DISTINCT FROM %s ORDER BY id DESC OFFSET %s",
+        (keep, retention),
+    )
+    dropped = []
+    for (snapshot_id,) in cursor.fetchall():
+        drop_snapshot_data(cursor, snapshot_id)
+        cursor.execute(
+            f"UPDATE {VERSIONS_TABLE} SET status = 'deleted' WHERE id = %s",
+            (snapshot_id,),
+        )
+        dropped.append(snapshot_id)
+    return dropped
+
+
+def list_snapshots(cursor):
+    cursor.execute(
+        "SELECT id, status, row_count, rejected_count, source_file, source_hash, "
+        f"loaded_at, activated_at FROM {VERSIONS_TABLE} ORDER BY id DESC"
+    )
+    return cursor.fetchall()
+
+
+def main(argv):
+    from app.database import configure, get_engine
+
+    configure("importer")
+    command = argv[0] if argv else "list"
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        if command == "list":
+            for row in list_snapshots(cursor):
+                snapshot_id, status, rows, rejected, source, digest, loaded, activated = row
+                print(
+                    f"{snapshot_id:>5} {status:<8} строк={rows} отклонено={rejected} "
+                    f"{source} {(digest or '')[:12]} загружен={loaded} активен={activated}"
+                )
+        elif command == "promote":
+            promote(cursor, int(argv[1]))
+            print(f"Активен снапшот {argv[1]}")
+        elif command == "rollback":
+            print(f"Откат на снапшот {rollback(cursor)}")
+        elif command == "gc":
+            retention = int(argv[1]) if len(argv) > 1 else SNAPSHOT_RETENTION
+            print(f"Удалены снапшоты: {collect_garbage(cursor, retention)}")
+        else:
+            print(__doc__)
+            return
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
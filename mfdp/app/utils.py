@@ -1,6 +1,47 @@
-from app.items import ITEMS_MAPPING
+import json
+
+from app import items
+from app.field_mapping import PROFILE_FIELD_NAMES
+from app.metrics import RENDER_PRODUCTS_SECONDS
 
 
 def get_product_info(product_id):
-    info = ITEMS_MAPPING.get(product_id, {"category": "Unknown", "emoji": "❓"})
+    info = items.CATALOG.info(product_id)
     return f"{info['emoji']} {product_id} ({info['category']})"
+
+
+@RENDER_PRODUCTS_SECONDS.time()
+def render_products(product_ids):
+    return items.CATALOG.render(product_ids)
+
+
+def build_profile(values):
+    """Профиль с русскими названиями полей из словаря колонок модели."""
+    return {
+        name: values[column]
+        for column, name in PROFILE_FIELD_NAMES.items()
+        if column in values
+    }
+
+
+def render_payload(household_key, profile, recommendations) -> bytes:
+    """Готовое тело ответа /recommendations/{user_id}."""
+    return json.dumps(
+        {
+            "household_key": household_key,
+            "profile": profile,
+            "recommendations": recommendations,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def render_telegram_text(household_key, profile, recommendations) -> str:
+    """Готовое сообщение бота (parse_mode=Markdown)."""
+    profile_str = "\n".join([f"{k}: {v}" for k, v in profile.items()])
+    recommendations_str = "\n".join(recommendations)
+    return (
+        f"👤 *Профиль пользователя {household_key}*: \n{profile_str}\n\n"
+        f"🛍️ Рекомендации: \n{recommendations_str}"
+    )
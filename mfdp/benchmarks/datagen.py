@@ -0,0 +1,161 @@
+"""Синтетические recommendations_results.csv и dict_items.xls для бенчмарков.
+
+Данные повторяют формат импорта (household_key, профиль, rec_1..rec_N,
+score_1..score_N) и справочника (PRODUCT_ID, DEPARTMENT, EMODZI);
+генерация детерминирована seed — одинаковые размеры дают одинаковые файлы.
+
+Популярность товаров скошена: несколько процентов каталога покрывают
+большую часть рекомендаций, как в реальной выдаче.
+
+CLI: python -m benchmarks.datagen small|medium|large|<число домохозяйств> [каталог]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+SIZES = {"small": 2_500, "medium": 250_000, "large": 2_500_000}
+BENCH_DATA_DIR = os.getenv("BENCH_DATA_DIR", "benchmarks/data")
+BENCH_PRODUCTS = int(os.getenv("BENCH_PRODUCTS", "92000"))
+BENCH_TOP_N = int(os.getenv("BENCH_TOP_N", "50"))
+BENCH_SEED = int(os.getenv("BENCH_SEED", "42"))
+CHUNK_ROWS = 100_000
+
+FIRST_PRODUCT_ID = 25_671
+
+DEMOGRAPHICS = {
+    "AGE_DESC": ["19-24", "25-34", "35-44", "45-54", "55-64", "65+"],
+    "INCOME_DESC": [
+        "Under 15K", "15-24K", "25-34K", "35-49K", "50-74K", "75-99K",
+        "100-124K", "125-149K", "150-174K", "175-199K", "200-249K", "250K+",
+    ],
+    "MARITAL_STATUS_CODE": ["A", "B", "U"],
+    "HOMEOWNER_DESC": ["Homeowner", "Renter", "Probable Owner", "Probable Renter", "Unknown"],
+    "HH_COMP_DESC": [
+        "1 Adult Kids", "2 Adults Kids", "2 Adults No Kids",
+        "Single Female", "Single Male", "Unknown",
+    ],
+    "HOUSEHOLD_SIZE_DESC": ["1", "2", "3", "4", "5+"],
+    "KID_CATEGORY_DESC": ["1", "2", "3+", "None/Unknown"],
+}
+
+DEPARTMENTS = [
+    "GROCERY", "DRUG GM", "PRODUCE", "MEAT", "MEAT-PCKGD", "DELI",
+    "PASTRY", "NUTRITION", "SEAFOOD-PCKGD", "FROZEN GROCERY", "KIOSK-GAS",
+]
+EMOJIS = ["🛒", "💊", "🥦", "🥩", "🥓", "🥪", "🥐", "🥗", "🐟", "🧊", "⛽"]
+
+
+def size_households(size: str) -> int:
+    return SIZES[size] if size in SIZES else int(size)
+
+
+def product_ids(n_products: int = BENCH_PRODUCTS) -> np.ndarray:
+    return FIRST_PRODUCT_ID + np.arange(n_products, dtype=np.int64) * 7
+
+
+def recommendation_chunk(
+    rng: np.random.Generator, keys: np.ndarray, products: np.ndarray, top_n: int
+) -> pd.DataFrame:
+    rows = len(keys)
+    n_products = len(products)
+    frame = {"household_key": keys}
+    for column, values in DEMOGRAPHICS.items():
+        frame[column] = np.asarray(values, dtype=object)[rng.integers(len(values), size=rows)]
+
+    # Без повторов в строке: start + k·stride при k·stride < n различны по модулю n
+    start = (rng.pareto(1.2, size=rows) * n_products / 50).astype(np.int64) % n_products
+    stride = rng.integers(1, max(2, n_products // top_n), size=rows)
+    positions = (start[:, None] + stride[:, None] * np.arange(top_n)) % n_products
+    recommended = products[positions]
+    scores = -np.sort(-rng.random((rows, top_n)), axis=1)
+
+    for rank in range(top_n):
+        frame[f"rec_{rank + 1}"] = recommended[:, rank]
+    for rank in range(top_n):
+        frame[f"score_{rank + 1}"] = scores[:, rank].round(5)
+    return pd.DataFrame(frame)
+
+
+def write_recommendations_csv(
+    path: str,
+    households: int,
+    n_products: int = BENCH_PRODUCTS,
+    top_n: int = BENCH_TOP_N,
+    seed: int = BENCH_SEED,
+):
+    rng = np.random.default_rng(seed)
+    products = product_ids(n_products)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        for first in range(0, households, CHUNK_ROWS):
+            keys = np.arange(first + 1, min(first + CHUNK_ROWS, households) + 1)
+            recommendation_chunk(rng, keys, products, top_n).to_csv(
+                f, header=first == 0, index=False
+            )
+    os.replace(tmp_path, path)
+
+
+def write_items(path: str, n_products: int = BENCH_PRODUCTS, seed: int = BENCH_SEED):
+    """Справочник товаров в формате книги Excel.
+
+    pandas ≥ 2 не пишет старый .xls, поэтому содержимое — xlsx; read_excel
+    определяет формат по содержимому, имя файла остаётся dict_items.xls.
+    """
+    from openpyxl import Workbook
+
+    rng = np.random.default_rng(seed + 1)
+    departments = rng.integers(len(DEPARTMENTS), size=n_products)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(["PRODUCT_ID", "DEPARTMENT", "EMODZI"])
+    for product_id, department in zip(product_ids(n_products).tolist(), departments.tolist()):
+        sheet.append([product_id, DEPARTMENTS[department], EMOJIS[department]])
+    tmp_path = path + ".tmp"
+    workbook.save(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def dataset_dir(size: str, base_dir: str = BENCH_DATA_DIR) -> str:
+    return os.path.join(base_dir, str(size))
+
+
+def generate(size: str, base_dir: str = BENCH_DATA_DIR, force: bool = False) -> str:
+    """Каталог набора с data/recommendations_results.csv и data/dict_items.xls.
+
+    Раскладка как у сервиса: запуск из этого каталога находит файлы по
+    путям по умолчанию. Готовый набор не перегенерируется без force.
+    """
+    households = size_households(size)
+    root = dataset_dir(size, base_dir)
+    data_dir = os.path.join(root, "data")
+    os.makedirs(data_dir, exist_ok=True)
+    csv_path = os.path.join(data_dir, "recommendations_results.csv")
+    items_path = os.path.join(data_dir, "dict_items.xls")
+
+    if force or not os.path.exists(items_path):
+        started = time.perf_counter()
+        write_items(items_path)
+        print(f"Справочник: {BENCH_PRODUCTS} товаров, {time.perf_counter() - started:.1f} с")
+    if force or not os.path.exists(csv_path):
+        started = time.perf_counter()
+        write_recommendations_csv(csv_path, households)
+        print(
+            f"Рекомендации: {households} домохозяйств × {BENCH_TOP_N}, "
+            f"{time.perf_counter() - started:.1f} с"
+        )
+    return root
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return
+    root = generate(argv[0], argv[1] if len(argv) > 1 else BENCH_DATA_DIR, force=True)
+    print(f"Набор данных: {root}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,400 @@
+"""Воспроизводимый бенчмарк API, воркера и импорта.
+
+Набор данных генерируется benchmarks.datagen (2.5k / 250k / 2.5M домохозяйств),
+инфраструктура — локальные заменители из benchmarks.stands. Сценарии:
+- catalog.build — конвертация справочника в бинарный артефакт;
+- import.render — разбор CSV и рендер готовых ответов (импорт без БД);
+- import.copy — import_csv целиком: COPY, индекс, промоут (нужна БД);
+- snapshot.load — сборка снапшота в памяти (из БД или из CSV);
+- api.recommendations.snapshot / .db — GET /recommendations/{id} из снапшота и из БД;
+- api.requests — GET /requests/{login} (нужна БД);
+- worker.snapshot / .db — process_batch на пачках WORKER_BATCH_SIZE.
+
+Нагрузку на API даёт отдельный процесс (httpx, asyncio, BENCH_CONCURRENCY
+одновременных запросов), чтобы клиент не делил GIL с сервером. Результаты
+пишутся в JSON (BENCH_RESULTS_DIR) и сравниваются с базовым прогоном.
+
+CLI:
+  python -m benchmarks.run [small|medium|large|<число>] [--duration=10]
+      [--concurrency=32] [--baseline=результаты.json] [--no-db]
+  python -m benchmarks.run compare базовый.json новый.json
+"""
+import asyncio
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from dotenv import load_dotenv
+
+from benchmarks.datagen import BENCH_SEED, generate, size_households
+from benchmarks.stands import (
+    FakeChannel,
+    bench_app,
+    database_stand,
+    request_messages,
+    serve,
+    snapshot_from_csv,
+)
+
+BENCH_RESULTS_DIR = os.getenv("BENCH_RESULTS_DIR", "benchmarks/results")
+BENCH_DURATION = float(os.getenv("BENCH_DURATION", "10"))  # секунд на сценарий API
+BENCH_WARMUP = float(os.getenv("BENCH_WARMUP", "2"))
+BENCH_CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "32"))
+BENCH_PATHS = int(os.getenv("BENCH_PATHS", "10000"))  # различных URL в прогоне
+BENCH_WORKER_MESSAGES = int(os.getenv("BENCH_WORKER_MESSAGES", "50000"))
+BENCH_LOGINS = int(os.getenv("BENCH_LOGINS", "1000"))
+BENCH_REQUESTS_PER_LOGIN = int(os.getenv("BENCH_REQUESTS_PER_LOGIN", "20"))
+# Допустимое ухудшение относительно базового прогона
+BENCH_TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.10"))
+
+CSV_PATH = "data/recommendations_results.csv"
+LOGIN_PREFIX = "bench_"
+
+
+def in_subprocess(target, *args):
+    """Выполняет target в отдельном чистом процессе (spawn) и отдаёт результат."""
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(target, *args).result()
+
+
+def latency_summary(latencies, elapsed: float, errors: int = 0) -> dict:
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (np.nan,) * 3
+    return {
+        "requests": int(len(ms)),
+        "errors": int(errors),
+        "rps": len(ms) / elapsed if elapsed else 0.0,
+        "mean_ms": float(ms.mean()) if len(ms) else float("nan"),
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+    }
+
+
+async def _drive(base_url, paths, concurrency, duration, warmup):
+    import httpx
+
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+
+    async def client_loop(client, deadline, record):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            path = paths[next(counter) % len(paths)]
+            started = time.perf_counter()
+            try:
+                failed = (await client.get(path)).status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if record:
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        elapsed = 0.0
+        for record, seconds in ((False, warmup), (True, duration)):
+            started = time.perf_counter()
+            deadline = started + seconds
+            await asyncio.gather(
+                *(client_loop(client, deadline, record) for _ in range(concurrency))
+            )
+            elapsed = time.perf_counter() - started
+    return latencies, elapsed, errors
+
+
+def _load_process(base_url, paths, concurrency, duration, warmup):
+    return latency_summary(
+        *asyncio.run(_drive(base_url, paths, concurrency, duration, warmup))
+    )
+
+
+def load_test(base_url, paths, concurrency=BENCH_CONCURRENCY, duration=BENCH_DURATION):
+    result = in_subprocess(_load_process, base_url, paths, concurrency, duration, BENCH_WARMUP)
+    result["concurrency"] = concurrency
+    return result
+
+
+def _import_process(csv_path):
+    import import_csv
+
+    started = time.perf_counter()
+    import_csv.main([csv_path, "--force"])
+    return time.perf_counter() - started
+
+
+def bench_import_render(csv_path):
+    from import_csv import copy_chunks
+
+    stats = {"rows": 0, "rejected": 0}
+    started = time.perf_counter()
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        for _ in copy_chunks(f, stats):
+            pass
+    elapsed = time.perf_counter() - started
+    return {
+        "rows": stats["rows"],
+        "rejected": stats["rejected"],
+        "seconds": elapsed,
+        "rows_per_sec": stats["rows"] / elapsed,
+    }
+
+
+def bench_import_copy(csv_path, households):
+    # Отдельный процесс: импортёр настраивает пул БД под свою роль
+    elapsed = in_subprocess(_import_process, csv_path)
+    return {"rows": households, "seconds": elapsed, "rows_per_sec": households / elapsed}
+
+
+def bench_worker(keys, batch_size):
+    from worker.model_worker import process_batch
+
+    messages = request_messages(keys)
+    channel = FakeChannel()
+    batch_latencies = []
+    started = time.perf_counter()
+    # Воркер печатает строку на пачку — в бенчмарке это шум
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for start in range(0, len(messages), batch_size):
+            batch_started = time.perf_counter()
+            process_batch(channel, messages[start : start + batch_size])
+            batch_latencies.append(time.perf_counter() - batch_started)
+    elapsed = time.perf_counter() - started
+    summary = latency_summary(batch_latencies, elapsed, channel.nacked)
+    return {
+        "messages": len(messages),
+        "published": channel.published,
+        "batch_size": batch_size,
+        "seconds": elapsed,
+        "messages_per_sec": len(messages) / elapsed,
+        "batch_p50_ms": summary["p50_ms"],
+        "batch_p95_ms": summary["p95_ms"],
+        "batch_p99_ms": summary["p99_ms"],
+        "errors": channel.nacked,
+    }
+
+
+def seed_requests(n_logins, per_login):
+    """История запросов для /requests/{login}: пересоздаётся на каждый прогон."""
+    from app.database import get_engine
+    from app.models import UserRequest
+
+    table = UserRequest.__table__
+    now = datetime.utcnow()
+    rows = [
+        {
+            "telegram_login": f"{LOGIN_PREFIX}{login}",
+            "requested_user_id": login * per_login + i,
+            "timestamp": now - timedelta(seconds=i),
+            "request_type": "manual" if i % 2 else "random",
+        }
+        for login in range(n_logins)
+        for i in range(per_login)
+    ]
+    with get_engine().begin() as connection:
+        connection.execute(table.delete().where(table.c.telegram_login.like(f"{LOGIN_PREFIX}%")))
+        connection.execute(table.insert(), rows)
+    return [f"/api/v1/requests/{LOGIN_PREFIX}{login}" for login in range(n_logins)]
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:
+        return ""
+
+
+def run(size, duration=BENCH_DURATION, concurrency=BENCH_CONCURRENCY, use_db=True) -> dict:
+    households = size_households(size)
+    root = os.path.abspath(generate(size))
+    commit = git_commit()
+    results, skipped = {}, {}
+    rng = np.random.default_rng(BENCH_SEED)
+
+    with database_stand() as has_db:
+        has_db = has_db and use_db
+        # Пути сервиса по умолчанию (data/...) указывают на сгенерированный набор
+        os.chdir(root)
+        from app.database import configure
+        from app.items import build_catalog, load_items_mapping
+        from app.snapshot import get_snapshot, refresh_snapshot, set_snapshot
+        from worker.model_worker import WORKER_BATCH_SIZE
+
+        started = time.perf_counter()
+        build_catalog()
+        results["catalog.build"] = {"seconds": time.perf_counter() - started}
+        load_items_mapping()
+
+        print("Сценарий import.render")
+        results["import.render"] = bench_import_render(CSV_PATH)
+        if has_db:
+            print("Сценарий import.copy")
+            results["import.copy"] = bench_import_copy(CSV_PATH, households)
+        else:
+            skipped["import.copy"] = "нет БД"
+
+        configure("api")
+        started = time.perf_counter()
+        if has_db:
+            refresh_snapshot(force=True)
+            snapshot = get_snapshot()
+        else:
+            snapshot = snapshot_from_csv(CSV_PATH)
+            set_snapshot(snapshot)
+        results["snapshot.load"] = {
+            "source": "db" if has_db else "csv",
+            "households": len(snapshot),
+            "seconds": time.perf_counter() - started,
+        }
+
+        keys = rng.choice(snapshot.keys, size=min(BENCH_PATHS, len(snapshot)), replace=False)
+        paths = [f"/api/v1/recommendations/{key}" for key in keys.tolist()]
+        worker_keys = rng.choice(snapshot.keys, size=BENCH_WORKER_MESSAGES)
+
+        with serve(bench_app()) as base_url:
+            print("Сценарий api.recommendations.snapshot")
+            results["api.recommendations.snapshot"] = load_test(
+                base_url, paths, concurrency, duration
+            )
+            if has_db:
+                login_paths = seed_requests(BENCH_LOGINS, BENCH_REQUESTS_PER_LOGIN)
+                print("Сценарий api.requests")
+                results["api.requests"] = load_test(base_url, login_paths, concurrency, duration)
+                set_snapshot(None)
+                print("Сценарий api.recommendations.db")
+                results["api.recommendations.db"] = load_test(
+                    base_url, paths, concurrency, duration
+                )
+                set_snapshot(snapshot)
+            else:
+                skipped["api.requests"] = skipped["api.recommendations.db"] = "нет БД"
+
+        print("Сценарий worker.snapshot")
+        results["worker.snapshot"] = bench_worker(worker_keys, WORKER_BATCH_SIZE)
+        if has_db:
+            set_snapshot(None)
+            print("Сценарий worker.db")
+            results["worker.db"] = bench_worker(worker_keys, WORKER_BATCH_SIZE)
+            set_snapshot(snapshot)
+        else:
+            skipped["worker.db"] = "нет БД"
+
+    return {
+        "meta": {
+            "size": str(size),
+            "households": households,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "commit": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "duration": duration,
+            "concurrency": concurrency,
+            "worker_batch_size": WORKER_BATCH_SIZE,
+            "database": has_db,
+        },
+        "results": results,
+        "skipped": skipped,
+    }
+
+
+def metric_direction(metric: str) -> int:
+    """+1 — чем больше, тем лучше; -1 — чем меньше; 0 — не сравнивается."""
+    if metric == "rps" or metric.endswith("_per_sec"):
+        return 1
+    if metric.endswith("_ms") or metric == "seconds":
+        return -1
+    return 0
+
+
+def compare(baseline: dict, current: dict, tolerance: float = BENCH_TOLERANCE) -> list:
+    """Печатает изменения метрик и отдаёт ухудшившиеся сверх tolerance."""
+    if baseline["meta"].get("size") != current["meta"].get("size"):
+        print(
+            f"Предупреждение: размеры наборов различаются — "
+            f"{baseline['meta'].get('size')} и {current['meta'].get('size')}"
+        )
+    regressions = []
+    print(f"{'сценарий':<32} {'метрика':<18} {'база':>12} {'сейчас':>12} {'изм.':>8}")
+    for name, metrics in current["results"].items():
+        base = baseline["results"].get(name, {})
+        for metric, value in metrics.items():
+            direction = metric_direction(metric)
+            if not direction or not base.get(metric):
+                continue
+            change = value / base[metric] - 1
+            regressed = change * direction < -tolerance
+            if regressed:
+                regressions.append((name, metric, change))
+            print(
+                f"{name:<32} {metric:<18} {base[metric]:>12.2f} {value:>12.2f} "
+                f"{change:>+8.1%}{'  ← хуже' if regressed else ''}"
+            )
+    if regressions:
+        print(f"Ухудшений сверх {tolerance:.0%}: {len(regressions)}")
+    return regressions
+
+
+def write_results(results: dict, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(out_dir, f"{results['meta']['size']}-{stamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv):
+    load_dotenv()
+    args = [a for a in argv if not a.startswith("--")]
+    options = dict(
+        a[2:].split("=", 1) if "=" in a else (a[2:], "") for a in argv if a.startswith("--")
+    )
+
+    if args and args[0] == "compare":
+        if len(args) != 3:
+            print(__doc__)
+            return
+        regressions = compare(load_results(args[1]), load_results(args[2]))
+        sys.exit(1 if regressions else 0)
+
+    # Пути результатов — до смены каталога на набор данных
+    out_dir = os.path.abspath(options.get("out", BENCH_RESULTS_DIR))
+    baseline = options.get("baseline")
+    baseline = load_results(baseline) if baseline else None
+
+    results = run(
+        args[0] if args else "small",
+        duration=float(options.get("duration", BENCH_DURATION)),
+        concurrency=int(options.get("concurrency", BENCH_CONCURRENCY)),
+        use_db="no-db" not in options,
+    )
+    path = write_results(results, out_dir)
+    print(json.dumps(results["results"], ensure_ascii=False, indent=2))
+    print(f"Результаты: {path}")
+    if baseline is not None and compare(baseline, results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,165 @@
+"""Локальные заменители инфраструктуры для бенчмарков.
+
+- Postgres: DB_* из окружения (локальный сервер) или встроенный через
+  testing.postgresql при BENCH_EMBEDDED_PG=1; без БД сценарии с ней пропускаются;
+- RabbitMQ: FakeChannel — канал в памяти с теми методами, что вызывает
+  process_batch; сообщения подаются воркеру напрямую, без брокера;
+- API: те же роутеры, что в app.main, но без побочных эффектов импорта main
+  (ожидание БД, загрузка снапшота, слушатель результатов) — под uvicorn
+  в фоновом потоке.
+
+Модули app читают DB_* при импорте, поэтому database_stand() входит
+раньше, чем импортируется что-либо из app.
+"""
+import csv
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+BENCH_EMBEDDED_PG = os.getenv("BENCH_EMBEDDED_PG", "0") == "1"
+
+
+@contextmanager
+def database_stand():
+    """Отдаёт True, если Postgres доступен; при BENCH_EMBEDDED_PG=1 поднимает свой."""
+    if BENCH_EMBEDDED_PG:
+        import testing.postgresql
+
+        with testing.postgresql.Postgresql() as postgresql:
+            dsn = postgresql.dsn()
+            os.environ.update(
+                DB_HOST=dsn["host"],
+                DB_PORT=str(dsn["port"]),
+                DB_NAME=dsn["database"],
+                DB_USER=dsn["user"],
+                DB_PASSWORD="",
+            )
+            yield database_available()
+        return
+    yield database_available()
+
+
+def database_available() -> bool:
+    if not os.getenv("DB_HOST"):
+        return False
+    import psycopg2
+
+    try:
+        psycopg2.connect(
+            host=os.getenv("DB_HOST"),
+            port=os.getenv("DB_PORT"),
+            dbname=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            connect_timeout=3,
+        ).close()
+        return True
+    except Exception as e:
+        print(f"БД недоступна, сценарии с ней пропускаются — {e}")
+        return False
+
+
+class FakeChannel:
+    """Канал pika в памяти: считает публикации и подтверждения."""
+
+    def __init__(self):
+        self.published = 0
+        self.acked = 0
+        self.nacked = 0
+        self.last_ack = None
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published += 1
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acked += 1
+        self.last_ack = delivery_tag
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.nacked += 1
+
+
+def request_messages(user_ids, first_tag: int = 1):
+    """Сообщения очереди запросов в виде (method, properties, body), как их отдаёт pika."""
+    return [
+        (
+            SimpleNamespace(delivery_tag=first_tag + i),
+            SimpleNamespace(correlation_id=None, headers={"published_at": time.time()}),
+            json.dumps({"user_id": int(user_id), "job_id": f"bench-{i}"}).encode(),
+        )
+        for i, user_id in enumerate(user_ids)
+    ]
+
+
+def snapshot_from_csv(csv_path: str, version: int = 1):
+    """Снапшот прямо из CSV импорта: тот же разбор и рендер, что у import_csv, без БД."""
+    from app.snapshot import build_snapshot
+    from import_csv import CHUNK_SIZE, parse_row, ranked_columns, render_chunk
+
+    def rows():
+        with open(csv_path, newline="", encoding="utf-8") as f:
+            reader = csv.DictReader(f)
+            rec_columns = ranked_columns(reader.fieldnames, "rec_")
+            score_columns = ranked_columns(reader.fieldnames, "score_")
+            while True:
+                chunk = list(itertools.islice(reader, CHUNK_SIZE))
+                if not chunk:
+                    return
+                parsed = [parse_row(row, rec_columns, score_columns) for row in chunk]
+                render_chunk(parsed)
+                for data in parsed:
+                    yield SimpleNamespace(**data)
+
+    return build_snapshot(version, rows())
+
+
+def bench_app():
+    """FastAPI с роутерами сервиса под тем же префиксом, что в app.main."""
+    from fastapi import FastAPI
+
+    from app.api import router as api_router
+    from app.requests_api import router as requests_router
+
+    app = FastAPI(title="MFDP benchmark")
+    app.include_router(api_router, prefix="/api/v1")
+    app.include_router(requests_router, prefix="/api/v1")
+    return app
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(app, port: int = 0):
+    """uvicorn в фоновом потоке; отдаёт базовый URL, останавливается при выходе."""
+    import uvicorn
+
+    class Server(uvicorn.Server):
+        def install_signal_handlers(self):
+            # Сигналы остаются у основного потока
+            pass
+
+    port = port or free_port()
+    server = Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 30
+    while not server.started:
+        if not thread.is_alive() or time.monotonic() > deadline:
+            raise RuntimeError("uvicorn не запустился")
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
@@ -1,35 +1,56 @@
 import csv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import io
+import itertools
+import sys
+from sqlalchemy.schema import CreateTable
 from app.models import UserRecommendation, UserRequest
+from app.items import load_items_mapping
+from app.segments import compute_segments
+from app.snapshot_versions import (
+    active_snapshot,
+    collect_garbage,
+    file_hash,
+    mark_failed,
+    mark_loaded,
+    promote,
+    register_snapshot,
+    snapshot_table,
+)
+from app.utils import (
+    build_profile,
+    render_payload,
+    render_products,
+    render_telegram_text,
+)
 from dotenv import load_dotenv
-from app.database import Base
+from app.database import Base, configure, get_engine, wait_for_db
 import os
-from sqlalchemy.exc import OperationalError
 import time
 
 load_dotenv()
 
-# Подключение к БД
-engine = create_engine(
-    f"postgresql://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
-)
+CSV_PATH = "data/recommendations_results.csv"
+CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "50000"))
+TOP_N = 10
+
+COLUMNS = [c.name for c in UserRecommendation.__table__.columns]
 
-# Ждём, пока БД будет доступна
-for _ in range(10):
-    try:
-        Base.metadata.create_all(bind=engine)
-        break
-    except OperationalError:
-        print("⏳ Waiting for database...")
-        time.sleep(1)
-else:
-    raise Exception("Database not available")
 
-SessionLocal = sessionmaker(bind=engine)
+def ranked_columns(fieldnames, prefix):
+    """rec_1..rec_N (или score_1..score_N) в порядке ранга."""
+    columns = [
+        name
+        for name in fieldnames
+        if name.startswith(prefix) and name[len(prefix) :].isdigit()
+    ]
+    return sorted(columns, key=lambda name: int(name[len(prefix) :]))
 
 
-def parse_row(row):
+def parse_row(row, rec_columns, score_columns):
+    candidates = [int(row[c]) for c in rec_columns if row[c] not in ("", None)]
+    scores = [float(row[c]) for c in score_columns if row[c] not in ("", None)]
+    if scores and len(scores) != len(candidates):
+        raise ValueError("число score_* не совпадает с числом rec_*")
     return {
         "household_key": int(row["household_key"]),
         "age_desc": row["AGE_DESC"],
@@ -39,35 +60,173 @@ def parse_row(row):
         "hh_comp_desc": row["HH_COMP_DESC"],
         "household_size_desc": row["HOUSEHOLD_SIZE_DESC"],
         "kid_category_desc": row["KID_CATEGORY_DESC"],
-        "recommendations": [int(row[f"rec_{i}"]) for i in range(1, 11)],
+        "recommendations": candidates[:TOP_N],
+        "candidates": candidates,
+        "candidate_scores": scores or None,
     }
 
 
-def main():
-    # Очистка и создание таблицы
-    UserRecommendation.__table__.drop(engine, checkfirst=True)
-    UserRecommendation.__table__.create(engine, checkfirst=True)
-    db = SessionLocal()
-    csv_path = "data/recommendations_results.csv"
+def copy_value(value):
+    # Текстовый формат COPY: NULL = \N, массивы — литерал {1,2,3}
+    if value is None:
+        return "\\N"
+    if isinstance(value, list):
+        return "{" + ",".join(str(v) for v in value) + "}"
+    if isinstance(value, bytes):
+        # bytea в hex-формате; обратный слэш экранируется для COPY
+        return "\\\\x" + value.hex()
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
 
-    if not os.path.exists(csv_path):
-        print(f"Файл {csv_path} не найден!")
-        return
 
-    with open(csv_path, newline="", encoding="utf-8") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
+def render_chunk(parsed):
+    """Рендерит готовые ответы для чанка: один вызов справочника на весь чанк."""
+    labels = iter(
+        render_products([pid for data in parsed for pid in data["recommendations"]])
+    )
+    for data in parsed:
+        key = data["household_key"]
+        profile = build_profile(data)
+        recommendations = [next(labels) for _ in data["recommendations"]]
+        data["payload"] = render_payload(key, profile, recommendations)
+        data["telegram_text"] = render_telegram_text(key, profile, recommendations)
+
+
+def copy_line(data):
+    return "\t".join(copy_value(data[c]) for c in COLUMNS) + "\n"
+
+
+def copy_chunks(csvfile, stats):
+    """Разбирает CSV потоком и отдаёт готовые для COPY буферы по CHUNK_SIZE строк."""
+    reader = csv.DictReader(csvfile)
+    rec_columns = ranked_columns(reader.fieldnames, "rec_")
+    score_columns = ranked_columns(reader.fieldnames, "score_")
+    seen = set()
+    while True:
+        rows = list(itertools.islice(reader, CHUNK_SIZE))
+        if not rows:
+            return
+        parsed = []
+        for row in rows:
             try:
-                data = parse_row(row)
-                db.add(UserRecommendation(**data))
+                data = parse_row(row, rec_columns, score_columns)
+                if data["household_key"] in seen:
+                    raise ValueError("дубликат household_key")
+                seen.add(data["household_key"])
+                parsed.append(data)
             except Exception as e:
+                stats["rejected"] += 1
                 print(
                     f"Ошибка при обработке строки household_key={row.get('household_key')}: {e}"
                 )
+        render_chunk(parsed)
+        stats["rows"] += len(parsed)
+
+        buffer = io.StringIO()
+        buffer.writelines(copy_line(data) for data in parsed)
+        buffer.seek(0)
+        yield buffer
+
+
+def load_snapshot_table(cursor, snapshot_id, csvfile, stats):
+    # Схема — из модели, без индексов и ограничений: строим их один раз после загрузки
+    table = snapshot_table(snapshot_id)
+    cursor.execute(f"DROP TABLE IF EXISTS {table.name}")
+    cursor.execute(str(CreateTable(table).compile(dialect=get_engine().dialect)))
+    for buffer in copy_chunks(csvfile, stats):
+        cursor.copy_expert(f"COPY {table.name} ({', '.join(COLUMNS)}) FROM STDIN", buffer)
+        print(f"Загружено строк: {stats['rows']}")
+
+    cursor.execute(
+        f"ALTER TABLE {table.name} "
+        f"ADD CONSTRAINT {table.name}_pkey PRIMARY KEY (household_key)"
+    )
+    # Статистика готова до переключения: первые запросы к новой версии не холодные
+    cursor.execute(f"ANALYZE {table.name}")
+
+
+def main(argv=()):
+    # python import_csv.py [путь к CSV] [--no-promote] [--force]
+    args = [a for a in argv if not a.startswith("--")]
+    flags = {a for a in argv if a.startswith("--")}
+
+    # Общая фабрика соединений с настройками пула для роли импортёра
+    configure("importer")
+    wait_for_db()
+    Base.metadata.create_all(bind=get_engine())
+
+    csv_path = args[0] if args else CSV_PATH
+
+    if not os.path.exists(csv_path):
+        print(f"Файл {csv_path} не найден!")
+        return
+
+    source_hash = file_hash(csv_path)
+
+    # Справочник нужен для рендера готовых ответов
+    try:
+        load_items_mapping()
+    except Exception as e:
+        print(f"Предупреждение: Не удалось загрузить справочник товаров — {e}")
+
+    stats = {"rows": 0, "rejected": 0}
+    started = time.perf_counter()
+
+    connection = get_engine().raw_connection()
+    try:
+        cursor = connection.cursor()
+        active = active_snapshot(cursor)
+        if active is not None and active[1] == source_hash and "--force" not in flags:
+            print(f"Файл {csv_path} уже загружен как активный снапшот {active[0]}")
+            return
+
+        # Снапшот грузится рядом с активным — читатели его не видят до промоута
+        snapshot_id = register_snapshot(cursor, csv_path, source_hash)
+        connection.commit()
+        try:
+            with open(csv_path, newline="", encoding="utf-8") as csvfile:
+                load_snapshot_table(cursor, snapshot_id, csvfile, stats)
+            # Запасные списки сегментов считаются в той же транзакции, что и снапшот
+            segments = compute_segments(cursor, snapshot_id)
+            print(f"Запасные рекомендации: {segments} сегментов и список популярного")
+            mark_loaded(cursor, snapshot_id, stats["rows"], stats["rejected"])
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            mark_failed(cursor, snapshot_id)
+            connection.commit()
+            raise
+
+        if "--no-promote" in flags:
+            print(f"Снапшот {snapshot_id} загружен, активировать: "
+                  f"python -m app.snapshot_versions promote {snapshot_id}")
+        else:
+            promote(cursor, snapshot_id)
+            connection.commit()
+            print(f"Активен снапшот {snapshot_id}")
+
+        dropped = collect_garbage(cursor)
+        connection.commit()
+        if dropped:
+            print(f"Удалены старые снапшоты: {dropped}")
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
 
-        db.commit()
-        print("CSV успешно загружен в PostgreSQL")
+    elapsed = time.perf_counter() - started
+    print(
+        f"CSV успешно загружен в PostgreSQL: {stats['rows']} строк, "
+        f"отклонено {stats['rejected']}, {elapsed:.1f} с, "
+        f"{stats['rows'] / max(elapsed, 1e-9):.0f} строк/с"
+    )
 
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
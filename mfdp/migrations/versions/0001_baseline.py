@@ -0,0 +1,62 @@
+"""Базовая схема (таблицы, которые раньше создавал только create_all)
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Существующие базы уже содержат эти таблицы — создаём только недостающие.
+    # user_recommendations может быть и представлением: импорт успел раньше миграций
+    inspector = sa.inspect(op.get_bind())
+    existing = set(inspector.get_table_names()) | set(inspector.get_view_names())
+
+    if "user_recommendations" not in existing:
+        op.create_table(
+            "user_recommendations",
+            sa.Column("household_key", sa.Integer, primary_key=True),
+            sa.Column("age_desc", sa.String),
+            sa.Column("income_desc", sa.String),
+            sa.Column("marital_status_code", sa.String),
+            sa.Column("homeowner_desc", sa.String),
+            sa.Column("hh_comp_desc", sa.String),
+            sa.Column("household_size_desc", sa.String),
+            sa.Column("kid_category_desc", sa.String),
+            sa.Column("recommendations", sa.ARRAY(sa.Integer)),
+            sa.Column("candidates", sa.ARRAY(sa.Integer)),
+            sa.Column("candidate_scores", sa.ARRAY(sa.Float)),
+            sa.Column("payload", sa.LargeBinary),
+            sa.Column("telegram_text", sa.Text),
+        )
+
+    if "user_requests" not in existing:
+        op.create_table(
+            "user_requests",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("telegram_login", sa.String, index=True),
+            sa.Column("requested_user_id", sa.Integer),
+            sa.Column("timestamp", sa.DateTime, server_default=sa.func.now()),
+            sa.Column("request_type", sa.String),
+        )
+
+    if "snapshot_versions" not in existing:
+        op.create_table(
+            "snapshot_versions",
+            sa.Column("id", sa.Integer, primary_key=True),
+            sa.Column("row_count", sa.Integer),
+            sa.Column("loaded_at", sa.DateTime, server_default=sa.func.now()),
+        )
+
+
+def downgrade():
+    op.drop_table("snapshot_versions")
+    op.drop_table("user_requests")
+    op.drop_table("user_recommendations")
@@ -0,0 +1,32 @@
+"""Составной индекс (telegram_login, timestamp desc, id desc) для истории
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CONCURRENTLY не блокирует запись истории, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_requests_login_ts "
+            "ON user_requests (telegram_login, timestamp DESC, id DESC)"
+        )
+        # Старый индекс по одному логину — префикс нового, больше не нужен
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_user_requests_telegram_login")
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_requests_telegram_login "
+            "ON user_requests (telegram_login)"
+        )
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_user_requests_login_ts")
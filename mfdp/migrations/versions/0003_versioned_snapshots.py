@@ -0,0 +1,98 @@
+"""Версионированные снапшоты: метаданные импорта и представление user_recommendations
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+# Колонки, без которых таблицу нельзя читать как снапшот (load_snapshot, render_user)
+SNAPSHOT_COLUMNS = {
+    "household_key",
+    "recommendations",
+    "candidates",
+    "candidate_scores",
+    "payload",
+    "telegram_text",
+}
+
+
+def upgrade():
+    # Импортёр и API делают create_all и могут успеть раньше миграции:
+    # тогда колонки, индекс или даже представление уже на месте
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = {c["name"] for c in inspector.get_columns("snapshot_versions")}
+    for column in (
+        sa.Column("rejected_count", sa.Integer),
+        sa.Column("source_file", sa.String),
+        sa.Column("source_hash", sa.String(64)),
+        sa.Column("status", sa.String),
+        sa.Column("activated_at", sa.DateTime),
+    ):
+        if column.name not in existing:
+            op.add_column("snapshot_versions", column)
+
+    if "status" not in existing:
+        # Старые версии указывали на единственную живую таблицу — её данных уже нет
+        op.execute("UPDATE snapshot_versions SET status = 'deleted'")
+    op.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS ux_snapshot_versions_active "
+        "ON snapshot_versions (status) WHERE status = 'active'"
+    )
+
+    # Представление уже создал промоут импортёра — переносить нечего
+    if "user_recommendations" not in inspector.get_table_names():
+        return
+    columns = {c["name"] for c in inspector.get_columns("user_recommendations")}
+    rows = bind.execute(sa.text("SELECT count(*) FROM user_recommendations")).scalar()
+    if not rows or not SNAPSHOT_COLUMNS <= columns:
+        # Пустая таблица из create_all или схема до кандидатов: снапшотом её не
+        # сделать, первый импорт создаст представление на её месте
+        op.execute("DROP TABLE user_recommendations")
+        return
+
+    # Живая таблица становится первым снапшотом, на её место — представление
+    snapshot_id = bind.execute(
+        sa.text(
+            "INSERT INTO snapshot_versions (source_file, row_count, status, activated_at) "
+            "SELECT 'legacy', count(*), 'active', now() FROM user_recommendations "
+            "RETURNING id"
+        )
+    ).scalar()
+    table = f"user_recommendations_s{snapshot_id}"
+    op.execute(f"ALTER TABLE user_recommendations RENAME TO {table}")
+    op.execute(
+        f"ALTER TABLE {table} RENAME CONSTRAINT user_recommendations_pkey TO {table}_pkey"
+    )
+    op.execute(f"CREATE VIEW user_recommendations AS SELECT * FROM {table}")
+
+
+def downgrade():
+    # Активный снапшот снова становится живой таблицей; остальные снапшоты
+    # остаются как есть и удаляются вручную
+    bind = op.get_bind()
+    snapshot_id = bind.execute(
+        sa.text("SELECT id FROM snapshot_versions WHERE status = 'active'")
+    ).scalar()
+    table = f"user_recommendations_s{snapshot_id}"
+    op.execute("DROP VIEW user_recommendations")
+    op.execute(f"ALTER TABLE {table} RENAME TO user_recommendations")
+    op.execute(
+        f"ALTER TABLE user_recommendations RENAME CONSTRAINT {table}_pkey "
+        "TO user_recommendations_pkey"
+    )
+
+    op.drop_index("ux_snapshot_versions_active", table_name="snapshot_versions")
+    op.drop_column("snapshot_versions", "activated_at")
+    op.drop_column("snapshot_versions", "status")
+    op.drop_column("snapshot_versions", "source_hash")
+    op.drop_column("snapshot_versions", "source_file")
+    op.drop_column("snapshot_versions", "rejected_count")
@@ -0,0 +1,31 @@
+"""Запасные рекомендации по демографическим сегментам для каждого снапшота
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Импортёр и API делают create_all и могут успеть раньше миграции
+    if "segment_recommendations" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    # Для уже активного снапшота: python -m app.segments
+    op.create_table(
+        "segment_recommendations",
+        sa.Column("snapshot_id", sa.Integer, primary_key=True),
+        sa.Column("segment_key", sa.String, primary_key=True),
+        sa.Column("households", sa.Integer),
+        sa.Column("recommendations", sa.ARRAY(sa.Integer)),
+    )
+
+
+def downgrade():
+    op.drop_table("segment_recommendations")
@@ -0,0 +1,206 @@
+"""Отбор кандидатов перед XGBRanker.
+
+Вместо всего каталога ранкер скорит несколько сотен товаров на пользователя
+из дешёвых источников:
+- история: самые покупаемые пользователем товары;
+- совместные покупки: соседи купленных товаров по матрице взаимодействий
+  (та же users × items, что строит create_interaction_matrix в ноутбуке);
+- популярное: самые покупаемые товары в целом;
+- похожие пользователи (если есть граф offline.similarity): их покупки.
+
+Потеря полноты относительно полного скоринга настраивается размерами источников
+и измеряется candidate_recall на выборке пользователей.
+"""
+import os
+import time
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from offline.scoring import SCORING_CHUNK_PAIRS, ScoringData, score_users
+from offline.similarity import recommend_user_based
+
+CANDIDATES_HISTORY = int(os.getenv("CANDIDATES_HISTORY", "100"))
+CANDIDATES_COPURCHASE = int(os.getenv("CANDIDATES_COPURCHASE", "200"))
+CANDIDATES_POPULAR = int(os.getenv("CANDIDATES_POPULAR", "100"))
+CANDIDATES_SIMILAR = int(os.getenv("CANDIDATES_SIMILAR", "100"))
+# Соседей на товар в матрице совместных покупок
+CANDIDATES_NEIGHBOURS = int(os.getenv("CANDIDATES_NEIGHBOURS", "50"))
+# Пользователей в выборке для замера полноты и порог, ниже которого предупреждаем
+CANDIDATES_RECALL_SAMPLE = int(os.getenv("CANDIDATES_RECALL_SAMPLE", "200"))
+CANDIDATES_MIN_RECALL = float(os.getenv("CANDIDATES_MIN_RECALL", "0.9"))
+# Товаров в блоке при подсчёте соседей: блок × каталог float32 в памяти
+NEIGHBOURS_BLOCK = int(os.getenv("NEIGHBOURS_BLOCK", "256"))
+
+
+def interaction_matrix(data: ScoringData) -> csr_matrix:
+    """Бинарная users × items: факт покупки, как в create_interaction_matrix."""
+    interactions = data.user_item.copy()
+    interactions.data = np.ones_like(interactions.data, dtype=np.float32)
+    return interactions
+
+
+def item_neighbours(
+    interactions: csr_matrix, k: int = CANDIDATES_NEIGHBOURS, block: int = NEIGHBOURS_BLOCK
+) -> csr_matrix:
+    """items × items: для каждого товара top-k соседей по косинусу совместных покупок.
+
+    Полная матрица совместных покупок не строится — только блоками по block
+    товаров, из каждого блока остаются k лучших соседей.
+    """
+    n_items = interactions.shape[1]
+    k = min(k, n_items - 1)
+    if k <= 0:
+        return csr_matrix((n_items, n_items), dtype=np.float32)
+    by_item = interactions.T.tocsr()
+    norms = np.sqrt(np.asarray(interactions.sum(axis=0), dtype=np.float32).ravel())
+
+    rows, cols, weights = [], [], []
+    for start in range(0, n_items, block):
+        stop = min(start + block, n_items)
+        co = (by_item[start:stop] @ interactions).toarray()
+        co[np.arange(stop - start), np.arange(start, stop)] = 0
+        co /= np.maximum(norms[start:stop, None] * norms[None, :], 1e-12)
+        top = np.argpartition(-co, k - 1, axis=1)[:, :k]
+        top_weights = np.take_along_axis(co, top, axis=1)
+        keep = top_weights > 0
+        rows.append(np.nonzero(keep)[0] + start)
+        cols.append(top[keep])
+        weights.append(top_weights[keep])
+    return csr_matrix(
+        (np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_items, n_items),
+    )
+
+
+def top_per_row(matrix: csr_matrix, k: int) -> np.ndarray:
+    """Столбцы k наибольших значений каждой строки, (rows, k); пусто — -1.
+
+    Одна сортировка всех ненулевых ячеек вместо цикла по строкам.
+    """
+    matrix = matrix.tocsr()
+    out = np.full((matrix.shape[0], k), -1, dtype=np.int64)
+    if k == 0 or matrix.nnz == 0:
+        return out
+    rows = np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr))
+    order = np.lexsort((matrix.indices, -matrix.data, rows))
+    rows = rows[order]
+    place = np.arange(len(order)) - matrix.indptr[rows]
+    keep = place < k
+    out[rows[keep], place[keep]] = matrix.indices[order][keep]
+    return out
+
+
+class CandidateGenerator:
+    """Кандидаты для чанка пользователей: позиции товаров в ScoringData."""
+
+    def __init__(
+        self,
+        data: ScoringData,
+        n_history: int = CANDIDATES_HISTORY,
+        n_copurchase: int = CANDIDATES_COPURCHASE,
+        n_popular: int = CANDIDATES_POPULAR,
+        n_neighbours: int = CANDIDATES_NEIGHBOURS,
+        user_graph=None,
+        n_similar: int = CANDIDATES_SIMILAR,
+    ):
+        """user_graph — NeighbourGraph в порядке data.household_keys (см. align)."""
+        started = time.perf_counter()
+        self.user_item = data.user_item
+        self.interactions = interaction_matrix(data)
+        self.neighbours = (
+            item_neighbours(self.interactions, n_neighbours) if n_copurchase else None
+        )
+        self.popular = np.argsort(-data.item_popularity, kind="stable")[:n_popular]
+        self.n_history = n_history
+        self.n_copurchase = n_copurchase
+        self.user_graph = user_graph
+        self.n_similar = n_similar if user_graph is not None else 0
+        print(
+            f"Кандидаты: история {n_history}, совместные покупки {n_copurchase}, "
+            f"популярное {len(self.popular)}, похожие пользователи {self.n_similar}; "
+            f"соседи товаров посчитаны за {time.perf_counter() - started:.1f} с"
+        )
+
+    @property
+    def size(self) -> int:
+        return self.n_history + self.n_copurchase + len(self.popular) + self.n_similar
+
+    def generate(self, users: np.ndarray) -> np.ndarray:
+        """(len(users), size) позиций товаров без повторов; пусто — -1."""
+        parts = [top_per_row(self.user_item[users], self.n_history)]
+        if self.neighbours is not None:
+            bought = self.interactions[users]
+            # Соседи купленного, без уже купленного — его даёт история
+            scores = bought @ self.neighbours
+            scores = scores - scores.multiply(bought)
+            scores.eliminate_zeros()
+            parts.append(top_per_row(scores, self.n_copurchase))
+        if self.n_similar:
+            parts.append(
+                recommend_user_based(self.user_graph, self.interactions, users, self.n_similar)
+            )
+        parts.append(np.broadcast_to(self.popular, (len(users), len(self.popular))))
+
+        candidates = np.sort(np.hstack(parts), axis=1)
+        repeated = np.zeros(candidates.shape, dtype=bool)
+        repeated[:, 1:] = candidates[:, 1:] == candidates[:, :-1]
+        candidates[repeated] = -1
+        return candidates
+
+
+def _score_chunked(model, data: ScoringData, users: np.ndarray, n: int, generator=None):
+    """score_users чанками по SCORING_CHUNK_PAIRS пар, как основной скоринг.
+
+    Без generator пользователь — это весь каталог (~90k пар), одним блоком
+    признаки выборки не помещаются в память.
+    """
+    per_user = generator.size if generator is not None else len(data.item_ids)
+    chunk_users = max(1, SCORING_CHUNK_PAIRS // max(per_user, 1))
+    product_ids = [
+        score_users(model, data, users[start : start + chunk_users], n, generator)[1]
+        for start in range(0, len(users), chunk_users)
+    ]
+    return np.vstack(product_ids)
+
+
+def candidate_recall(
+    model,
+    data: ScoringData,
+    generator: CandidateGenerator,
+    n: int = 10,
+    sample: int = CANDIDATES_RECALL_SAMPLE,
+    seed: int = 42,
+) -> float:
+    """Доля top-n полного скоринга, которую сохраняет скоринг по кандидатам.
+
+    Признаки пары не зависят от набора кандидатов, поэтому совпадение
+    выдач — ровно потеря полноты от отбора.
+    """
+    rng = np.random.default_rng(seed)
+    users = np.sort(
+        rng.choice(len(data.household_keys), min(sample, len(data.household_keys)), replace=False)
+    )
+    started = time.perf_counter()
+    full = _score_chunked(model, data, users, n)
+    full_elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    picked = _score_chunked(model, data, users, n, generator)
+    picked_elapsed = time.perf_counter() - started
+
+    hits = total = 0
+    for full_row, picked_row in zip(full, picked):
+        expected = set(full_row[full_row >= 0].tolist())
+        hits += len(expected & set(picked_row.tolist()))
+        total += len(expected)
+    recall = hits / total if total else 1.0
+    print(
+        f"Полнота кандидатов recall@{n}: {recall:.3f} на {len(users)} пользователях; "
+        f"скоринг {full_elapsed:.2f} с → {picked_elapsed:.2f} с"
+    )
+    if recall < CANDIDATES_MIN_RECALL:
+        print(
+            f"Предупреждение: полнота ниже CANDIDATES_MIN_RECALL={CANDIDATES_MIN_RECALL} — "
+            "увеличьте CANDIDATES_* или запустите полный скоринг (--full)"
+        )
+    return recall
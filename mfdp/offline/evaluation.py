@@ -0,0 +1,199 @@
+"""Офлайн-оценка рекомендаций: precision/recall/F1/MAP/NDCG/hit rate @N.
+
+Замена evaluate_recommendations из ноутбука: метрики считаются матрично по
+рекомендациям (users × N) и разреженной матрице фактических покупок,
+чанками и при желании в пуле процессов. Определения метрик — как в ноутбуке
+(пользователи без покупок или без рекомендаций пропускаются).
+
+Оценивает тот же recommendations_results.csv, что загружает сервис, — так
+снапшоты сравниваются до промоута.
+
+CLI: python -m offline.evaluation test_transactions.csv a.csv [b.csv ...] [--n=10]
+где test_transactions.csv — покупки тестового периода (household_key, PRODUCT_ID).
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+EVAL_CHUNK_USERS = int(os.getenv("EVAL_CHUNK_USERS", "50000"))
+EVAL_WORKERS = int(os.getenv("EVAL_WORKERS", "1"))
+
+METRICS = ["precision", "recall", "f_score", "map", "ndcg", "hit_rate"]
+METRIC_NAMES = {
+    "precision": "Precision",
+    "recall": "Recall",
+    "f_score": "F-score",
+    "map": "MAP",
+    "ndcg": "NDCG",
+    "hit_rate": "Hit Rate",
+}
+
+
+def chunk_metrics(recommendations: np.ndarray, truth: csr_matrix) -> Dict[str, float]:
+    """Суммы метрик по чанку и число оценённых пользователей (ключ "users",
+    для NDCG — "ndcg_users").
+
+    recommendations — столбцы truth по рангам, -1 — пусто; строка i
+    соответствует строке i матрицы truth.
+    """
+    n_users, n = recommendations.shape
+    recommended = recommendations >= 0
+    # Пустые места смотрят в заведомо пустой столбец за пределами матрицы
+    padded = csr_matrix(
+        (truth.data, truth.indices, truth.indptr), shape=(truth.shape[0], truth.shape[1] + 1)
+    )
+    columns = np.where(recommended, recommendations, truth.shape[1])
+    rows = np.repeat(np.arange(n_users), n)
+    hits = (
+        np.asarray(padded[rows, columns.ravel()]).reshape(n_users, n) > 0
+    ) & recommended
+
+    n_recommended = recommended.sum(axis=1)
+    n_relevant = np.diff(truth.indptr)
+    evaluated = (n_recommended > 0) & (n_relevant > 0)
+    hits, n_recommended, n_relevant = (
+        hits[evaluated],
+        n_recommended[evaluated],
+        n_relevant[evaluated],
+    )
+    n_hits = hits.sum(axis=1)
+
+    precision = n_hits / n_recommended
+    recall = n_hits / n_relevant
+    both = precision + recall
+    f_score = np.divide(2 * precision * recall, both, out=np.zeros_like(both), where=both > 0)
+
+    ranks = np.arange(1, n + 1)
+    average_precision = (hits * np.cumsum(hits, axis=1) / ranks).sum(axis=1) / n_relevant
+
+    # NDCG как ndcg_score ноутбука: идеал — те же попадания на первых местах
+    discount = 1.0 / np.log2(ranks + 1)
+    dcg = (hits * discount).sum(axis=1)
+    ideal = np.concatenate([[0.0], np.cumsum(discount)])[n_hits]
+    ndcg = np.divide(dcg, ideal, out=np.zeros_like(dcg), where=ideal > 0)
+    # На одной позиции ndcg_score падает, и ноутбук исключает такого пользователя из NDCG
+    ranked = n_recommended > 1
+
+    return {
+        "users": int(evaluated.sum()),
+        "precision": float(precision.sum()),
+        "recall": float(recall.sum()),
+        "f_score": float(f_score.sum()),
+        "map": float(average_precision.sum()),
+        "ndcg": float(ndcg[ranked].sum()),
+        "ndcg_users": int(ranked.sum()),
+        "hit_rate": float((n_hits > 0).sum()),
+    }
+
+
+def _chunk_task(args):
+    recommendations, truth = args
+    return chunk_metrics(recommendations, truth)
+
+
+def evaluate(
+    recommendations: np.ndarray,
+    truth: csr_matrix,
+    n: int = 10,
+    chunk_users: int = EVAL_CHUNK_USERS,
+    workers: int = EVAL_WORKERS,
+) -> Dict[str, float]:
+    """Средние метрики @n по всем пользователям с покупками и рекомендациями."""
+    recommendations = np.asarray(recommendations)[:, :n]
+    truth = csr_matrix(truth)
+    chunks = [
+        (recommendations[start : start + chunk_users], truth[start : start + chunk_users])
+        for start in range(0, len(recommendations), chunk_users)
+    ]
+    if workers <= 1 or len(chunks) == 1:
+        parts = list(map(_chunk_task, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_chunk_task, chunks))
+
+    totals = {key: sum(part[key] for part in parts) for key in parts[0]} if parts else {}
+    metrics = {}
+    for metric in METRICS:
+        users = totals.get("ndcg_users" if metric == "ndcg" else "users", 0)
+        metrics[metric] = totals[metric] / users if users else 0.0
+    return metrics
+
+
+def print_metrics(metrics: Dict[str, float], n: int = 10):
+    for metric in METRICS:
+        print(f"Mean {METRIC_NAMES[metric]}@{n}: {metrics[metric]:.4f}")
+
+
+def load_recommendations_csv(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    """household_keys и PRODUCT_ID по рангам (rec_1..rec_N, пусто — -1) из CSV импорта."""
+    header = pd.read_csv(path, nrows=0).columns
+    rec_columns = sorted(
+        (c for c in header if c.startswith("rec_") and c[4:].isdigit()),
+        key=lambda c: int(c[4:]),
+    )
+    frame = pd.read_csv(path, usecols=["household_key"] + rec_columns)
+    products = frame[rec_columns].fillna(-1).to_numpy(np.int64)
+    return frame["household_key"].to_numpy(np.int64), products
+
+
+def truth_matrix(
+    transactions: pd.DataFrame, household_keys: np.ndarray, product_ids: np.ndarray
+) -> Tuple[csr_matrix, np.ndarray]:
+    """Матрица покупок в порядке household_keys и рекомендации в её столбцах.
+
+    Товары рекомендаций, которых нет среди покупок, получают свой пустой
+    столбец — это промах, но позиция в выдаче остаётся занятой.
+    """
+    universe = pd.Index(
+        np.union1d(transactions["PRODUCT_ID"].unique(), product_ids[product_ids >= 0])
+    )
+    user_index = pd.Index(household_keys)
+    rows = user_index.get_indexer(transactions["household_key"])
+    cols = universe.get_indexer(transactions["PRODUCT_ID"])
+    known = rows >= 0
+    truth = csr_matrix(
+        (np.ones(known.sum(), dtype=np.float32), (rows[known], cols[known])),
+        shape=(len(household_keys), len(universe)),
+    )
+    truth.sum_duplicates()
+    # -1 (пустое место) в universe нет — остаётся -1
+    columns = universe.get_indexer(product_ids.ravel()).reshape(product_ids.shape)
+    return truth, columns
+
+
+def evaluate_csv(path: str, transactions: pd.DataFrame, n: int = 10, **kw) -> Dict[str, float]:
+    started = time.perf_counter()
+    household_keys, product_ids = load_recommendations_csv(path)
+    truth, columns = truth_matrix(transactions, household_keys, product_ids)
+    metrics = evaluate(columns, truth, n, **kw)
+    print(f"{path}: {len(household_keys)} домохозяйств, {time.perf_counter() - started:.1f} с")
+    return metrics
+
+
+def main(argv):
+    args = [a for a in argv if not a.startswith("--")]
+    n = 10
+    for flag in argv:
+        if flag.startswith("--n="):
+            n = int(flag[4:])
+    if len(args) < 2:
+        print(__doc__)
+        return
+    transactions = pd.read_csv(args[0], usecols=["household_key", "PRODUCT_ID"])
+    results = {path: evaluate_csv(path, transactions, n) for path in args[1:]}
+    if len(results) == 1:
+        print_metrics(next(iter(results.values())), n)
+    else:
+        # Сравнение снапшотов: метрика × файл
+        table = pd.DataFrame(results).rename(index=lambda m: f"{METRIC_NAMES[m]}@{n}")
+        print(table.round(4).to_string())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,312 @@
+"""Инкрементальное хранилище агрегатов для enrich_features.
+
+Вместо groupby().transform по всей истории при каждом прогоне храним агрегаты
+и доливаем в них только новые транзакции по диапазону дней:
+- пользователь × товар: сумма QUANTITY и SALES_VALUE, последний DAY
+  (это aggregated_transactions ноутбука);
+- пользователь × категория, пользователь × бренд: сумма QUANTITY;
+- товар: число разных покупателей.
+
+Колонки хранятся в .npy, каталог подменяется целиком, как справочник товаров.
+enrich() отдаёт ранкеру тот же фрейм, что enrich_features ноутбука.
+
+CLI: python -m offline.features update transaction_data.csv product.csv [--from=D] [--to=D]
+     python -m offline.features info
+"""
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.artifacts import publish_dir, resolve_dir
+
+FEATURE_STORE_DIR = os.getenv("FEATURE_STORE_DIR", "data/feature_store")
+UNKNOWN = "UNKNOWN"
+
+# Таблица → (ключи, значения); значения складываются, кроме DAY (максимум)
+TABLES = {
+    "user_item": (["household_key", "PRODUCT_ID"], ["QUANTITY", "SALES_VALUE", "DAY"]),
+    "user_category": (["household_key", "category"], ["QUANTITY"]),
+    "user_brand": (["household_key", "brand"], ["QUANTITY"]),
+}
+REDUCERS = {"QUANTITY": np.add, "SALES_VALUE": np.add, "DAY": np.maximum}
+DTYPES = {
+    "household_key": np.int64,
+    "PRODUCT_ID": np.int64,
+    "category": np.int32,
+    "brand": np.int32,
+    "QUANTITY": np.int64,
+    "SALES_VALUE": np.float64,
+    "DAY": np.int32,
+}
+
+
+def _empty(table: str) -> Dict[str, np.ndarray]:
+    keys, values = TABLES[table]
+    return {name: np.empty(0, dtype=DTYPES[name]) for name in keys + values}
+
+
+def aggregate(table: str, *parts: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Сливает части таблицы: одинаковые ключи сворачиваются, результат отсортирован.
+
+    Одна сортировка и reduceat вместо groupby — годится и для сырых строк
+    дельты, и для слияния дельты с сохранёнными агрегатами.
+    """
+    keys, values = TABLES[table]
+    columns = {
+        name: np.concatenate([part[name] for part in parts]).astype(DTYPES[name], copy=False)
+        for name in keys + values
+    }
+    if not len(columns[keys[0]]):
+        return _empty(table)
+    order = np.lexsort([columns[name] for name in reversed(keys)])
+    columns = {name: column[order] for name, column in columns.items()}
+
+    starts = np.zeros(len(order), dtype=bool)
+    starts[0] = True
+    for name in keys:
+        starts[1:] |= columns[name][1:] != columns[name][:-1]
+    starts = np.flatnonzero(starts)
+
+    result = {name: columns[name][starts] for name in keys}
+    for name in values:
+        result[name] = REDUCERS[name].reduceat(columns[name], starts)
+    return result
+
+
+class FeatureStore:
+    """Агрегаты истории покупок и последний учтённый день."""
+
+    def __init__(self, store_dir: str = FEATURE_STORE_DIR):
+        self.store_dir = store_dir
+        self.tables = {table: _empty(table) for table in TABLES}
+        self.categories: List[str] = []
+        self.brands: List[str] = []
+        self.last_day: Optional[int] = None
+        self.transactions = 0
+
+    # --- хранение ---
+
+    @classmethod
+    def load(cls, store_dir: str = FEATURE_STORE_DIR) -> "FeatureStore":
+        """Открывает хранилище; если каталога ещё нет — пустое."""
+        store = cls(store_dir)
+        store_dir = resolve_dir(store_dir)
+        meta_path = os.path.join(store_dir, "meta.json")
+        if not os.path.exists(meta_path):
+            return store
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        store.categories = meta["categories"]
+        store.brands = meta["brands"]
+        store.last_day = meta["last_day"]
+        store.transactions = meta["transactions"]
+        for table, (keys, values) in TABLES.items():
+            store.tables[table] = {
+                name: np.load(os.path.join(store_dir, table, f"{name}.npy"))
+                for name in keys + values
+            }
+        return store
+
+    def save(self):
+        """Пишет агрегаты во временный каталог и подменяет им старый."""
+        with publish_dir(self.store_dir) as tmp_dir:
+            for table, columns in self.tables.items():
+                os.makedirs(os.path.join(tmp_dir, table))
+                for name, column in columns.items():
+                    np.save(os.path.join(tmp_dir, table, f"{name}.npy"), column)
+            with open(os.path.join(tmp_dir, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "categories": self.categories,
+                        "brands": self.brands,
+                        "last_day": self.last_day,
+                        "transactions": self.transactions,
+                    },
+                    f,
+                    ensure_ascii=False,
+                )
+
+    # --- обновление ---
+
+    def _codes(self, values: pd.Series, dictionary: List[str]) -> np.ndarray:
+        """Коды строк по словарю хранилища; новые значения дописываются в конец."""
+        values = values.astype(object).where(values.notna(), UNKNOWN).astype(str)
+        index = pd.Index(dictionary)
+        codes = index.get_indexer(values)
+        new = pd.unique(values[codes < 0])
+        if len(new):
+            dictionary.extend(new.tolist())
+            codes = pd.Index(dictionary).get_indexer(values)
+        return codes.astype(np.int32)
+
+    def apply(
+        self,
+        transactions: pd.DataFrame,
+        products: pd.DataFrame,
+        day_from: Optional[int] = None,
+        day_to: Optional[int] = None,
+    ) -> int:
+        """Доливает транзакции дней [day_from, day_to] в агрегаты. Отдаёт число строк.
+
+        По умолчанию day_from — следующий день после уже учтённых. Повторно
+        применить учтённые дни нельзя: суммы задвоятся.
+        """
+        if day_from is None:
+            day_from = (self.last_day or 0) + 1
+        if self.last_day is not None and day_from <= self.last_day:
+            raise ValueError(
+                f"Дни до {self.last_day} уже учтены, начните с {self.last_day + 1}"
+            )
+        mask = transactions["DAY"] >= day_from
+        if day_to is not None:
+            mask &= transactions["DAY"] <= day_to
+        batch = transactions.loc[mask, TABLES["user_item"][0] + TABLES["user_item"][1]]
+        if batch.empty:
+            return 0
+
+        attrs = (
+            products[["PRODUCT_ID", "COMMODITY_DESC", "BRAND"]]
+            .drop_duplicates("PRODUCT_ID")
+            .set_index("PRODUCT_ID")
+            .reindex(batch["PRODUCT_ID"])
+        )
+        delta = {name: batch[name].to_numpy() for name in batch.columns}
+        category = self._codes(attrs["COMMODITY_DESC"].reset_index(drop=True), self.categories)
+        brand = self._codes(attrs["BRAND"].reset_index(drop=True), self.brands)
+
+        self.tables["user_item"] = aggregate("user_item", self.tables["user_item"], delta)
+        self.tables["user_category"] = aggregate(
+            "user_category",
+            self.tables["user_category"],
+            {
+                "household_key": delta["household_key"],
+                "category": category,
+                "QUANTITY": delta["QUANTITY"],
+            },
+        )
+        self.tables["user_brand"] = aggregate(
+            "user_brand",
+            self.tables["user_brand"],
+            {
+                "household_key": delta["household_key"],
+                "brand": brand,
+                "QUANTITY": delta["QUANTITY"],
+            },
+        )
+        self.last_day = int(max(self.last_day or 0, batch["DAY"].max()))
+        self.transactions += len(batch)
+        return len(batch)
+
+    # --- чтение ---
+
+    def aggregated_transactions(self) -> pd.DataFrame:
+        """household_key, PRODUCT_ID, QUANTITY, SALES_VALUE, DAY — как в ноутбуке."""
+        return pd.DataFrame(self.tables["user_item"])
+
+    def item_popularity(self) -> pd.Series:
+        """Число разных покупателей товара (по PRODUCT_ID)."""
+        products, counts = np.unique(self.tables["user_item"]["PRODUCT_ID"], return_counts=True)
+        return pd.Series(counts, index=products)
+
+    def item_user_rank(self) -> np.ndarray:
+        """Ранг товара среди покупок пользователя, по строкам user_item.
+
+        Как rank(method="first") по убыванию количества: при равенстве
+        раньше идёт меньший PRODUCT_ID (порядок строк aggregated_transactions).
+        """
+        user_item = self.tables["user_item"]
+        users = user_item["household_key"]
+        order = np.lexsort((user_item["PRODUCT_ID"], -user_item["QUANTITY"], users))
+        sorted_users = users[order]
+        starts = np.ones(len(order), dtype=bool)
+        starts[1:] = sorted_users[1:] != sorted_users[:-1]
+        group_start = np.maximum.accumulate(np.where(starts, np.arange(len(order)), 0))
+        ranks = np.empty(len(order), dtype=np.float64)
+        ranks[order] = np.arange(len(order)) - group_start + 1
+        return ranks
+
+    def _lookup(self, table: str, keys: Tuple[str, str], frame_keys: pd.DataFrame) -> np.ndarray:
+        columns = self.tables[table]
+        stored = pd.DataFrame(
+            {keys[0]: columns[keys[0]], keys[1]: columns[keys[1]], "value": columns["QUANTITY"]}
+        )
+        merged = frame_keys.merge(stored, on=list(keys), how="left")
+        return merged["value"].fillna(0).to_numpy()
+
+    def enrich(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Добавляет в df колонки enrich_features из агрегатов, без groupby по df.
+
+        df — строки пользователь × товар (combined_data после load_and_prepare_data),
+        те же household_key/PRODUCT_ID, что в хранилище.
+        """
+        started = time.perf_counter()
+        user_item = pd.DataFrame(
+            {
+                "household_key": self.tables["user_item"]["household_key"],
+                "PRODUCT_ID": self.tables["user_item"]["PRODUCT_ID"],
+                "user_item_count": self.tables["user_item"]["QUANTITY"],
+                "item_user_rank": self.item_user_rank(),
+            }
+        )
+        pairs = df[["household_key", "PRODUCT_ID"]].merge(
+            user_item, on=["household_key", "PRODUCT_ID"], how="left"
+        )
+        df["user_item_count"] = pairs["user_item_count"].fillna(0).to_numpy()
+        df["item_popularity"] = (
+            df["PRODUCT_ID"].map(self.item_popularity()).fillna(0).to_numpy()
+        )
+
+        category = self._codes(df["COMMODITY_DESC"].reset_index(drop=True), list(self.categories))
+        brand = self._codes(df["BRAND"].reset_index(drop=True), list(self.brands))
+        household = df["household_key"].to_numpy()
+        df["category_user_freq"] = self._lookup(
+            "user_category",
+            ("household_key", "category"),
+            pd.DataFrame({"household_key": household, "category": category}),
+        )
+        df["brand_user_freq"] = self._lookup(
+            "user_brand",
+            ("household_key", "brand"),
+            pd.DataFrame({"household_key": household, "brand": brand}),
+        )
+        df["item_user_rank"] = pairs["item_user_rank"].to_numpy()
+        print(f"Фичи из хранилища: {len(df)} строк, {time.perf_counter() - started:.1f} с")
+        return df
+
+    def info(self) -> str:
+        return (
+            f"{self.store_dir}: транзакций {self.transactions}, последний день {self.last_day}, "
+            f"пар пользователь-товар {len(self.tables['user_item']['PRODUCT_ID'])}, "
+            f"категорий {len(self.categories)}, брендов {len(self.brands)}"
+        )
+
+
+def main(argv):
+    args = [a for a in argv if not a.startswith("--")]
+    flags = dict(a[2:].split("=", 1) for a in argv if a.startswith("--") and "=" in a)
+    if not args:
+        print(__doc__)
+        return
+    store = FeatureStore.load()
+    if args[0] == "update" and len(args) >= 3:
+        started = time.perf_counter()
+        transactions = pd.read_csv(
+            args[1], usecols=["household_key", "PRODUCT_ID", "QUANTITY", "SALES_VALUE", "DAY"]
+        )
+        products = pd.read_csv(args[2], usecols=["PRODUCT_ID", "COMMODITY_DESC", "BRAND"])
+        day_from = int(flags["from"]) if "from" in flags else None
+        day_to = int(flags["to"]) if "to" in flags else None
+        applied = store.apply(transactions, products, day_from, day_to)
+        if applied:
+            store.save()
+        print(f"Учтено транзакций: {applied}, {time.perf_counter() - started:.1f} с")
+    print(store.info())
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
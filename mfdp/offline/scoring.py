@@ -0,0 +1,440 @@
+"""Пакетный скоринг XGBRanker для всех домохозяйств.
+
+Замена generate_recommendation_table/recommend_for_user из ноутбука:
+признаки товаров и агрегаты пользователей считаются один раз, пользователи
+скорятся чанками — один predict на чанк, чанки идут параллельно в пуле
+процессов. Ранкер скорит кандидатов из offline.candidates (--full — весь
+каталог). Результат — CSV в формате import_csv.py (rec_N и score_N).
+
+CLI: python -m offline.scoring pipeline_results.pkl [recommendations_results.csv] [--full]
+    [--save-data]
+где pipeline_results.pkl — pickle словаря, который возвращает main_pipeline
+ноутбука (model, enriched_df, user_features, item_features, encoders).
+--save-data сохраняет ScoringData в SCORING_DATA_DIR для скоринга по запросу
+в воркере (worker/scoring.py).
+"""
+import csv
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+
+from app.artifacts import publish_dir, resolve_dir
+
+# Сколько позиций пишем в CSV: первые 10 — рекомендации, остальные — кандидаты для корзины
+SCORING_TOP_N = int(os.getenv("SCORING_TOP_N", "50"))
+# Пар пользователь-товар в чанке: матрица признаков — pairs × features float32
+# (720k пар × ~45 признаков ≈ 130 МБ на процесс; 8 пользователей на полном каталоге)
+SCORING_CHUNK_PAIRS = int(os.getenv("SCORING_CHUNK_PAIRS", "720000"))
+SCORING_WORKERS = int(os.getenv("SCORING_WORKERS", str(os.cpu_count() or 1)))
+# Потоков xgboost на процесс: параллелизм уже даёт пул
+SCORING_THREADS = int(os.getenv("SCORING_THREADS", "1"))
+SCORING_DATA_DIR = os.getenv("SCORING_DATA_DIR", "data/scoring_data")
+
+DEMO_COLUMNS = [
+    "AGE_DESC",
+    "INCOME_DESC",
+    "MARITAL_STATUS_CODE",
+    "HOMEOWNER_DESC",
+    "HH_COMP_DESC",
+    "HOUSEHOLD_SIZE_DESC",
+    "KID_CATEGORY_DESC",
+]
+# Порядок как в prepare_training_data
+EXTRA_FEATURES = [
+    "user_item_count",
+    "item_popularity",
+    "category_user_freq",
+    "brand_user_freq",
+    "item_user_rank",
+]
+
+
+@dataclass
+class ScoringData:
+    """Всё, что нужно для скоринга, посчитанное один раз на прогон."""
+
+    household_keys: np.ndarray  # household_key по строкам user_*
+    user_matrix: np.ndarray  # OHE-признаки пользователя, float32
+    item_ids: np.ndarray  # закодированные item_id по столбцам
+    product_ids: np.ndarray  # PRODUCT_ID по столбцам
+    item_matrix: np.ndarray  # SVD-признаки товара, float32
+    item_popularity: np.ndarray  # число покупателей товара
+    item_category: np.ndarray  # код COMMODITY_DESC товара
+    item_brand: np.ndarray  # код BRAND товара
+    user_item: csr_matrix  # users × items, сумма QUANTITY
+    user_rank: csr_matrix  # ранг товара среди покупок пользователя (1 — самый частый)
+    user_bought: np.ndarray  # число купленных товаров пользователя
+    user_category: csr_matrix  # users × категории, сумма QUANTITY
+    user_brand: csr_matrix  # users × бренды, сумма QUANTITY
+    demographics: pd.DataFrame  # DEMO_COLUMNS по household_key
+
+    @property
+    def n_features(self) -> int:
+        return self.user_matrix.shape[1] + self.item_matrix.shape[1] + len(EXTRA_FEATURES)
+
+
+def _sum_matrix(rows, cols, values, shape) -> csr_matrix:
+    # csr_matrix суммирует повторяющиеся (row, col) — это и есть groupby().sum()
+    return csr_matrix(
+        (np.asarray(values, dtype=np.float32), (rows, cols)), shape=shape
+    )
+
+
+def build_scoring_data(df, user_features, item_features, encoders) -> ScoringData:
+    """Собирает ScoringData из объектов пайплайна ноутбука.
+
+    df — обогащённый датафрейм (user_id, item_id, QUANTITY, BRAND, COMMODITY_DESC
+    и демография), одна группировка на каждый агрегат вместо масок по пользователю.
+    """
+    item_ids = item_features.index.values
+    item_index = pd.Index(item_ids)
+    n_items = len(item_ids)
+
+    user_ids = np.sort(df["user_id"].unique())
+    user_index = pd.Index(user_ids)
+    n_users = len(user_ids)
+
+    rows = user_index.get_indexer(df["user_id"])
+    cols = item_index.get_indexer(df["item_id"])
+    known = cols >= 0
+    rows, cols = rows[known], cols[known]
+    quantity = df["QUANTITY"].to_numpy()[known]
+
+    # Категория и бренд товара — коды, чтобы брать частоты пользователя индексами
+    item_attrs = (
+        df[["item_id", "COMMODITY_DESC", "BRAND"]]
+        .drop_duplicates("item_id")
+        .set_index("item_id")
+        .reindex(item_ids)
+    )
+    category_codes, categories = pd.factorize(item_attrs["COMMODITY_DESC"].astype(str))
+    brand_codes, brands = pd.factorize(item_attrs["BRAND"].astype(str))
+    row_category = category_codes[cols]
+    row_brand = brand_codes[cols]
+
+    user_item = _sum_matrix(rows, cols, quantity, (n_users, n_items))
+    # Популярность — число разных покупателей: ненулевые ячейки столбца
+    popularity = np.diff(user_item.tocsc().indptr)
+    user_item.eliminate_zeros()
+
+    user_matrix = user_features.reindex(user_ids).fillna(0).to_numpy(np.float32)
+    demographics = (
+        df.groupby("household_key")[DEMO_COLUMNS].first()
+        if set(DEMO_COLUMNS) <= set(df.columns)
+        else pd.DataFrame(index=pd.Index([], name="household_key"), columns=DEMO_COLUMNS)
+    )
+
+    return ScoringData(
+        household_keys=encoders["user"].inverse_transform(user_ids),
+        user_matrix=user_matrix,
+        item_ids=item_ids,
+        product_ids=encoders["item"].inverse_transform(item_ids),
+        item_matrix=item_features.to_numpy(np.float32),
+        item_popularity=popularity.astype(np.float32),
+        item_category=category_codes,
+        item_brand=brand_codes,
+        user_item=user_item,
+        user_rank=_rank_matrix(user_item, item_ids),
+        user_bought=np.diff(user_item.indptr),
+        user_category=_sum_matrix(rows, row_category, quantity, (n_users, len(categories))),
+        user_brand=_sum_matrix(rows, row_brand, quantity, (n_users, len(brands))),
+        demographics=demographics,
+    )
+
+
+def _rank_matrix(user_item: csr_matrix, item_ids: np.ndarray) -> csr_matrix:
+    """Ранги покупок пользователя одной сортировкой всех ненулевых ячеек.
+
+    Как item_user_rank в enrich_features: по убыванию количества, при равенстве —
+    первым идёт товар с меньшим item_id. Столбцы идут в порядке item_features,
+    а не по item_id, поэтому ничьи разбиваются по item_ids столбцов.
+    """
+    user_item = user_item.tocsr()
+    user_item.sort_indices()
+    rows = np.repeat(np.arange(user_item.shape[0]), np.diff(user_item.indptr))
+    order = np.lexsort((np.asarray(item_ids)[user_item.indices], -user_item.data, rows))
+    ranks = np.empty(len(order), dtype=np.float32)
+    ranks[order] = np.arange(len(order)) - user_item.indptr[rows[order]] + 1
+    return csr_matrix(
+        (ranks, user_item.indices.copy(), user_item.indptr.copy()), shape=user_item.shape
+    )
+
+
+ARRAY_FIELDS = [
+    "household_keys",
+    "user_matrix",
+    "item_ids",
+    "product_ids",
+    "item_matrix",
+    "item_popularity",
+    "item_category",
+    "item_brand",
+    "user_bought",
+]
+SPARSE_FIELDS = ["user_item", "user_rank", "user_category", "user_brand"]
+
+
+def save_scoring_data(data: ScoringData, out_dir: str = SCORING_DATA_DIR):
+    """Пишет ScoringData в каталог .npy (CSR — тремя массивами) и подменяет старый целиком."""
+    with publish_dir(out_dir) as tmp_dir:
+        for name in ARRAY_FIELDS:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.asarray(getattr(data, name)))
+        for name in SPARSE_FIELDS:
+            matrix = getattr(data, name).tocsr()
+            for part in ("data", "indices", "indptr"):
+                np.save(os.path.join(tmp_dir, f"{name}.{part}.npy"), getattr(matrix, part))
+            np.save(os.path.join(tmp_dir, f"{name}.shape.npy"), np.asarray(matrix.shape))
+        data.demographics.reindex(columns=DEMO_COLUMNS).to_csv(
+            os.path.join(tmp_dir, "demographics.csv")
+        )
+    print(f"Данные скоринга сохранены в {out_dir}: {len(data.household_keys)} пользователей")
+
+
+def load_scoring_data(out_dir: str = SCORING_DATA_DIR) -> ScoringData:
+    """ScoringData из каталога save_scoring_data; массивы отображаются в память (mmap)."""
+    out_dir = resolve_dir(out_dir)
+
+    def array(name):
+        return np.load(os.path.join(out_dir, f"{name}.npy"), mmap_mode="r")
+
+    fields = {name: array(name) for name in ARRAY_FIELDS}
+    for name in SPARSE_FIELDS:
+        fields[name] = csr_matrix(
+            (array(f"{name}.data"), array(f"{name}.indices"), array(f"{name}.indptr")),
+            shape=tuple(array(f"{name}.shape")),
+        )
+    fields["demographics"] = pd.read_csv(
+        os.path.join(out_dir, "demographics.csv"),
+        index_col="household_key",
+        dtype={column: str for column in DEMO_COLUMNS},
+    )
+    return ScoringData(**fields)
+
+
+def _lookup(matrix: csr_matrix, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+    return np.asarray(matrix[rows, cols], dtype=np.float32).ravel()
+
+
+def pair_features(data: ScoringData, users: np.ndarray, items: np.ndarray) -> np.ndarray:
+    """Матрица признаков для predict: строка на пару (users[i], items[i, j]).
+
+    items — позиции товаров, (len(users), K); строки идут пользователь за
+    пользователем. Блок товаров берётся из общей матрицы, пользовательские
+    признаки — точечные выборки из разреженных агрегатов.
+    """
+    n_users, n_items = items.shape
+    user_dim = data.user_matrix.shape[1]
+    item_dim = data.item_matrix.shape[1]
+    pair_users = np.repeat(users, n_items)
+    pair_items = items.ravel()
+
+    block = np.empty((n_users, n_items, data.n_features), dtype=np.float32)
+    block[:, :, :user_dim] = data.user_matrix[users][:, None, :]
+    block = block.reshape(n_users * n_items, data.n_features)
+    block[:, user_dim : user_dim + item_dim] = data.item_matrix[pair_items]
+    extra = user_dim + item_dim
+    block[:, extra] = _lookup(data.user_item, pair_users, pair_items)
+    block[:, extra + 1] = data.item_popularity[pair_items]
+    block[:, extra + 2] = _lookup(
+        data.user_category, pair_users, data.item_category[pair_items]
+    )
+    block[:, extra + 3] = _lookup(data.user_brand, pair_users, data.item_brand[pair_items])
+    # Некупленные товары получают ранг «после последнего купленного»
+    rank = _lookup(data.user_rank, pair_users, pair_items)
+    block[:, extra + 4] = np.where(rank > 0, rank, data.user_bought[pair_users] + 1)
+    return block
+
+
+def all_items(data: ScoringData, n_users: int) -> np.ndarray:
+    """Полный скоринг: каждому пользователю — весь каталог."""
+    return np.broadcast_to(np.arange(len(data.item_ids)), (n_users, len(data.item_ids)))
+
+
+def select_top_n(scores: np.ndarray, n: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Позиции и скоры top-n по строкам: argpartition, затем сортировка только n."""
+    n = min(n, scores.shape[1])
+    if n == 0:
+        empty = np.empty((scores.shape[0], 0), dtype=np.int64)
+        return empty, empty.astype(scores.dtype)
+    picked = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    picked_scores = np.take_along_axis(scores, picked, axis=1)
+    order = np.argsort(-picked_scores, axis=1, kind="stable")
+    return (
+        np.take_along_axis(picked, order, axis=1),
+        np.take_along_axis(picked_scores, order, axis=1),
+    )
+
+
+def score_users(
+    model, data: ScoringData, users: np.ndarray, n: int = SCORING_TOP_N, generator=None
+):
+    """Один predict на чанк пользователей. Отдаёт (household_keys, product_ids, scores).
+
+    С generator скорятся только кандидаты (позиции, -1 — пусто), иначе весь каталог.
+    Пустые места в ответе — product_id -1.
+    """
+    items = generator.generate(users) if generator is not None else all_items(data, len(users))
+    valid = items >= 0
+    items = np.where(valid, items, 0)
+    scores = model.predict(pair_features(data, users, items)).reshape(items.shape)
+    scores = np.where(valid, scores, -np.inf)
+    positions, top_scores = select_top_n(scores, n)
+    if positions.shape[1] < n:
+        # Кандидатов меньше n — добиваем пустыми местами до ширины CSV
+        pad = n - positions.shape[1]
+        positions = np.pad(positions, ((0, 0), (0, pad)))
+        top_scores = np.pad(top_scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+    top_items = np.take_along_axis(items, positions, axis=1)
+    product_ids = np.where(np.isfinite(top_scores), data.product_ids[top_items], -1)
+    return data.household_keys[users], product_ids, top_scores
+
+
+# Состояние процесса пула: данные и модель передаются один раз при старте
+_worker_state = {}
+
+
+def _init_worker(model, data, generator, threads):
+    if threads:
+        model.set_params(n_jobs=threads)
+    _worker_state["model"] = model
+    _worker_state["data"] = data
+    _worker_state["generator"] = generator
+
+
+def _score_chunk(args):
+    users, n = args
+    return score_users(
+        _worker_state["model"],
+        _worker_state["data"],
+        users,
+        n,
+        _worker_state["generator"],
+    )
+
+
+def iter_recommendations(
+    model,
+    data: ScoringData,
+    n: int = SCORING_TOP_N,
+    chunk_pairs: int = SCORING_CHUNK_PAIRS,
+    workers: int = SCORING_WORKERS,
+    generator=None,
+) -> Iterator[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    """Чанки (household_keys, product_ids, scores) в порядке пользователей.
+
+    generator — offline.candidates.CandidateGenerator; без него скорится весь каталог.
+    """
+    per_user = generator.size if generator is not None else len(data.item_ids)
+    chunk_users = max(1, chunk_pairs // max(per_user, 1))
+    chunks = [
+        (users, n)
+        for users in np.array_split(
+            np.arange(len(data.household_keys)),
+            max(1, -(-len(data.household_keys) // chunk_users)),
+        )
+        if len(users)
+    ]
+    if workers <= 1:
+        _init_worker(model, data, generator, SCORING_THREADS)
+        yield from map(_score_chunk, chunks)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(model, data, generator, SCORING_THREADS),
+    ) as pool:
+        yield from pool.map(_score_chunk, chunks)
+
+
+def csv_header(n: int) -> List[str]:
+    return (
+        ["household_key"]
+        + DEMO_COLUMNS
+        + [f"rec_{i + 1}" for i in range(n)]
+        + [f"score_{i + 1}" for i in range(n)]
+    )
+
+
+def iter_rows(data: ScoringData, chunks):
+    demographics = data.demographics.reindex(columns=DEMO_COLUMNS)
+    for keys, product_ids, scores in chunks:
+        demo = demographics.reindex(keys).to_numpy(dtype=object)
+        for key, values, pids, row_scores in zip(keys, demo, product_ids, scores):
+            # Кандидатов может быть меньше n: хвост остаётся пустым
+            yield (
+                [int(key)]
+                + ["" if pd.isna(v) else v for v in values]
+                + [int(p) if p >= 0 else "" for p in pids]
+                + ["" if p < 0 else f"{s:.6g}" for p, s in zip(pids, row_scores)]
+            )
+
+
+def write_recommendations_csv(path: str, model, data: ScoringData, n: int = SCORING_TOP_N, **kw):
+    """Пишет CSV для import_csv.py потоково, по мере готовности чанков."""
+    started = time.perf_counter()
+    rows = 0
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(csv_header(n))
+        for row in iter_rows(data, iter_recommendations(model, data, n, **kw)):
+            writer.writerow(row)
+            rows += 1
+    os.replace(tmp_path, path)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Рекомендации сформированы: {rows} домохозяйств, {elapsed:.1f} с, "
+        f"{rows / max(elapsed, 1e-9):.0f} пользователей/с"
+    )
+    return rows
+
+
+def generate_recommendation_table(
+    model, combined_data, user_features_full, item_features_full, encoders, top_n=10, **kw
+) -> pd.DataFrame:
+    """Совместимая с ноутбуком обёртка: тот же DataFrame, но пакетным скорингом."""
+    data = build_scoring_data(combined_data, user_features_full, item_features_full, encoders)
+    rows = list(iter_rows(data, iter_recommendations(model, data, top_n, **kw)))
+    return pd.DataFrame(rows, columns=csv_header(top_n))
+
+
+def main(argv):
+    args = [a for a in argv if not a.startswith("--")]
+    if not args:
+        print(__doc__)
+        return
+    with open(args[0], "rb") as f:
+        results = pickle.load(f)
+    output = args[1] if len(args) > 1 else "data/recommendations_results.csv"
+    data = build_scoring_data(
+        results["enriched_df"],
+        results["user_features"],
+        results["item_features"],
+        results["encoders"],
+    )
+    if "--save-data" in argv:
+        save_scoring_data(data)
+    generator = None
+    if "--full" not in argv:
+        from offline.candidates import CandidateGenerator, candidate_recall
+        from offline.similarity import NEIGHBOURS_DIR, load_neighbours
+
+        # Граф соседей из python -m offline.similarity — ещё один источник кандидатов
+        user_graph = None
+        if os.path.isdir(NEIGHBOURS_DIR):
+            user_graph = load_neighbours(NEIGHBOURS_DIR).align(data.household_keys)
+        generator = CandidateGenerator(data, user_graph=user_graph)
+        candidate_recall(results["model"], data, generator)
+    write_recommendations_csv(output, results["model"], data, generator=generator)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
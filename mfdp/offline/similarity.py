@@ -0,0 +1,216 @@
+"""Разреженный граф соседей пользователей (top-k по косинусу).
+
+Замена calculate_user_similarity/recommend_user_based из ноутбука: плотная
+матрица users × users не строится — сходства считаются блоками строк
+разреженным произведением, от каждого блока остаются k соседей (argpartition).
+Размер блока ограничен памятью, блоки можно считать в пуле процессов.
+Граф сохраняется в каталог .npy и используется в отборе кандидатов.
+
+CLI: python -m offline.similarity pipeline_results.pkl [data/user_neighbours] [k]
+"""
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from app.artifacts import publish_dir, resolve_dir
+
+SIMILARITY_K = int(os.getenv("SIMILARITY_K", "20"))
+# Память на блок: плотный блок сходств block × users float32 и argpartition по нему
+SIMILARITY_BLOCK_MB = int(os.getenv("SIMILARITY_BLOCK_MB", "256"))
+SIMILARITY_WORKERS = int(os.getenv("SIMILARITY_WORKERS", str(os.cpu_count() or 1)))
+NEIGHBOURS_DIR = os.getenv("USER_NEIGHBOURS_DIR", "data/user_neighbours")
+
+
+@dataclass
+class NeighbourGraph:
+    """k соседей на пользователя; строки — household_keys, пусто — -1."""
+
+    household_keys: np.ndarray
+    indices: np.ndarray  # (users, k) позиции соседей, int32
+    weights: np.ndarray  # (users, k) косинус, по убыванию, float32
+
+    @property
+    def k(self) -> int:
+        return self.indices.shape[1]
+
+    def adjacency(self, users: np.ndarray = None) -> csr_matrix:
+        """users × все пользователи: веса соседей строк users (по умолчанию — всех)."""
+        indices = self.indices if users is None else self.indices[users]
+        weights = self.weights if users is None else self.weights[users]
+        valid = indices >= 0
+        rows = np.repeat(np.arange(len(indices)), valid.sum(axis=1))
+        return csr_matrix(
+            (weights[valid], (rows, indices[valid])),
+            shape=(len(indices), len(self.household_keys)),
+        )
+
+    def align(self, household_keys: np.ndarray) -> "NeighbourGraph":
+        """Граф в порядке чужих household_keys (например, ScoringData).
+
+        Пользователи и соседи, которых нет в household_keys, выпадают.
+        """
+        order = np.argsort(self.household_keys)
+        sorted_keys = self.household_keys[order]
+        found = np.searchsorted(sorted_keys, household_keys).clip(0, len(sorted_keys) - 1)
+        present = sorted_keys[found] == household_keys
+        rows = order[found]
+
+        # Позиция каждого нашего пользователя в новом порядке
+        new_position = np.full(len(self.household_keys), -1, dtype=np.int32)
+        new_position[rows[present]] = np.nonzero(present)[0]
+
+        indices = np.full((len(household_keys), self.k), -1, dtype=np.int32)
+        weights = np.zeros((len(household_keys), self.k), dtype=np.float32)
+        own = self.indices[rows[present]]
+        mapped = np.where(own >= 0, new_position[own.clip(0)], -1)
+        indices[present] = mapped
+        weights[present] = np.where(mapped >= 0, self.weights[rows[present]], 0)
+        return NeighbourGraph(np.asarray(household_keys), indices, weights)
+
+
+def normalize_rows(interactions: csr_matrix) -> csr_matrix:
+    """Строки единичной длины: произведение строк — косинус."""
+    interactions = csr_matrix(interactions, dtype=np.float32)
+    norms = np.sqrt(np.asarray(interactions.multiply(interactions).sum(axis=1)).ravel())
+    scale = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return csr_matrix(interactions.multiply(scale[:, None]), dtype=np.float32)
+
+
+def block_rows(n_users: int, block_mb: int = SIMILARITY_BLOCK_MB) -> int:
+    # ×3: блок сходств, копия для argpartition и индексы
+    return max(1, (block_mb << 20) // max(1, n_users * 4 * 3))
+
+
+# Состояние процесса пула: нормированная матрица передаётся один раз при старте
+_worker_state = {}
+
+
+def _init_worker(normalized, k):
+    _worker_state["normalized"] = normalized
+    _worker_state["by_user"] = normalized.T.tocsc()
+    _worker_state["k"] = k
+
+
+def _neighbour_block(bounds):
+    start, stop = bounds
+    normalized = _worker_state["normalized"]
+    k = _worker_state["k"]
+    similarity = (normalized[start:stop] @ _worker_state["by_user"]).toarray()
+    # Сам себе не сосед
+    similarity[np.arange(stop - start), np.arange(start, stop)] = 0
+
+    picked = np.argpartition(-similarity, k - 1, axis=1)[:, :k]
+    weights = np.take_along_axis(similarity, picked, axis=1)
+    order = np.argsort(-weights, axis=1, kind="stable")
+    picked = np.take_along_axis(picked, order, axis=1).astype(np.int32)
+    weights = np.take_along_axis(weights, order, axis=1)
+    picked[weights <= 0] = -1
+    weights[weights <= 0] = 0
+    return picked, weights
+
+
+def user_neighbours(
+    interactions: csr_matrix,
+    household_keys: np.ndarray,
+    k: int = SIMILARITY_K,
+    block_mb: int = SIMILARITY_BLOCK_MB,
+    workers: int = SIMILARITY_WORKERS,
+) -> NeighbourGraph:
+    """Top-k соседей каждого пользователя матрицы interactions (users × items)."""
+    started = time.perf_counter()
+    n_users = interactions.shape[0]
+    k = min(k, max(n_users - 1, 1))
+    normalized = normalize_rows(interactions)
+    step = block_rows(n_users, block_mb)
+    blocks = [(start, min(start + step, n_users)) for start in range(0, n_users, step)]
+
+    if workers <= 1 or len(blocks) == 1:
+        _init_worker(normalized, k)
+        parts = list(map(_neighbour_block, blocks))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(normalized, k)
+        ) as pool:
+            parts = list(pool.map(_neighbour_block, blocks))
+
+    graph = NeighbourGraph(
+        np.asarray(household_keys),
+        np.vstack([p[0] for p in parts]) if parts else np.empty((0, k), np.int32),
+        np.vstack([p[1] for p in parts]) if parts else np.empty((0, k), np.float32),
+    )
+    print(
+        f"Соседи пользователей: {n_users} × {k}, блоков {len(blocks)} по {step} строк, "
+        f"{time.perf_counter() - started:.1f} с"
+    )
+    return graph
+
+
+def recommend_user_based(
+    graph: NeighbourGraph, interactions: csr_matrix, users: np.ndarray, n: int = 10
+) -> np.ndarray:
+    """Как recommend_user_based ноутбука, сразу для чанка пользователей.
+
+    Товар оценивается числом соседей, купивших его; купленное пользователем
+    исключается. Отдаёт (len(users), n) позиций товаров, пусто — -1.
+    """
+    from offline.candidates import top_per_row
+
+    bought = _binary(interactions[users])
+    votes = _binary(graph.adjacency(users)) @ _binary(interactions)
+    votes = votes - votes.multiply(bought)
+    votes.eliminate_zeros()
+    return top_per_row(votes, n)
+
+
+def _binary(matrix) -> csr_matrix:
+    matrix = csr_matrix(matrix, dtype=np.float32, copy=True)
+    matrix.data[:] = 1
+    return matrix
+
+
+def save_neighbours(graph: NeighbourGraph, out_dir: str = NEIGHBOURS_DIR):
+    """Пишет граф в каталог .npy и подменяет старый каталог целиком."""
+    with publish_dir(out_dir) as tmp_dir:
+        np.save(os.path.join(tmp_dir, "household_keys.npy"), graph.household_keys)
+        np.save(os.path.join(tmp_dir, "indices.npy"), graph.indices)
+        np.save(os.path.join(tmp_dir, "weights.npy"), graph.weights)
+    print(f"Граф соседей сохранён в {out_dir}")
+
+
+def load_neighbours(out_dir: str = NEIGHBOURS_DIR) -> NeighbourGraph:
+    out_dir = resolve_dir(out_dir)
+    return NeighbourGraph(
+        np.load(os.path.join(out_dir, "household_keys.npy"), mmap_mode="r"),
+        np.load(os.path.join(out_dir, "indices.npy"), mmap_mode="r"),
+        np.load(os.path.join(out_dir, "weights.npy"), mmap_mode="r"),
+    )
+
+
+def main(argv):
+    from offline.candidates import interaction_matrix
+    from offline.scoring import build_scoring_data
+
+    if not argv:
+        print(__doc__)
+        return
+    with open(argv[0], "rb") as f:
+        results = pickle.load(f)
+    out_dir = argv[1] if len(argv) > 1 else NEIGHBOURS_DIR
+    k = int(argv[2]) if len(argv) > 2 else SIMILARITY_K
+    data = build_scoring_data(
+        results["enriched_df"],
+        results["user_features"],
+        results["item_features"],
+        results["encoders"],
+    )
+    save_neighbours(user_neighbours(interaction_matrix(data), data.household_keys, k), out_dir)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,197 @@
+"""Общие фикстуры тестов.
+
+Модули app читают DB_* при импорте, поэтому значения по умолчанию
+выставляются здесь, до первого импорта app. Тесты с БД получают свою
+схему в базе из DB_* (search_path) и пропускаются, если Postgres недоступен:
+DB_HOST=localhost DB_NAME=mfdp_test python -m pytest
+"""
+import csv
+import os
+import uuid
+
+import pytest
+
+for _name, _value in {
+    "DB_HOST": "localhost",
+    "DB_PORT": "5432",
+    "DB_NAME": "mfdp_test",
+    "DB_USER": "postgres",
+    "DB_PASSWORD": "",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from sqlalchemy import create_engine, text  # noqa: E402
+from sqlalchemy.ext.asyncio import create_async_engine  # noqa: E402
+from sqlalchemy.pool import NullPool  # noqa: E402
+
+from app import database, snapshot  # noqa: E402
+
+PROFILE_COLUMNS = [
+    "AGE_DESC",
+    "INCOME_DESC",
+    "MARITAL_STATUS_CODE",
+    "HOMEOWNER_DESC",
+    "HH_COMP_DESC",
+    "HOUSEHOLD_SIZE_DESC",
+    "KID_CATEGORY_DESC",
+]
+
+_database_available = None
+
+
+def database_available() -> bool:
+    global _database_available
+    if _database_available is None:
+        import psycopg2
+
+        try:
+            psycopg2.connect(
+                host=os.getenv("DB_HOST"),
+                port=os.getenv("DB_PORT"),
+                dbname=os.getenv("DB_NAME"),
+                user=os.getenv("DB_USER"),
+                password=os.getenv("DB_PASSWORD"),
+                connect_timeout=3,
+            ).close()
+            _database_available = True
+        except psycopg2.OperationalError:
+            _database_available = False
+    return _database_available
+
+
+@pytest.fixture
+def pg_schema():
+    """Пустая схема на тест; удаляется вместе со всем содержимым."""
+    if not database_available():
+        pytest.skip("Postgres из DB_* недоступен")
+    schema = f"test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(database.SQLALCHEMY_DATABASE_URL, poolclass=NullPool)
+    with admin.begin() as connection:
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+    try:
+        yield schema
+    finally:
+        with admin.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin.dispose()
+
+
+@pytest.fixture
+def pg_engine(pg_schema):
+    """Движок, который видит только схему теста; таблиц в ней нет."""
+    engine = create_engine(
+        database.SQLALCHEMY_DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={"options": f"-csearch_path={pg_schema}"},
+    )
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def pg_db(pg_schema, pg_engine, monkeypatch):
+    """Схема из create_all, как при старте сервиса; движки app смотрят в неё."""
+    import app.models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+    database.Base.metadata.create_all(bind=pg_engine)
+    async_engine = create_async_engine(
+        database.ASYNC_DATABASE_URL,
+        poolclass=NullPool,
+        connect_args={"server_settings": {"search_path": pg_schema}},
+    )
+    monkeypatch.setattr(database, "_engine", pg_engine)
+    monkeypatch.setattr(database, "_async_engine", async_engine)
+    # import_csv и CLI вызывают configure("importer") при уже созданном движке
+    monkeypatch.setattr(database, "_role", "importer")
+    yield pg_engine
+    async_engine.sync_engine.dispose()
+
+
+@pytest.fixture
+def pg_cursor(pg_db):
+    """Курсор psycopg2, как у импортёра; транзакцию коммитит тест."""
+    connection = pg_db.raw_connection()
+    try:
+        yield connection.cursor()
+    finally:
+        connection.rollback()
+        connection.close()
+
+
+@pytest.fixture(autouse=True)
+def reset_snapshot():
+    """Снапшот процесса — глобальный: каждый тест начинает без него."""
+    snapshot.set_snapshot(None)
+    yield
+    snapshot.set_snapshot(None)
+
+
+@pytest.fixture
+def make_recommendations_csv(tmp_path):
+    """Пишет CSV в формате import_csv: {household_key: (профиль, [PRODUCT_ID...])}.
+
+    Профиль — одна строка на все поля или кортеж значений PROFILE_COLUMNS.
+    """
+
+    def write(households, name="recommendations_results.csv"):
+        width = max(len(products) for _, products in households.values())
+        path = tmp_path / name
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                ["household_key"]
+                + PROFILE_COLUMNS
+                + [f"rec_{i + 1}" for i in range(width)]
+                + [f"score_{i + 1}" for i in range(width)]
+            )
+            for key, (profile, products) in households.items():
+                if isinstance(profile, str):
+                    profile = (profile,) * len(PROFILE_COLUMNS)
+                pad = [""] * (width - len(products))
+                scores = [f"{1 - i / 100:.2f}" for i in range(len(products))]
+                writer.writerow([key, *profile, *products, *pad, *scores, *pad])
+        return str(path)
+
+    return write
+
+
+@pytest.fixture
+def api_client():
+    """Роутеры сервиса без побочных эффектов импорта app.main."""
+    from fastapi.testclient import TestClient
+
+    from benchmarks.stands import bench_app
+
+    return TestClient(bench_app())
+
+
+@pytest.fixture
+def run_import(pg_db, monkeypatch):
+    """import_csv.main в схеме теста: python import_csv.py <csv> [флаги]."""
+    import import_csv
+
+    # Справочник из data/ тестам не нужен: товары рендерятся как неизвестные
+    monkeypatch.setattr(import_csv, "load_items_mapping", lambda: None)
+
+    def run(path, *flags):
+        import_csv.main([path, *flags])
+
+    return run
+
+
+@pytest.fixture(scope="session")
+def pipeline():
+    """Результат main_pipeline ноутбука на синтетике и ScoringData по нему."""
+    pytest.importorskip("sklearn")
+    pytest.importorskip("xgboost")
+    from offline.scoring import build_scoring_data
+    from tests import notebook_reference as nb
+
+    results = nb.main_pipeline(nb.pipeline_frame())
+    results["data"] = build_scoring_data(
+        results["enriched_df"],
+        results["user_features"],
+        results["item_features"],
+        results["encoders"],
+    )
+    return results
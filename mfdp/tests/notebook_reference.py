@@ -0,0 +1,434 @@
+"""Эталон: функции ноутбука mfdp-model-v6.ipynb, с которыми сверяются офлайн-модули.
+
+Перенесены как есть, кроме печати и глобальных переменных ноутбука:
+рекомендации и матрица обучения передаются аргументами, а фактические
+покупки раскодируются картами тестовой матрицы. main_pipeline — без
+разбиения и подбора гиперпараметров, маленький ранкер.
+
+recommend_for_user — инференс ноутбука как есть, с его причудами: частоты
+категории и бренда берутся из первой колонки unstack, ранг — позиция
+товара в каталоге. recommend_with_training_features собирает признаки пары
+так же, как обучение (enrich_features), — это исправленная версия, которую
+повторяет offline.scoring.
+"""
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.metrics import ndcg_score
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import LabelEncoder, OneHotEncoder
+
+
+def create_interaction_matrix(df):
+    interactions = (
+        df.groupby(["household_key", "PRODUCT_ID"]).size().reset_index(name="frequency")
+    )
+    user_ids = interactions["household_key"].unique()
+    product_ids = interactions["PRODUCT_ID"].unique()
+
+    user_id_map = {user_id: i for i, user_id in enumerate(user_ids)}
+    product_id_map = {product_id: i for i, product_id in enumerate(product_ids)}
+
+    row_ind = interactions["household_key"].apply(lambda x: user_id_map[x])
+    col_ind = interactions["PRODUCT_ID"].apply(lambda x: product_id_map[x])
+    data = interactions["frequency"]
+
+    interaction_matrix = csr_matrix(
+        (data, (row_ind, col_ind)), shape=(len(user_ids), len(product_ids))
+    )
+    return interaction_matrix, user_id_map, product_id_map
+
+
+def calculate_user_similarity(matrix):
+    return cosine_similarity(matrix)
+
+
+def recommend_user_based(
+    user_id,
+    interaction_matrix,
+    user_similarity,
+    user_id_map,
+    product_id_map,
+    k=20,
+    n=10,
+):
+    if user_id not in user_id_map:
+        return []
+    user_index = user_id_map[user_id]
+    inverse_product_id_map = {i: pid for pid, i in product_id_map.items()}
+
+    similar_users = np.argsort(user_similarity[user_index])[::-1][1 : k + 1]
+
+    recommended_products = {}
+    for idx in similar_users:
+        bought_items = interaction_matrix[idx].nonzero()[1]
+        for item in bought_items:
+            pid = inverse_product_id_map[item]
+            if pid not in recommended_products:
+                recommended_products[pid] = 0
+            recommended_products[pid] += 1
+
+    bought_items = interaction_matrix[user_index].nonzero()[1]
+    already_bought = [inverse_product_id_map[i] for i in bought_items]
+
+    recommended_products = {
+        k: v for k, v in recommended_products.items() if k not in already_bought
+    }
+    sorted_products = sorted(
+        recommended_products.items(), key=lambda x: x[1], reverse=True
+    )
+    top_n_products = [p for p, _ in sorted_products[:n]]
+    return top_n_products
+
+
+def evaluate_recommendations(test_matrix, recommendations, user_id_map, product_id_map, n=10):
+    """recommendations — {household_key: [PRODUCT_ID, ...]} вместо recommend_function."""
+    precisions = []
+    recalls = []
+    f_scores = []
+    maps = []
+    ndcgs = []
+    hit_rates = []
+
+    inverse_user_id_map = {i: user_id for user_id, i in user_id_map.items()}
+    inverse_product_id_map = {i: product_id for product_id, i in product_id_map.items()}
+
+    for user_index in range(test_matrix.shape[0]):
+        user_id = inverse_user_id_map.get(user_index, None)
+        if user_id is None:
+            continue
+
+        relevant_products = test_matrix[user_index].nonzero()[1]
+        relevant_products = [inverse_product_id_map[i] for i in relevant_products]
+
+        recommended_products = recommendations.get(user_id, [])
+        if not relevant_products or not recommended_products:
+            continue
+
+        num_relevant = len(set(recommended_products).intersection(relevant_products))
+        precision = num_relevant / len(recommended_products)
+        recall = num_relevant / len(relevant_products)
+        f_score = (
+            2 * (precision * recall) / (precision + recall)
+            if precision + recall > 0
+            else 0.0
+        )
+
+        avg_precision = 0.0
+        num_rel = 0
+        for i in range(min(n, len(recommended_products))):
+            if recommended_products[i] in relevant_products:
+                num_rel += 1
+                avg_precision += num_rel / (i + 1)
+        map_score = (
+            avg_precision / max(1, len(relevant_products))
+            if len(relevant_products) > 0
+            else 0.0
+        )
+
+        try:
+            y_true = np.zeros(len(recommended_products))
+            for i, p in enumerate(recommended_products):
+                if p in relevant_products:
+                    y_true[i] = 1
+            y_pred = np.linspace(1, 0, len(recommended_products))
+            ndcg = ndcg_score([y_true], [y_pred], k=n)
+        except ValueError:
+            ndcg = np.nan
+
+        hit_rate = 1 if num_relevant > 0 else 0
+
+        precisions.append(precision)
+        recalls.append(recall)
+        f_scores.append(f_score)
+        maps.append(map_score)
+        ndcgs.append(ndcg)
+        hit_rates.append(hit_rate)
+
+    mean_precision = np.mean(precisions) if precisions else 0
+    mean_recall = np.mean(recalls) if recalls else 0
+    mean_f_score = np.mean(f_scores) if f_scores else 0
+    mean_map = np.mean(maps) if maps else 0
+    mean_ndcg = (
+        np.mean([score for score in ndcgs if not np.isnan(score)])
+        if any(not np.isnan(s) for s in ndcgs)
+        else 0
+    )
+    mean_hit_rate = np.mean(hit_rates) if hit_rates else 0
+
+    return {
+        "precision": mean_precision,
+        "recall": mean_recall,
+        "f_score": mean_f_score,
+        "map": mean_map,
+        "ndcg": mean_ndcg,
+        "hit_rate": mean_hit_rate,
+    }
+
+
+def enrich_features(df):
+    # Сколько раз пользователь покупал этот товар
+    df["user_item_count"] = df.groupby(["user_id", "item_id"])["QUANTITY"].transform(
+        "sum"
+    )
+
+    # Популярность товара (сколько пользователей его купило)
+    item_popularity = df.groupby("item_id")["user_id"].nunique()
+    df["item_popularity"] = df["item_id"].map(item_popularity)
+
+    # Частота покупок категории пользователем
+    df["category_user_freq"] = df.groupby(["user_id", "COMMODITY_DESC"], observed=False)[
+        "QUANTITY"
+    ].transform("sum")
+
+    # Частота покупок бренда пользователем
+    df["brand_user_freq"] = df.groupby(["user_id", "BRAND"], observed=False)[
+        "QUANTITY"
+    ].transform("sum")
+
+    # Ранг товара по частоте покупки им
+    df["item_user_rank"] = df.groupby("user_id")["user_item_count"].rank(
+        method="first", ascending=False
+    )
+
+    return df
+
+
+def recommend_for_user(user_id, model, df, user_features, item_features, encoders, top_n=10):
+    user_encoder = encoders["user"]
+    item_encoder = encoders["item"]
+    if user_id not in user_encoder.classes_:
+        return []
+    encoded_user_id = user_encoder.transform([user_id])[0]
+
+    all_items = item_features.index.values
+    user_feat = user_features.loc[encoded_user_id].values
+    user_feat_repeated = np.tile(user_feat, (len(all_items), 1))
+    item_feat = item_features.loc[all_items].values
+
+    user_mask = df["user_id"] == encoded_user_id
+    user_item_counts = (
+        df[user_mask].groupby("item_id")["QUANTITY"].sum().reindex(all_items, fill_value=0).values
+    )
+    item_popularities = (
+        df.groupby("item_id")["user_id"].nunique().reindex(all_items, fill_value=0).values
+    )
+
+    user_df = df[user_mask]
+    category_freqs = (
+        user_df.groupby(["item_id", "COMMODITY_DESC"])["QUANTITY"].sum().unstack(fill_value=0)
+    )
+    brand_freqs = user_df.groupby(["item_id", "BRAND"])["QUANTITY"].sum().unstack(fill_value=0)
+
+    category_freqs = (
+        category_freqs.reindex(all_items, fill_value=0).iloc[:, 0].values
+        if not category_freqs.empty
+        else np.zeros(len(all_items))
+    )
+    brand_freqs = (
+        brand_freqs.reindex(all_items, fill_value=0).iloc[:, 0].values
+        if not brand_freqs.empty
+        else np.zeros(len(all_items))
+    )
+
+    extra_features = np.column_stack(
+        [
+            user_item_counts,
+            item_popularities,
+            category_freqs,
+            brand_freqs,
+            np.arange(1, len(all_items) + 1),  # item_user_rank
+        ]
+    )
+
+    combined_features = np.hstack([user_feat_repeated, item_feat, extra_features])
+    predictions = model.predict(combined_features)
+    top_item_indices = np.argsort(-predictions)[:top_n]
+    recommended_encoded_ids = all_items[top_item_indices]
+    recommended_product_ids = item_encoder.inverse_transform(recommended_encoded_ids)
+    return recommended_product_ids
+
+
+def recommend_with_training_features(
+    user_id, model, df, user_features, item_features, encoders, top_n=10
+):
+    """Скоры всего каталога для пользователя; признаки пары — как при обучении.
+
+    Отдаёт (PRODUCT_ID top_n, отсортированные скоры всего каталога).
+    """
+    user_encoder = encoders["user"]
+    item_encoder = encoders["item"]
+    if user_id not in user_encoder.classes_:
+        return [], np.array([])
+    encoded_user_id = user_encoder.transform([user_id])[0]
+
+    all_items = item_features.index.values
+    user_feat = user_features.loc[encoded_user_id].values
+    user_feat_repeated = np.tile(user_feat, (len(all_items), 1))
+    item_feat = item_features.loc[all_items].values
+
+    enriched = enrich_features(df.sort_values("item_id").copy())
+    bought = enriched[enriched["user_id"] == encoded_user_id].set_index("item_id")
+    item_attrs = df.drop_duplicates("item_id").set_index("item_id").reindex(all_items)
+    category_freq = (
+        enriched[enriched["user_id"] == encoded_user_id]
+        .groupby("COMMODITY_DESC")["QUANTITY"]
+        .sum()
+    )
+    brand_freq = (
+        enriched[enriched["user_id"] == encoded_user_id].groupby("BRAND")["QUANTITY"].sum()
+    )
+    # Некупленный товар: ранг «после последнего купленного», как в offline.scoring
+    rank = bought["item_user_rank"].reindex(all_items).fillna(len(bought) + 1)
+    extra_features = np.column_stack(
+        [
+            bought["user_item_count"].reindex(all_items, fill_value=0).values,
+            df.groupby("item_id")["user_id"].nunique().reindex(all_items, fill_value=0).values,
+            item_attrs["COMMODITY_DESC"].map(category_freq).fillna(0).values,
+            item_attrs["BRAND"].map(brand_freq).fillna(0).values,
+            rank.values,
+        ]
+    )
+
+    combined_features = np.hstack([user_feat_repeated, item_feat, extra_features]).astype(
+        np.float32
+    )
+    predictions = model.predict(combined_features)
+    top_item_indices = np.argsort(-predictions, kind="stable")[:top_n]
+    recommended_product_ids = item_encoder.inverse_transform(all_items[top_item_indices])
+    return list(recommended_product_ids), -np.sort(-predictions)
+
+
+def encode_features(df):
+    user_encoder = LabelEncoder()
+    item_encoder = LabelEncoder()
+    df["user_id"] = user_encoder.fit_transform(df["household_key"])
+    df["item_id"] = item_encoder.fit_transform(df["PRODUCT_ID"])
+
+    encoders = {"user": user_encoder, "item": item_encoder}
+    return df, encoders
+
+
+def create_item_features(df):
+    item_features = df[["item_id", "DEPARTMENT", "BRAND", "COMMODITY_DESC"]].drop_duplicates()
+
+    hasher = HashingVectorizer(n_features=50, alternate_sign=False)
+    text_data = (
+        item_features["DEPARTMENT"].astype(str)
+        + " "
+        + item_features["BRAND"].astype(str)
+        + " "
+        + item_features["COMMODITY_DESC"].astype(str)
+    )
+    text_features = hasher.fit_transform(text_data)
+
+    svd = TruncatedSVD(n_components=15, random_state=42)
+    item_features_reduced = svd.fit_transform(text_features)
+
+    item_features_full = pd.DataFrame(
+        item_features_reduced,
+        index=item_features["item_id"],
+        columns=[f"item_f{i}" for i in range(item_features_reduced.shape[1])],
+    )
+    return item_features_full
+
+
+def create_user_features(df):
+    user_features = df[["user_id", "AGE_DESC", "INCOME_DESC", "HOMEOWNER_DESC"]].drop_duplicates()
+
+    ohe = OneHotEncoder(handle_unknown="ignore", sparse_output=False)
+    user_features_ohe = ohe.fit_transform(
+        user_features[["AGE_DESC", "INCOME_DESC", "HOMEOWNER_DESC"]]
+    )
+    feature_names = ohe.get_feature_names_out(["AGE_DESC", "INCOME_DESC", "HOMEOWNER_DESC"])
+
+    user_features_full = pd.DataFrame(
+        user_features_ohe, index=user_features["user_id"], columns=feature_names
+    )
+    return user_features_full
+
+
+def prepare_training_data(df, user_features, item_features):
+    df = enrich_features(df)
+    df = df.sort_values(by="DAY")
+
+    user_items = df.groupby("user_id")["item_id"].apply(list).to_dict()
+
+    X, y, groups = [], [], []
+    for user_id, items in user_items.items():
+        user_feat = user_features.loc[user_id].values
+        item_feat = item_features.loc[items].values
+
+        group_df = df[df["user_id"] == user_id]
+        extra_features = group_df[
+            [
+                "user_item_count",
+                "item_popularity",
+                "category_user_freq",
+                "brand_user_freq",
+                "item_user_rank",
+            ]
+        ].values
+
+        user_feat_repeated = np.tile(user_feat, (len(items), 1))
+        combined_features = np.hstack([user_feat_repeated, item_feat, extra_features])
+
+        X.extend(combined_features)
+        y.extend(group_df["QUANTITY"].values)
+        groups.append(len(items))
+
+    y = np.clip(np.log1p(np.array(y)), 0, 10).astype(int)
+    return np.array(X), y, np.array(groups)
+
+
+def main_pipeline(df):
+    """Словарь как у main_pipeline ноутбука: model, enriched_df, user_features, item_features, encoders."""
+    from xgboost import XGBRanker
+
+    df, encoders = encode_features(df.copy())
+    item_features = create_item_features(df)
+    user_features = create_user_features(df)
+    X, y, groups = prepare_training_data(df, user_features, item_features)
+    model = XGBRanker(n_estimators=50, max_depth=6, random_state=42)
+    model.fit(X, y, group=groups)
+    return {
+        "model": model,
+        "enriched_df": df,
+        "user_features": user_features,
+        "item_features": item_features,
+        "encoders": encoders,
+    }
+
+
+def pipeline_frame(n_users=60, n_products=300, n_rows=3000, seed=0):
+    """Агрегированные покупки с демографией и кодами, как combined_data ноутбука."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "household_key": rng.integers(1, n_users + 1, n_rows) * 7,
+            "PRODUCT_ID": rng.integers(1, n_products + 1, n_rows) * 11,
+            "QUANTITY": rng.integers(1, 5, n_rows),
+            "DAY": rng.integers(1, 700, n_rows),
+        }
+    )
+    df = (
+        df.groupby(["household_key", "PRODUCT_ID"])
+        .agg({"QUANTITY": "sum", "DAY": "max"})
+        .reset_index()
+    )
+    df["DEPARTMENT"] = "D" + (df["PRODUCT_ID"] % 5).astype(str)
+    df["BRAND"] = "B" + (df["PRODUCT_ID"] % 3).astype(str)
+    df["COMMODITY_DESC"] = "C" + (df["PRODUCT_ID"] % 17).astype(str)
+    for column, values in [
+        ("AGE_DESC", 4),
+        ("INCOME_DESC", 3),
+        ("MARITAL_STATUS_CODE", 2),
+        ("HOMEOWNER_DESC", 2),
+        ("HH_COMP_DESC", 2),
+        ("HOUSEHOLD_SIZE_DESC", 3),
+        ("KID_CATEGORY_DESC", 2),
+    ]:
+        df[column] = column[:2] + (df["household_key"] % values).astype(str)
+    return df
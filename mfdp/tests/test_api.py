@@ -0,0 +1,156 @@
+import json
+
+import pytest
+
+from app import api
+from app.snapshot import set_snapshot
+from benchmarks.stands import snapshot_from_csv
+
+HOUSEHOLDS = {
+    1: ("A", [101, 102, 103, 104, 105, 106, 107, 108, 109, 110, 111, 112]),
+    2: ("B", [201, 202, 203]),
+    5: ("A", [101, 301, 302, 303, 304, 305, 306, 307, 308, 309, 310, 311]),
+}
+
+
+@pytest.fixture
+def served(make_recommendations_csv):
+    """Снапшот процесса собран из CSV импорта, без БД."""
+    snapshot = snapshot_from_csv(make_recommendations_csv(HOUSEHOLDS), version=7)
+    set_snapshot(snapshot)
+    return snapshot
+
+
+def test_batch_returns_ready_payloads_and_missing(api_client, served):
+    response = api_client.post(
+        "/api/v1/recommendations:batch", json={"household_keys": [2, 404, 1, 2]}
+    )
+
+    assert response.status_code == 200
+    body = response.json()
+    assert list(body["results"]) == ["2", "1"]
+    assert body["results"]["1"] == json.loads(served.payload(1))
+    assert body["missing"] == [404]
+
+
+def test_batch_stream_is_ndjson_in_request_order(api_client, served):
+    response = api_client.post(
+        "/api/v1/recommendations:batch",
+        json={"household_keys": [5, 404, 1], "stream": True},
+    )
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["household_key"] for line in lines] == [5, 404, 1]
+    assert lines[1] == {"household_key": 404, "detail": "User not found"}
+    assert lines[0]["recommendations"] == json.loads(served.payload(5))["recommendations"]
+
+
+def test_batch_rejects_too_many_keys(api_client, served, monkeypatch):
+    monkeypatch.setattr(api, "BATCH_MAX_KEYS", 2)
+
+    response = api_client.post(
+        "/api/v1/recommendations:batch", json={"household_keys": [1, 2, 5]}
+    )
+
+    assert response.status_code == 413
+
+
+def test_batch_reads_database_without_snapshot(
+    api_client, run_import, make_recommendations_csv
+):
+    run_import(make_recommendations_csv(HOUSEHOLDS))
+
+    response = api_client.post(
+        "/api/v1/recommendations:batch", json={"household_keys": [5, 404, 1]}
+    )
+
+    body = response.json()
+    assert list(body["results"]) == ["5", "1"]
+    assert body["results"]["5"]["household_key"] == 5
+    assert body["missing"] == [404]
+
+
+def test_cart_backfills_from_candidates(api_client, served):
+    response = api_client.post(
+        "/api/v1/recommendations/1/cart", json={"cart": [101, 103, 999], "top_n": 10}
+    )
+
+    body = response.json()
+    assert body["product_ids"] == [102] + list(range(104, 113))
+    assert len(body["recommendations"]) == 10
+    assert body["recommendations"][0].endswith(" 102 (Unknown)")
+
+
+def test_cart_returns_what_is_left(api_client, served):
+    response = api_client.post(
+        "/api/v1/recommendations/2/cart", json={"cart": [202], "top_n": 10}
+    )
+
+    assert response.json()["product_ids"] == [201, 203]
+
+
+def test_cart_errors(api_client, served):
+    assert (
+        api_client.post("/api/v1/recommendations/404/cart", json={"cart": []}).status_code
+        == 404
+    )
+    assert (
+        api_client.post("/api/v1/recommendations/1/cart", json={"top_n": 0}).status_code
+        == 422
+    )
+
+
+def test_cart_reads_database_without_snapshot(
+    api_client, run_import, make_recommendations_csv
+):
+    run_import(make_recommendations_csv(HOUSEHOLDS))
+
+    response = api_client.post(
+        "/api/v1/recommendations/5/cart", json={"cart": [101, 301], "top_n": 3}
+    )
+
+    assert response.json()["product_ids"] == [302, 303, 304]
+
+
+def test_snapshot_etag_and_not_modified(api_client, served):
+    response = api_client.get("/api/v1/recommendations/1")
+
+    assert response.status_code == 200
+    assert response.content == served.payload(1)
+    etag = response.headers["etag"]
+    assert etag == '"7-1"'
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        cached = api_client.get(
+            "/api/v1/recommendations/1", headers={"If-None-Match": if_none_match}
+        )
+        assert cached.status_code == 304
+        assert cached.headers["etag"] == etag
+    stale = api_client.get("/api/v1/recommendations/1", headers={"If-None-Match": '"6-1"'})
+    assert stale.status_code == 200
+
+
+def test_snapshot_telegram_format(api_client, served):
+    response = api_client.get("/api/v1/recommendations/2?format=telegram")
+
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+    assert response.text == served.telegram_text(2)
+
+
+def test_database_path_etag_and_not_modified(
+    api_client, run_import, make_recommendations_csv
+):
+    run_import(make_recommendations_csv(HOUSEHOLDS))
+
+    response = api_client.get("/api/v1/recommendations/1")
+    assert response.status_code == 200
+    assert response.json()["household_key"] == 1
+    etag = response.headers["etag"]
+
+    cached = api_client.get("/api/v1/recommendations/1", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    # Тело другое — и ETag другой, в том числе у текста для бота
+    assert api_client.get("/api/v1/recommendations/2").headers["etag"] != etag
+    telegram = api_client.get("/api/v1/recommendations/1?format=telegram")
+    assert telegram.headers["etag"] not in (etag, None)
@@ -0,0 +1,56 @@
+import os
+
+import pytest
+
+from app.artifacts import publish_dir, resolve_dir
+
+
+def publish(out_dir, text):
+    with publish_dir(out_dir) as tmp_dir:
+        with open(os.path.join(tmp_dir, "data.txt"), "w") as f:
+            f.write(text)
+
+
+def read(path):
+    with open(os.path.join(path, "data.txt")) as f:
+        return f.read()
+
+
+def test_reader_keeps_resolved_version_across_publish(tmp_path):
+    out_dir = str(tmp_path / "artifact")
+    publish(out_dir, "v1")
+    resolved = resolve_dir(out_dir)
+
+    publish(out_dir, "v2")
+    assert os.path.islink(out_dir)
+    assert read(out_dir) == "v2"
+    # Уже разрешивший путь читатель дочитывает свою версию целиком
+    assert read(resolved) == "v1"
+
+    publish(out_dir, "v3")
+    assert not os.path.exists(resolved)
+    # Симлинк, текущая и предыдущая версии
+    assert len(os.listdir(tmp_path)) == 3
+
+
+def test_legacy_directory_becomes_previous_version(tmp_path):
+    out_dir = tmp_path / "artifact"
+    out_dir.mkdir()
+    (out_dir / "data.txt").write_text("legacy")
+
+    publish(str(out_dir), "v1")
+
+    assert read(str(out_dir)) == "v1"
+    assert read(str(tmp_path / ".artifact-legacy")) == "legacy"
+
+
+def test_failed_write_publishes_nothing(tmp_path):
+    out_dir = str(tmp_path / "artifact")
+    publish(out_dir, "v1")
+
+    with pytest.raises(RuntimeError):
+        with publish_dir(out_dir):
+            raise RuntimeError("сборка упала")
+
+    assert read(out_dir) == "v1"
+    assert len(os.listdir(tmp_path)) == 2
@@ -0,0 +1,84 @@
+import asyncio
+
+import httpx
+import pytest
+
+pytest.importorskip("telegram")
+
+from bot import bot  # noqa: E402
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """Ответы API по очереди из списка; исключение в списке — ошибка запроса."""
+    responses = []
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(
+        bot, "_http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+
+    async def no_sleep(seconds):
+        pass
+
+    monkeypatch.setattr(bot.asyncio, "sleep", no_sleep)
+    return responses, requests
+
+
+def test_api_get_retries_gateway_errors(api):
+    responses, requests = api
+    responses.extend([httpx.Response(503), httpx.Response(502), httpx.Response(200, text="ok")])
+
+    response = asyncio.run(bot.api_get("http://api/recommendations/1"))
+
+    assert response.text == "ok"
+    assert len(requests) == 3
+
+
+def test_api_get_gives_up_after_retries(api):
+    responses, requests = api
+    responses.extend([httpx.ReadTimeout("долго")] * (bot.HTTP_RETRIES + 1))
+
+    with pytest.raises(httpx.TimeoutException):
+        asyncio.run(bot.api_get("http://api/recommendations/1"))
+    assert len(requests) == bot.HTTP_RETRIES + 1
+
+
+def test_recommendations_text_without_fallback(api):
+    responses, requests = api
+    responses.extend([httpx.Response(200, text="*Рекомендации*"), httpx.Response(404)])
+
+    assert asyncio.run(bot.fetch_recommendations_text(1)) == "*Рекомендации*"
+    assert asyncio.run(bot.fetch_recommendations_text(2)) is None
+    assert requests[0].url.params["format"] == "telegram"
+    assert requests[0].url.params["fallback"] == "false"
+
+
+def test_poll_for_result_is_one_long_poll(api):
+    responses, requests = api
+    responses.append(httpx.Response(200, json={"household_key": 1}))
+
+    assert asyncio.run(bot.poll_for_result("job", timeout=7)) == {"household_key": 1}
+    assert requests[0].url.path.endswith("/jobs/job")
+    assert requests[0].url.params["wait"] == "7"
+
+
+def test_save_request_does_not_wait_for_database(monkeypatch):
+    submitted = []
+
+    class Writer:
+        def submit(self, *args, block=True):
+            submitted.append((args, block))
+
+    monkeypatch.setattr(bot, "get_history_writer", lambda: Writer())
+
+    bot.save_request("artem", 5, "manual")
+
+    assert submitted == [(("artem", 5, "manual"), False)]
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+
+from offline.candidates import (
+    CandidateGenerator,
+    candidate_recall,
+    interaction_matrix,
+    item_neighbours,
+    top_per_row,
+)
+from offline.scoring import score_users
+from offline.similarity import recommend_user_based, user_neighbours
+
+
+def test_top_per_row_matches_sort():
+    rng = np.random.default_rng(1)
+    dense = rng.random((30, 40)) * (rng.random((30, 40)) < 0.2)
+
+    got = top_per_row(csr_matrix(dense), 5)
+
+    for row, picked in zip(dense, got):
+        expected = [i for i in np.argsort(-row, kind="stable") if row[i] > 0][:5]
+        assert list(picked[picked >= 0]) == expected
+        assert (picked[len(expected) :] == -1).all()
+
+
+def test_item_neighbours_match_dense_cosine(pipeline):
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    interactions = interaction_matrix(pipeline["data"])
+    dense = cosine_similarity(interactions.T)
+    np.fill_diagonal(dense, 0)
+
+    neighbours = item_neighbours(interactions, k=5, block=37)
+
+    for item in range(0, interactions.shape[1], 13):
+        row = neighbours[item]
+        np.testing.assert_allclose(
+            np.sort(row.data)[::-1], np.sort(dense[item])[::-1][: row.nnz], rtol=1e-5
+        )
+        np.testing.assert_allclose(dense[item, row.indices], row.data, rtol=1e-5)
+
+
+def test_candidates_cover_history_and_have_no_repeats(pipeline):
+    data = pipeline["data"]
+    generator = CandidateGenerator(data, n_history=300, n_copurchase=30, n_popular=20)
+    users = np.arange(len(data.household_keys))
+
+    candidates = generator.generate(users)
+
+    assert candidates.shape == (len(users), generator.size)
+    for user, row in zip(users, candidates):
+        picked = row[row >= 0]
+        assert len(picked) == len(set(picked))
+        assert set(data.user_item[user].indices) <= set(picked)
+        assert set(generator.popular) <= set(picked)
+
+
+def test_similar_users_source(pipeline):
+    data = pipeline["data"]
+    interactions = interaction_matrix(data)
+    graph = user_neighbours(interactions, data.household_keys, k=5, workers=1)
+    generator = CandidateGenerator(
+        data, n_history=0, n_copurchase=0, n_popular=0, user_graph=graph, n_similar=10
+    )
+    users = np.arange(8)
+
+    candidates = generator.generate(users)
+
+    expected = recommend_user_based(graph, interactions, users, 10)
+    for row, similar in zip(candidates, expected):
+        assert set(row[row >= 0]) == set(similar[similar >= 0])
+
+
+def test_candidate_scores_equal_full_scores(pipeline):
+    model, data = pipeline["model"], pipeline["data"]
+    generator = CandidateGenerator(data, n_history=20, n_copurchase=30, n_popular=20)
+    users = np.arange(10)
+
+    _, full_products, full_scores = score_users(model, data, users, len(data.item_ids))
+    _, products, scores = score_users(model, data, users, 10, generator)
+
+    candidates = generator.generate(users)
+    for row, (user_products, user_scores) in enumerate(zip(products, scores)):
+        by_product = dict(zip(full_products[row], full_scores[row]))
+        allowed = set(data.product_ids[candidates[row][candidates[row] >= 0]])
+        for product, score in zip(user_products, user_scores):
+            if product < 0:
+                continue
+            assert product in allowed
+            assert score == pytest.approx(by_product[product], rel=1e-6)
+
+
+def test_recall_is_full_when_candidates_cover_catalog(pipeline):
+    model, data = pipeline["model"], pipeline["data"]
+    everything = CandidateGenerator(
+        data, n_history=0, n_copurchase=0, n_popular=len(data.item_ids)
+    )
+    narrow = CandidateGenerator(data, n_history=2, n_copurchase=0, n_popular=3)
+
+    assert candidate_recall(model, data, everything, sample=30) == 1.0
+    assert candidate_recall(model, data, narrow, sample=30) < 1.0
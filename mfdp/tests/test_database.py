@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy import create_engine, text
+
+from app import database
+
+
+@pytest.fixture
+def role(monkeypatch):
+    """Роль процесса без созданных движков; всё возвращается после теста."""
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "_role", "api")
+    for name in ("DB_POOL_SIZE", "DB_WORKER_POOL_SIZE", "DB_STATEMENT_TIMEOUT"):
+        monkeypatch.delenv(name, raising=False)
+
+    def use(name):
+        database.configure(name)
+        return database.engine_options()
+
+    return use
+
+
+def test_role_defaults_and_overrides(role, monkeypatch):
+    importer = role("importer")
+    assert (importer["pool_size"], importer["max_overflow"]) == (1, 1)
+    assert "options" not in importer["connect_args"]
+    assert importer["connect_args"]["application_name"] == "mfdp-importer"
+
+    assert role("worker")["pool_size"] == 4
+    monkeypatch.setenv("DB_POOL_SIZE", "7")
+    assert role("worker")["pool_size"] == 7
+    # Настройка роли сильнее общей
+    monkeypatch.setenv("DB_WORKER_POOL_SIZE", "9")
+    assert role("api")["pool_size"] == 7
+    worker = role("worker")
+    assert worker["pool_size"] == 9
+    assert worker["pool_pre_ping"] is True
+    assert worker["connect_args"]["options"] == "-c statement_timeout=10000"
+
+    server_settings = database.async_engine_options()["connect_args"]["server_settings"]
+    assert server_settings == {"application_name": "mfdp-worker", "statement_timeout": "10000"}
+
+
+def test_role_is_fixed_once_engine_exists(role, monkeypatch):
+    with pytest.raises(ValueError):
+        role("nobody")
+
+    monkeypatch.setattr(database, "_engine", object())
+    role("api")
+    with pytest.raises(RuntimeError):
+        role("bot")
+
+
+def test_engine_is_created_lazily_once(role):
+    role("bot")
+
+    engine = database.get_engine()
+    try:
+        assert database.get_engine() is engine
+        assert database.engine is engine
+        assert engine.pool.size() == 2
+    finally:
+        engine.dispose()
+
+
+def test_session_settings_reach_postgres(role, pg_schema):
+    options = role("api")
+    options["connect_args"]["options"] += f" -csearch_path={pg_schema}"
+    engine = create_engine(database.SQLALCHEMY_DATABASE_URL, **options)
+    try:
+        with engine.connect() as connection:
+            assert connection.execute(text("SHOW statement_timeout")).scalar() == "5s"
+            assert connection.execute(text("SHOW application_name")).scalar() == "mfdp-api"
+    finally:
+        engine.dispose()
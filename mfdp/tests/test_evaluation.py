@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+from offline.evaluation import METRICS, evaluate, evaluate_csv, truth_matrix  # noqa: E402
+from tests import notebook_reference as nb  # noqa: E402
+
+
+def random_case(seed, n_users=80, n_products=60, n=10):
+    rng = np.random.default_rng(seed)
+    transactions = pd.DataFrame(
+        {
+            "household_key": rng.integers(1, n_users + 1, 600),
+            "PRODUCT_ID": rng.integers(1, n_products + 1, 600) * 3,
+        }
+    )
+    recommendations = {}
+    # Часть домохозяйств без покупок в тесте, часть с одной рекомендацией
+    for key in range(1, n_users + 20):
+        size = int(rng.choice([1, 1, 3, n]))
+        products = rng.choice(n_products + 5, size, replace=False) + 1
+        recommendations[key] = [int(p) * 3 for p in products]
+    return transactions, recommendations
+
+
+def write_csv(path, recommendations, n=10):
+    rows = [
+        {"household_key": key, **{f"rec_{i + 1}": p for i, p in enumerate(products)}}
+        for key, products in recommendations.items()
+    ]
+    frame = pd.DataFrame(rows, columns=["household_key"] + [f"rec_{i + 1}" for i in range(n)])
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def notebook_metrics(transactions, recommendations, n=10):
+    test_matrix, user_id_map, product_id_map = nb.create_interaction_matrix(transactions)
+    return nb.evaluate_recommendations(test_matrix, recommendations, user_id_map, product_id_map, n)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_csv_metrics_match_notebook(tmp_path, seed):
+    transactions, recommendations = random_case(seed)
+    path = write_csv(tmp_path / "recs.csv", recommendations)
+
+    metrics = evaluate_csv(path, transactions)
+
+    expected = notebook_metrics(transactions, recommendations)
+    assert metrics == pytest.approx(expected)
+
+
+def test_single_recommendation_users_are_left_out_of_ndcg(tmp_path):
+    transactions = pd.DataFrame({"household_key": [1, 1, 2], "PRODUCT_ID": [10, 11, 20]})
+    recommendations = {1: [12, 11, 10], 2: [20]}
+    path = write_csv(tmp_path / "recs.csv", recommendations)
+
+    metrics = evaluate_csv(path, transactions)
+
+    assert metrics["ndcg"] == pytest.approx(notebook_metrics(transactions, recommendations)["ndcg"])
+    assert metrics["ndcg"] < 1
+    assert metrics["hit_rate"] == 1.0
+
+
+def test_chunks_and_workers_do_not_change_metrics():
+    transactions, recommendations = random_case(3)
+    keys = np.array(list(recommendations))
+    products = np.full((len(keys), 10), -1)
+    for row, key in enumerate(keys):
+        products[row, : len(recommendations[key])] = recommendations[key]
+    truth, columns = truth_matrix(transactions, keys, products)
+
+    whole = evaluate(columns, truth)
+    chunked = evaluate(columns, truth, chunk_users=7)
+    pooled = evaluate(columns, truth, chunk_users=7, workers=2)
+
+    assert chunked == pytest.approx(whole)
+    assert pooled == pytest.approx(whole)
+    assert set(whole) == set(METRICS)
+
+
+def test_no_evaluated_users():
+    truth, columns = truth_matrix(
+        pd.DataFrame({"household_key": [9], "PRODUCT_ID": [1]}), np.array([1]), np.array([[5]])
+    )
+    assert evaluate(columns, truth) == dict.fromkeys(METRICS, 0.0)
@@ -0,0 +1,105 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+from offline.features import UNKNOWN, FeatureStore  # noqa: E402
+from tests import notebook_reference as nb  # noqa: E402
+
+FEATURES = [
+    "user_item_count",
+    "item_popularity",
+    "category_user_freq",
+    "brand_user_freq",
+    "item_user_rank",
+]
+
+
+@pytest.fixture(scope="module")
+def history():
+    rng = np.random.default_rng(3)
+    n = 5000
+    transactions = pd.DataFrame(
+        {
+            "household_key": rng.integers(1, 80, n),
+            "PRODUCT_ID": rng.integers(1, 300, n) * 13,
+            "QUANTITY": rng.integers(0, 4, n),
+            "SALES_VALUE": rng.random(n).round(2),
+            "DAY": rng.integers(1, 101, n),
+        }
+    )
+    products = pd.DataFrame({"PRODUCT_ID": np.arange(1, 300) * 13})
+    # Часть товаров без категории — ноутбук заполняет их UNKNOWN
+    products["COMMODITY_DESC"] = np.where(
+        products["PRODUCT_ID"] % 11 == 0, None, "C" + (products["PRODUCT_ID"] % 23).astype(str)
+    )
+    products["BRAND"] = "B" + (products["PRODUCT_ID"] % 4).astype(str)
+    return transactions, products
+
+
+def notebook_aggregate(transactions):
+    return (
+        transactions.groupby(["household_key", "PRODUCT_ID"])
+        .agg({"QUANTITY": "sum", "SALES_VALUE": "sum", "DAY": "max"})
+        .reset_index()
+    )
+
+
+def prepare(aggregated, products):
+    """load_and_prepare_data ноутбука: атрибуты товара, UNKNOWN и коды LabelEncoder."""
+    df = pd.merge(aggregated, products, on="PRODUCT_ID", how="left")
+    for column in ["BRAND", "COMMODITY_DESC"]:
+        df[column] = df[column].astype("category")
+        if UNKNOWN not in df[column].cat.categories:
+            df[column] = df[column].cat.add_categories(UNKNOWN)
+        df[column] = df[column].fillna(UNKNOWN)
+    df["user_id"] = np.unique(df["household_key"], return_inverse=True)[1]
+    df["item_id"] = np.unique(df["PRODUCT_ID"], return_inverse=True)[1]
+    return df
+
+
+def test_incremental_store_matches_enrich_features(tmp_path, history):
+    transactions, products = history
+    store_dir = str(tmp_path / "store")
+    store = FeatureStore.load(store_dir)
+    assert store.apply(transactions, products, day_to=60) > 0
+    store.save()
+
+    store = FeatureStore.load(store_dir)
+    store.apply(transactions, products)
+    store.save()
+    store = FeatureStore.load(store_dir)
+
+    aggregated = notebook_aggregate(transactions)
+    pd.testing.assert_frame_equal(
+        store.aggregated_transactions(), aggregated, check_dtype=False
+    )
+    assert store.last_day == transactions["DAY"].max()
+    assert store.transactions == len(transactions)
+
+    expected = nb.enrich_features(prepare(aggregated, products))
+    got = store.enrich(prepare(store.aggregated_transactions(), products))
+    for column in FEATURES:
+        np.testing.assert_allclose(
+            got[column].to_numpy(float), expected[column].to_numpy(float), err_msg=column
+        )
+
+
+def test_applied_days_cannot_be_applied_again(tmp_path, history):
+    transactions, products = history
+    store = FeatureStore(str(tmp_path / "store"))
+    store.apply(transactions, products, day_to=60)
+
+    with pytest.raises(ValueError):
+        store.apply(transactions, products, day_from=30)
+    # Без day_from продолжает со следующего дня, пустой диапазон — ноль строк
+    assert store.apply(transactions, products, day_to=60) == 0
+    assert store.apply(transactions, products) == (transactions["DAY"] > 60).sum()
+
+
+def test_missing_store_loads_empty(tmp_path):
+    store = FeatureStore.load(str(tmp_path / "absent"))
+
+    assert store.last_day is None
+    assert store.aggregated_transactions().empty
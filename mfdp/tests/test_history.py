@@ -0,0 +1,130 @@
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select
+
+from app import history
+from app.database import SessionLocal
+from app.history import HistoryWriter
+from app.models import UserRequest
+
+
+class RecordingSession:
+    """Сессия без БД: запоминает пачки, которые пишет HistoryWriter."""
+
+    def __init__(self, batches):
+        self.batches = batches
+        self.pending = None
+
+    def execute(self, statement, batch):
+        self.pending = list(batch)
+
+    def commit(self):
+        self.batches.append(self.pending)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class DeadSession(RecordingSession):
+    def __init__(self):
+        super().__init__([])
+
+    def execute(self, statement, batch):
+        time.sleep(0.2)
+        raise RuntimeError("БД недоступна")
+
+
+def recording_factory():
+    batches = []
+    return lambda: RecordingSession(batches), batches
+
+
+def test_close_writes_everything_in_batches():
+    factory, batches = recording_factory()
+    writer = HistoryWriter(batch_size=2, flush_interval=10, session_factory=factory).start()
+
+    for i in range(5):
+        assert writer.submit("login", i, "manual")
+    writer.close()
+
+    assert all(len(batch) <= 2 for batch in batches)
+    assert [event["requested_user_id"] for batch in batches for event in batch] == list(
+        range(5)
+    )
+
+
+def test_flush_interval_writes_partial_batch():
+    factory, batches = recording_factory()
+    writer = HistoryWriter(batch_size=100, flush_interval=0.05, session_factory=factory).start()
+    try:
+        writer.submit("login", 1, "random")
+        deadline = time.monotonic() + 2
+        while not batches and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [event["request_type"] for event in batches[0]] == ["random"]
+    finally:
+        writer.close()
+
+
+def test_full_queue_rejects_without_blocking():
+    factory, _ = recording_factory()
+    # Поток не запущен — очередь никто не разбирает
+    writer = HistoryWriter(max_queue=1, session_factory=factory)
+
+    assert writer.submit("login", 1, "manual", block=False)
+    assert not writer.submit("login", 2, "manual", block=False)
+
+
+def test_close_is_bounded_with_full_queue_and_dead_database(monkeypatch):
+    monkeypatch.setattr(history, "HISTORY_WRITE_RETRIES", 1)
+    writer = HistoryWriter(
+        batch_size=2, flush_interval=0.05, max_queue=3, session_factory=DeadSession
+    ).start()
+    for i in range(8):
+        writer.submit("login", i, "manual", timeout=0.01)
+
+    closer = threading.Thread(target=writer.close, kwargs={"timeout": 0.5})
+    started = time.monotonic()
+    closer.start()
+    closer.join(5)
+
+    assert not closer.is_alive()
+    assert time.monotonic() - started < 2
+
+
+def test_events_reach_user_requests(pg_db):
+    writer = HistoryWriter(batch_size=3, flush_interval=0.05).start()
+    for i in range(7):
+        writer.submit("artem", i, "manual" if i % 2 else "random")
+    writer.close()
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(UserRequest).order_by(UserRequest.id)).scalars().all()
+    finally:
+        db.close()
+    assert [row.requested_user_id for row in rows] == list(range(7))
+    assert {row.telegram_login for row in rows} == {"artem"}
+    assert all(row.timestamp is not None for row in rows)
+
+
+def test_timestamp_is_naive_utc_in_any_host_timezone(monkeypatch):
+    factory, batches = recording_factory()
+    monkeypatch.setenv("TZ", "Asia/Vladivostok")
+    time.tzset()
+    try:
+        writer = HistoryWriter(flush_interval=10, session_factory=factory).start()
+        writer.submit("login", 1, "manual")
+        writer.close()
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+    stamp = batches[0][0]["timestamp"]
+    assert stamp.tzinfo is None
+    assert abs(stamp - datetime.now(timezone.utc).replace(tzinfo=None)) < timedelta(minutes=1)
@@ -0,0 +1,75 @@
+import csv
+import json
+
+import pytest
+
+import import_csv
+from app.snapshot_versions import TABLE, VERSIONS_TABLE
+from app.utils import render_products
+from tests.conftest import PROFILE_COLUMNS
+
+
+def test_copy_value_escapes_text_format():
+    assert import_csv.copy_value(None) == "\\N"
+    assert import_csv.copy_value([1, 2]) == "{1,2}"
+    assert import_csv.copy_value(b"\x01") == "\\\\x01"
+    assert import_csv.copy_value("a\tb\\c\nd") == "a\\tb\\\\c\\nd"
+
+
+def test_rows_are_loaded_in_chunks_with_payloads(
+    run_import, make_recommendations_csv, pg_cursor, monkeypatch
+):
+    monkeypatch.setattr(import_csv, "CHUNK_SIZE", 2)
+    households = {key: ("A", list(range(key * 100, key * 100 + 12))) for key in range(1, 6)}
+    households[6] = (("Tab\there",) + ("B",) * (len(PROFILE_COLUMNS) - 1), [7])
+
+    run_import(make_recommendations_csv(households))
+
+    pg_cursor.execute(
+        f"SELECT household_key, age_desc, recommendations, candidates, candidate_scores, "
+        f"payload FROM {TABLE} ORDER BY household_key"
+    )
+    rows = pg_cursor.fetchall()
+    assert [row[0] for row in rows] == [1, 2, 3, 4, 5, 6]
+    key, _, recommendations, candidates, scores, payload = rows[0]
+    assert recommendations == list(range(100, 110))
+    assert candidates == list(range(100, 112))
+    assert scores[:2] == [1.0, 0.99]
+    assert json.loads(bytes(payload))["recommendations"] == render_products(recommendations)
+    assert rows[5][1] == "Tab\there"
+
+
+def test_bad_rows_are_rejected_and_counted(run_import, tmp_path, pg_cursor):
+    path = tmp_path / "bad.csv"
+    header = ["household_key"] + PROFILE_COLUMNS + ["rec_1", "rec_2", "score_1", "score_2"]
+    profile = ["A"] * len(PROFILE_COLUMNS)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerow(["1", *profile, "10", "11", "0.9", "0.8"])
+        writer.writerow(["1", *profile, "12", "", "0.9", ""])  # дубликат
+        writer.writerow(["2", *profile, "10", "11", "0.9", ""])  # скоров меньше
+        writer.writerow(["x", *profile, "10", "", "", ""])
+
+    run_import(str(path))
+
+    pg_cursor.execute(f"SELECT row_count, rejected_count, status FROM {VERSIONS_TABLE}")
+    assert pg_cursor.fetchall() == [(1, 3, "active")]
+
+
+def test_failed_load_keeps_active_snapshot(
+    run_import, make_recommendations_csv, pg_cursor, monkeypatch
+):
+    run_import(make_recommendations_csv({1: ("A", [10])}, "good.csv"))
+
+    def broken(cursor, snapshot_id):
+        raise RuntimeError("сегменты не посчитались")
+
+    monkeypatch.setattr(import_csv, "compute_segments", broken)
+    with pytest.raises(RuntimeError):
+        run_import(make_recommendations_csv({2: ("A", [20])}, "broken.csv"))
+
+    pg_cursor.execute(f"SELECT id, status FROM {VERSIONS_TABLE} ORDER BY id")
+    assert pg_cursor.fetchall() == [(1, "active"), (2, "failed")]
+    pg_cursor.execute(f"SELECT household_key FROM {TABLE}")
+    assert pg_cursor.fetchall() == [(1,)]
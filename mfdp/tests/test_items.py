@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from app import items
+
+pytest.importorskip("openpyxl")
+
+
+@pytest.fixture
+def items_xls(tmp_path):
+    path = tmp_path / "dict_items.xlsx"
+    pd.DataFrame(
+        {
+            "PRODUCT_ID": [30, 10, 20, 10],
+            "DEPARTMENT": ["MEAT", "GROCERY", None, "PRODUCE"],
+            "EMODZI": ["🥩", "🛒", "🥦", "🥦"],
+        }
+    ).to_excel(path, index=False)
+    return str(path)
+
+
+def test_catalog_renders_known_and_unknown_products(items_xls, tmp_path):
+    catalog_dir = str(tmp_path / "catalog")
+    items.build_catalog(items_xls, catalog_dir)
+    catalog = items.open_catalog(catalog_dir)
+
+    assert len(catalog) == 3
+    assert list(catalog.lookup([20, 15, 30])) == [1, -1, 2]
+    # Повторный PRODUCT_ID — берётся последняя строка справочника
+    assert catalog.render([10, 20, 99]) == [
+        "🥦 10 (PRODUCE)",
+        "🥦 20 (Unknown)",
+        "❓ 99 (Unknown)",
+    ]
+    assert catalog.info(30) == {"category": "MEAT", "emoji": "🥩"}
+
+
+def test_concurrent_loads_build_catalog_once(items_xls, tmp_path, monkeypatch):
+    catalog_dir = str(tmp_path / "catalog")
+    build = items.build_catalog
+    builds = []
+
+    def slow_build(path, out_dir):
+        builds.append(path)
+        time.sleep(0.2)
+        build(path, out_dir)
+
+    monkeypatch.setattr(items, "build_catalog", slow_build)
+    # flock берётся на открытый файл: потоки конкурируют за него, как процессы
+    threads = [
+        threading.Thread(target=items.ensure_catalog, args=(items_xls, catalog_dir))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(builds) == 1
+    assert len(items.open_catalog(catalog_dir)) == 3
+
+
+def test_catalog_rebuilds_when_source_is_newer(items_xls, tmp_path, monkeypatch):
+    catalog_dir = str(tmp_path / "catalog")
+    items.ensure_catalog(items_xls, catalog_dir)
+    builds = []
+    monkeypatch.setattr(items, "build_catalog", lambda path, out_dir: builds.append(path))
+
+    items.ensure_catalog(items_xls, catalog_dir)
+    assert builds == []
+
+    marker = os.path.getmtime(os.path.join(catalog_dir, "tables.json"))
+    os.utime(items_xls, (marker + 10, marker + 10))
+    items.ensure_catalog(items_xls, catalog_dir)
+    assert builds == [items_xls]
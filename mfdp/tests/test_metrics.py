@@ -0,0 +1,78 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
+
+from app import database
+from app.metrics import (
+    MetricsMiddleware,
+    TimedQueuePool,
+    instrument_engine,
+    router,
+    statement_operation,
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.fixture
+def metrics_client():
+    app = FastAPI()
+    app.include_router(router)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        return {"item_id": item_id}
+
+    app.add_middleware(MetricsMiddleware)
+    return TestClient(app)
+
+
+def test_requests_are_labelled_by_route_template(metrics_client):
+    route = {"method": "GET", "route": "/items/{item_id}", "status": "200"}
+    before = sample("http_request_duration_seconds_count", **route)
+    unmatched = sample(
+        "http_request_duration_seconds_count", method="GET", route="unmatched", status="404"
+    )
+
+    for item_id in (1, 2, 3):
+        metrics_client.get(f"/items/{item_id}")
+    metrics_client.get("/missing")
+
+    assert sample("http_request_duration_seconds_count", **route) == before + 3
+    assert (
+        sample("http_request_duration_seconds_count", method="GET", route="unmatched", status="404")
+        == unmatched + 1
+    )
+    exposed = metrics_client.get("/metrics").text
+    assert 'route="/items/{item_id}"' in exposed
+    assert "/items/1" not in exposed
+
+
+def test_statement_operation():
+    assert statement_operation("  select 1") == "SELECT"
+    assert statement_operation("COPY t FROM STDIN") == "COPY"
+    assert statement_operation("ALTER TABLE t") == "OTHER"
+    assert statement_operation("") == "OTHER"
+
+
+def test_engine_queries_pool_waits_and_errors(pg_schema):
+    engine = create_engine(database.SQLALCHEMY_DATABASE_URL, poolclass=TimedQueuePool)
+    instrument_engine(engine)
+    selects = sample("db_query_duration_seconds_count", operation="SELECT")
+    checkouts = sample("db_pool_checkout_wait_seconds_count", pool="sync")
+    errors = sample("db_query_errors_total", operation="SELECT")
+
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+        with pytest.raises(ProgrammingError):
+            connection.execute(text("SELECT * FROM no_such_table"))
+    engine.dispose()
+
+    assert sample("db_query_duration_seconds_count", operation="SELECT") >= selects + 1
+    assert sample("db_pool_checkout_wait_seconds_count", pool="sync") >= checkouts + 1
+    assert sample("db_query_errors_total", operation="SELECT") == errors + 1
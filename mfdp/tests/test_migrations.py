@@ -0,0 +1,100 @@
+"""alembic upgrade в схеме теста: на пустой базе, после create_all и на старой базе."""
+import os
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config
+
+from app.database import Base
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def upgrade(pg_schema, monkeypatch):
+    """alembic upgrade <revision>; env.py подключается к схеме теста через PGOPTIONS."""
+    monkeypatch.setenv("PGOPTIONS", f"-csearch_path={pg_schema}")
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "migrations"))
+
+    def run(revision="head"):
+        command.upgrade(config, revision)
+
+    return run
+
+
+def relations(engine):
+    with engine.connect() as connection:
+        rows = connection.execute(
+            sa.text(
+                "SELECT table_name, table_type FROM information_schema.tables "
+                "WHERE table_schema = current_schema()"
+            )
+        )
+        return dict(rows.fetchall())
+
+
+def version_columns(engine):
+    return {c["name"] for c in sa.inspect(engine).get_columns("snapshot_versions")}
+
+
+def test_upgrade_empty_database(upgrade, pg_engine):
+    upgrade()
+
+    tables = relations(pg_engine)
+    # Пустая живая таблица удалена: первый импорт создаст представление
+    assert "user_recommendations" not in tables
+    assert {"user_requests", "snapshot_versions", "segment_recommendations"} <= set(tables)
+    assert {"status", "source_hash", "activated_at"} <= version_columns(pg_engine)
+
+
+def test_upgrade_after_create_all(upgrade, pg_engine):
+    import app.models  # noqa: F401
+
+    # API или импортёр стартовали раньше миграций
+    Base.metadata.create_all(bind=pg_engine)
+
+    upgrade()
+
+    assert "user_recommendations" not in relations(pg_engine)
+    indexes = {i["name"] for i in sa.inspect(pg_engine).get_indexes("user_requests")}
+    assert "ix_user_requests_login_ts" in indexes
+
+
+def test_upgrade_after_first_import(upgrade, pg_engine, run_import, make_recommendations_csv):
+    run_import(make_recommendations_csv({1: ("A", [10, 11])}))
+
+    upgrade()
+
+    assert relations(pg_engine)["user_recommendations"] == "VIEW"
+    with pg_engine.connect() as connection:
+        assert connection.execute(
+            sa.text("SELECT household_key FROM user_recommendations")
+        ).fetchall() == [(1,)]
+
+
+def test_upgrade_adopts_populated_legacy_table(upgrade, pg_engine):
+    upgrade("0002")
+    with pg_engine.begin() as connection:
+        connection.execute(
+            sa.text(
+                "INSERT INTO user_recommendations (household_key, recommendations, payload) "
+                "VALUES (1, '{10,11}', 'x'), (2, '{20}', 'y')"
+            )
+        )
+        connection.execute(sa.text("INSERT INTO snapshot_versions (row_count) VALUES (2)"))
+
+    upgrade()
+
+    assert relations(pg_engine)["user_recommendations"] == "VIEW"
+    with pg_engine.connect() as connection:
+        versions = connection.execute(
+            sa.text("SELECT id, status, source_file, row_count FROM snapshot_versions ORDER BY id")
+        ).fetchall()
+        served = connection.execute(
+            sa.text("SELECT household_key FROM user_recommendations ORDER BY 1")
+        ).fetchall()
+    assert versions == [(1, "deleted", None, 2), (2, "active", "legacy", 2)]
+    assert served == [(1,), (2,)]
+    assert "user_recommendations_s2" in relations(pg_engine)
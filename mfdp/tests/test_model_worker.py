@@ -0,0 +1,126 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.snapshot import set_snapshot
+from benchmarks.stands import snapshot_from_csv
+from worker import model_worker
+
+
+class RecordingChannel:
+    def __init__(self):
+        self.published = []
+        self.acks = []
+        self.nacks = []
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        self.published.append((properties.correlation_id, properties.headers["status"], body))
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acks.append((delivery_tag, multiple))
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        self.nacks.append((delivery_tag, multiple, requeue))
+
+
+def message(tag, body, correlation_id=None, redelivered=False):
+    method = SimpleNamespace(delivery_tag=tag, redelivered=redelivered)
+    properties = SimpleNamespace(correlation_id=correlation_id, headers={"published_at": 0})
+    return method, properties, body if isinstance(body, bytes) else json.dumps(body).encode()
+
+
+@pytest.fixture
+def served(make_recommendations_csv, monkeypatch):
+    snapshot = snapshot_from_csv(make_recommendations_csv({1: ("A", [10, 11])}), version=1)
+    set_snapshot(snapshot)
+    monkeypatch.setattr(model_worker, "get_scorer", lambda: None)
+    return snapshot
+
+
+def test_batch_is_answered_and_acked_once(served):
+    channel = RecordingChannel()
+
+    model_worker.process_batch(
+        channel,
+        [
+            message(1, {"user_id": 1, "job_id": "a"}),
+            message(2, {"user_id": 99}, correlation_id="b"),
+            message(3, b"not json"),
+            message(4, {"user_id": 1, "job_id": "c"}),
+        ],
+    )
+
+    assert [(job, status) for job, status, _ in channel.published] == [
+        ("a", 200),
+        ("b", 404),
+        ("c", 200),
+    ]
+    assert channel.published[0][2] == served.payload(1)
+    assert json.loads(channel.published[1][2])["detail"] == "User not found"
+    # Битое сообщение — отдельный nack без возврата в очередь, остальные — один ack
+    assert channel.nacks == [(3, False, False)]
+    assert channel.acks == [(4, True)]
+
+
+def test_lookup_failure_returns_batch_to_queue(served, monkeypatch):
+    def broken(user_ids):
+        raise RuntimeError("БД недоступна")
+
+    monkeypatch.setattr(model_worker, "iter_payloads", broken)
+    channel = RecordingChannel()
+
+    model_worker.process_batch(channel, [message(1, {"user_id": 1}), message(2, {"user_id": 2})])
+
+    assert channel.published == []
+    assert channel.acks == []
+    assert channel.nacks == [(2, True, True)]
+
+
+def test_redelivered_batch_drops_only_poison_message(served, monkeypatch):
+    lookup = model_worker.iter_payloads
+
+    def poisoned(user_ids):
+        # Как ARRAY(Integer) на user_id вне int4: падает вся пачка с ним
+        if 2**31 in user_ids:
+            raise RuntimeError("integer out of range")
+        return lookup(user_ids)
+
+    monkeypatch.setattr(model_worker, "iter_payloads", poisoned)
+    channel = RecordingChannel()
+
+    model_worker.process_batch(
+        channel,
+        [
+            message(1, {"user_id": 1, "job_id": "a"}, redelivered=True),
+            message(2, {"user_id": 2**31, "job_id": "b"}, redelivered=True),
+            message(3, {"user_id": 99, "job_id": "c"}, redelivered=True),
+        ],
+    )
+
+    assert [(job, status) for job, status, _ in channel.published] == [("a", 200), ("c", 404)]
+    assert channel.acks == [(1, False), (3, False)]
+    assert channel.nacks == [(2, False, False)]
+
+
+def test_misses_and_fresh_requests_go_to_scorer(served, monkeypatch):
+    calls = []
+
+    class Scorer:
+        def score(self, keys, fresh):
+            calls.append((list(keys), set(fresh)))
+            return {key: b'{"scored":%d}' % key for key in keys}
+
+    monkeypatch.setattr(model_worker, "get_scorer", lambda: Scorer())
+    channel = RecordingChannel()
+
+    model_worker.process_batch(
+        channel,
+        [
+            message(1, {"user_id": 1, "job_id": "a", "fresh": True}),
+            message(2, {"user_id": 7, "job_id": "b"}),
+        ],
+    )
+
+    assert calls == [([1, 7], {1})]
+    assert [body for _, _, body in channel.published] == [b'{"scored":1}', b'{"scored":7}']
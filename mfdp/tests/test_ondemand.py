@@ -0,0 +1,89 @@
+import json
+import threading
+
+import numpy as np
+import pytest
+
+from app import api, lookup
+from app.snapshot import refresh_snapshot
+from worker.scoring import OnDemandScorer
+
+
+class CountingModel:
+    """Ранкер пайплайна, который считает вызовы predict."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def predict(self, features):
+        with self.lock:
+            self.calls += 1
+        return self.model.predict(features)
+
+
+@pytest.fixture
+def scorer_factory(pipeline):
+    scorers = []
+
+    def make(**kw):
+        model = CountingModel(pipeline["model"])
+        scorer = OnDemandScorer(model, pipeline["data"], n=10, **kw)
+        scorers.append(scorer)
+        return scorer, model
+
+    yield make
+    for scorer in scorers:
+        scorer.close()
+
+
+def test_concurrent_requests_share_one_predict(pipeline, scorer_factory):
+    from offline.scoring import score_users
+
+    scorer, model = scorer_factory(max_wait=0.5, batch_users=8, write_back=False)
+    data = pipeline["data"]
+    keys = [int(key) for key in data.household_keys[:8]]
+
+    results = scorer.score(keys)
+
+    assert model.calls == 1
+    _, product_ids, _ = score_users(pipeline["model"], data, np.arange(8), 10)
+    for key, products in zip(keys, product_ids):
+        body = json.loads(results[key])
+        assert body["household_key"] == key
+        assert len(body["recommendations"]) == np.count_nonzero(products >= 0)
+
+
+def test_unknown_household_and_cache(pipeline, scorer_factory):
+    scorer, model = scorer_factory(max_wait=0, write_back=False)
+    key = int(pipeline["data"].household_keys[0])
+
+    assert scorer.submit(-1).result(timeout=5) is None
+    first = scorer.submit(key).result(timeout=5)
+    assert scorer.submit(key).result(timeout=5) == first
+    assert model.calls == 1
+    # fresh — мимо кэша
+    scorer.submit(key, fresh=True).result(timeout=5)
+    assert model.calls == 2
+
+
+def test_scored_row_is_written_and_served_on_snapshot_miss(
+    pipeline, scorer_factory, run_import, make_recommendations_csv, api_client, monkeypatch
+):
+    run_import(make_recommendations_csv({1: ("A", [10, 11])}))
+    refresh_snapshot()
+    monkeypatch.setattr(api, "SNAPSHOT_MISS_DB", True)
+    monkeypatch.setattr(lookup, "SNAPSHOT_MISS_DB", True)
+    key = int(pipeline["data"].household_keys[0])
+    url = f"/api/v1/recommendations/{key}"
+    assert api_client.get(url, params={"fallback": "false"}).status_code == 404
+
+    scorer, _ = scorer_factory(max_wait=0, write_back=True)
+    payload = scorer.submit(key).result(timeout=5)
+
+    response = api_client.get(url, params={"fallback": "false"})
+    assert response.status_code == 200
+    assert response.json() == json.loads(payload)
+    batch = api_client.post("/api/v1/recommendations:batch", json={"household_keys": [1, key]})
+    assert set(batch.json()["results"]) == {"1", str(key)}
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import fastapi.dependencies.utils
+import fastapi.routing
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import profiling
+from app.profiling import (
+    ProfilingMiddleware,
+    SamplingProfiler,
+    clear_slow_requests,
+    slow_requests,
+    start_slow_request_monitor,
+    trace_threadpool,
+)
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def slow_sync_route():
+    deadline = time.monotonic() + 0.3
+    while time.monotonic() < deadline:
+        sum(range(1000))
+    return {"ok": True}
+
+
+@pytest.fixture
+def traced_app(monkeypatch):
+    monkeypatch.setattr(profiling, "SLOW_REQUEST_THRESHOLD", 0.05)
+    # trace_threadpool подменяет функцию в модулях FastAPI — вернём после теста
+    monkeypatch.setattr(fastapi.routing, "run_in_threadpool", fastapi.routing.run_in_threadpool)
+    monkeypatch.setattr(
+        fastapi.dependencies.utils,
+        "run_in_threadpool",
+        fastapi.dependencies.utils.run_in_threadpool,
+    )
+    trace_threadpool()
+    app = FastAPI()
+    app.add_api_route("/slow", slow_sync_route)
+    app.add_api_route("/fast", lambda: {"ok": True})
+    app.add_middleware(ProfilingMiddleware)
+    clear_slow_requests()
+    stop = start_slow_request_monitor(0.01)
+    yield TestClient(app)
+    stop.set()
+    clear_slow_requests()
+
+
+def test_sampling_profiler_sees_busy_thread():
+    stop = threading.Event()
+    thread = threading.Thread(target=busy_loop, args=(stop,), name="busy")
+    thread.start()
+    profiler = SamplingProfiler(interval=0.005).start()
+    time.sleep(0.2)
+    profiler.stop()
+    stop.set()
+    thread.join()
+
+    assert profiler.samples > 0
+    busy = [line for line in profiler.collapsed().splitlines() if line.startswith("busy;")]
+    assert busy and "busy_loop" in busy[0]
+
+
+def test_slow_sync_route_is_captured_with_threadpool_stack(traced_app):
+    assert traced_app.get("/fast").status_code == 200
+    assert traced_app.get("/slow").status_code == 200
+
+    traces = slow_requests()
+    assert [trace["path"] for trace in traces] == ["/slow"]
+    assert traces[0]["status"] == 200
+    assert traces[0]["seconds"] >= 0.3
+    # Стек снят с потока threadpool, где шёл синхронный маршрут
+    assert "slow_sync_route" in traces[0]["stacks"]
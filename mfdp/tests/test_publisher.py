@@ -0,0 +1,148 @@
+import json
+
+import pytest
+from pika.exceptions import AMQPConnectionError
+
+from app import publisher
+from app.publisher import RECOMMENDATION_QUEUE, QueuePublisher, job_properties
+
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.is_closed = False
+        self.confirms = False
+        self.transactional = False
+        self.pending = []
+
+    def confirm_delivery(self):
+        self.confirms = True
+
+    def tx_select(self):
+        self.transactional = True
+
+    def tx_commit(self):
+        self.connection.broker.commits += 1
+        self.connection.broker.messages.extend(self.pending)
+        self.pending = []
+
+    def queue_declare(self, queue, durable=False):
+        self.connection.broker.declared.append((queue, durable))
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        broker = self.connection.broker
+        if broker.failures:
+            broker.failures -= 1
+            self.connection.is_closed = True
+            raise AMQPConnectionError("соединение оборвано")
+        message = (routing_key, body, properties)
+        if self.transactional:
+            self.pending.append(message)
+        else:
+            broker.confirmed.append(self.confirms)
+            broker.messages.append(message)
+
+
+class FakeConnection:
+    """pika.BlockingConnection поверх брокера в памяти."""
+
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_closed = False
+        broker.connections += 1
+
+    @property
+    def is_open(self):
+        return not self.is_closed
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def process_data_events(self, time_limit=None):
+        pass
+
+    def close(self):
+        self.is_closed = True
+
+
+class Broker:
+    def __init__(self):
+        self.connections = 0
+        self.failures = 0
+        self.commits = 0
+        self.declared = []
+        self.messages = []
+        self.confirmed = []
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker()
+    monkeypatch.setattr(
+        publisher.pika, "BlockingConnection", lambda parameters: FakeConnection(broker)
+    )
+    return broker
+
+
+def test_publish_reuses_connection_with_confirms(broker):
+    queue_publisher = QueuePublisher("amqp://test//")
+
+    for i in range(3):
+        queue_publisher.publish(json.dumps({"user_id": i}))
+
+    assert broker.connections == 1
+    assert broker.declared == [(RECOMMENDATION_QUEUE, True)]
+    assert broker.confirmed == [True, True, True]
+    assert [json.loads(body)["user_id"] for _, body, _ in broker.messages] == [0, 1, 2]
+
+
+def test_publish_without_confirms(broker):
+    QueuePublisher("amqp://test//", confirm=False).publish("{}")
+
+    assert broker.confirmed == [False]
+
+
+def test_publish_reconnects_after_connection_error(broker):
+    queue_publisher = QueuePublisher("amqp://test//")
+    queue_publisher.publish("first")
+    broker.failures = 1
+
+    queue_publisher.publish("second")
+
+    assert broker.connections == 2
+    assert [body for _, body, _ in broker.messages] == ["first", "second"]
+
+
+def test_publish_gives_up_after_retries(broker):
+    broker.failures = publisher.PUBLISH_RETRIES
+
+    with pytest.raises(AMQPConnectionError):
+        QueuePublisher("amqp://test//").publish("lost")
+    assert broker.messages == []
+
+
+def test_batch_is_one_transaction(broker):
+    queue_publisher = QueuePublisher("amqp://test//")
+
+    queue_publisher.publish_batch((f"job-{i}", job_properties(f"id-{i}")) for i in range(5))
+
+    assert broker.commits == 1
+    assert [properties.correlation_id for _, _, properties in broker.messages] == [
+        f"id-{i}" for i in range(5)
+    ]
+    assert all(properties.delivery_mode == 2 for _, _, properties in broker.messages)
+
+
+def test_enqueue_batch_endpoint(api_client, broker, monkeypatch):
+    monkeypatch.setattr(publisher, "_publisher", QueuePublisher("amqp://test//"))
+
+    response = api_client.post("/api/v1/enqueue:batch", json={"user_ids": [3, 4]})
+
+    body = response.json()
+    assert body["count"] == 2
+    published = [json.loads(message) for _, message, _ in broker.messages]
+    assert [(m["user_id"], m["job_id"]) for m in published] == [
+        (3, body["job_ids"]["3"]),
+        (4, body["job_ids"]["4"]),
+    ]
+    assert broker.commits == 1
@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+from app.database import SessionLocal
+from app.models import UserRequest
+from app.requests_api import decode_cursor, encode_cursor, naive_utc
+
+START = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def test_cursor_round_trip():
+    request = UserRequest(id=42, timestamp=datetime(2026, 3, 1, 10, 30, 15, 123456))
+
+    assert decode_cursor(encode_cursor(request)) == (request.timestamp, 42)
+
+
+def test_bad_cursor_is_400():
+    with pytest.raises(HTTPException) as error:
+        decode_cursor("не-курсор")
+    assert error.value.status_code == 400
+
+
+def test_naive_utc():
+    moscow = timezone(timedelta(hours=3))
+
+    assert naive_utc(datetime(2026, 1, 1, 15, 0, tzinfo=moscow)) == datetime(2026, 1, 1, 12, 0)
+    assert naive_utc(datetime(2026, 1, 1, 12, 0, tzinfo=timezone.utc)) == datetime(
+        2026, 1, 1, 12, 0
+    )
+    assert naive_utc(START) is START
+    assert naive_utc(None) is None
+
+
+@pytest.fixture
+def history(pg_db):
+    """11 запросов artem (по два на одну секунду — порядок решает id) и чужой."""
+    db = SessionLocal()
+    try:
+        db.add_all(
+            [
+                UserRequest(
+                    telegram_login="artem",
+                    requested_user_id=i,
+                    request_type="manual",
+                    timestamp=START + timedelta(seconds=i // 2),
+                )
+                for i in range(11)
+            ]
+            + [
+                UserRequest(
+                    telegram_login="other",
+                    requested_user_id=100,
+                    request_type="random",
+                    timestamp=START,
+                )
+            ]
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def read_pages(api_client, limit, **params):
+    pages = []
+    cursor = None
+    while True:
+        query = dict(params, limit=limit)
+        if cursor:
+            query["cursor"] = cursor
+        response = api_client.get("/api/v1/requests/artem/history", params=query)
+        assert response.status_code == 200
+        body = response.json()
+        pages.append([row["requested_user_id"] for row in body["requests"]])
+        cursor = body["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_history_pages_follow_timestamp_and_id(api_client, history):
+    pages = read_pages(api_client, limit=3)
+
+    assert pages == [[10, 9, 8], [7, 6, 5], [4, 3, 2], [1, 0]]
+
+
+def test_history_exact_last_page_has_no_cursor(api_client, history):
+    assert read_pages(api_client, limit=11) == [list(range(10, -1, -1))]
+
+
+def test_history_since_until_with_timezone(api_client, history):
+    # 12:00:01 .. 12:00:04 UTC, заданные в поясе +03:00 и через Z
+    pages = read_pages(
+        api_client,
+        limit=2,
+        since="2026-01-01T15:00:01+03:00",
+        until="2026-01-01T12:00:04Z",
+    )
+
+    assert pages == [[7, 6], [5, 4], [3, 2]]
+
+
+def test_history_cursor_with_timezone_offset(api_client, history):
+    # Курсор со смещением (например, собранный клиентом) — не 500
+    request = UserRequest(
+        id=6, timestamp=datetime(2026, 1, 1, 15, 0, 3, tzinfo=timezone(timedelta(hours=3)))
+    )
+    response = api_client.get(
+        "/api/v1/requests/artem/history", params={"cursor": encode_cursor(request)}
+    )
+
+    assert [row["requested_user_id"] for row in response.json()["requests"]] == [
+        5, 4, 3, 2, 1, 0
+    ]
+
+
+def test_history_bad_cursor(api_client, history):
+    response = api_client.get("/api/v1/requests/artem/history", params={"cursor": "xyz"})
+
+    assert response.status_code == 400
+
+
+def test_last_requests(api_client, history):
+    body = api_client.get("/api/v1/requests/artem").json()
+
+    assert [row["requested_user_id"] for row in body["requests"]] == [10, 9, 8, 7, 6]
+    assert api_client.get("/api/v1/requests/nobody").json() == {
+        "detail": "Запросов не найдено"
+    }
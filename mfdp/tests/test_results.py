@@ -0,0 +1,92 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import results
+from app.results import LocalResultStore
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = LocalResultStore(max_items=100, ttl=60)
+    monkeypatch.setattr(results, "_store", store)
+    return store
+
+
+def put_later(store, job_id, status, body, delay=0.1):
+    timer = threading.Timer(delay, store.put, args=(job_id, status, body))
+    timer.start()
+    return timer
+
+
+def test_store_evicts_oldest_and_expires():
+    store = LocalResultStore(max_items=2, ttl=60)
+    for job_id in ("a", "b", "c"):
+        store.put(job_id, 200, job_id.encode())
+
+    assert store.get("a") is None
+    assert store.get("c") == (200, b"c")
+
+    expiring = LocalResultStore(ttl=0)
+    expiring.put("a", 200, b"{}")
+    time.sleep(0.01)
+    assert expiring.get("a") is None
+
+
+def test_wait_wakes_up_on_put_from_another_thread():
+    store = LocalResultStore()
+    put_later(store, "job", 200, b'{"ok":true}')
+
+    started = time.monotonic()
+    result = asyncio.run(store.wait("job", 5))
+
+    assert result == (200, b'{"ok":true}')
+    assert time.monotonic() - started < 2
+    assert store._waiters == {}
+
+
+def test_wait_times_out_and_forgets_waiter():
+    store = LocalResultStore()
+
+    assert asyncio.run(store.wait("job", 0.05)) is None
+    assert store._waiters == {}
+
+
+def test_job_long_poll(api_client, store):
+    assert api_client.get("/api/v1/jobs/job-1").status_code == 202
+
+    put_later(store, "job-1", 200, b'{"household_key":1}')
+    response = api_client.get("/api/v1/jobs/job-1", params={"wait": 5})
+
+    assert response.status_code == 200
+    assert response.json() == {"household_key": 1}
+
+
+def test_job_error_status_is_passed_through(api_client, store):
+    store.put("job-2", 404, b'{"detail":"User not found"}')
+
+    response = api_client.get("/api/v1/jobs/job-2")
+
+    assert response.status_code == 404
+    assert response.json() == {"detail": "User not found"}
+
+
+def test_job_events_stream_result(api_client, store):
+    put_later(store, "job-3", 200, b'{"household_key":3}')
+
+    response = api_client.get("/api/v1/jobs/job-3/events", params={"timeout": 5})
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith('event: result\ndata: {"household_key":3}\n\n')
+
+
+def test_job_events_error_and_timeout(api_client, store):
+    store.put("job-4", 500, b'{"detail":"boom"}')
+
+    error = api_client.get("/api/v1/jobs/job-4/events").text
+    timeout = api_client.get("/api/v1/jobs/missing/events", params={"timeout": 0.05}).text
+
+    assert error == 'event: error\ndata: {"detail":"boom"}\n\n'
+    assert timeout.endswith("event: timeout\ndata: {}\n\n")
@@ -0,0 +1,186 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from offline.evaluation import load_recommendations_csv
+from offline.scoring import (
+    DEMO_COLUMNS,
+    all_items,
+    generate_recommendation_table,
+    iter_recommendations,
+    load_scoring_data,
+    pair_features,
+    save_scoring_data,
+    score_users,
+    select_top_n,
+    write_recommendations_csv,
+)
+
+
+def reference(pipeline, household_key, n=10):
+    """Пользовательский скоринг с признаками обучения — самосогласованность, не ноутбук."""
+    from tests import notebook_reference as nb
+
+    return nb.recommend_with_training_features(
+        household_key,
+        pipeline["model"],
+        pipeline["enriched_df"],
+        pipeline["user_features"],
+        pipeline["item_features"],
+        pipeline["encoders"],
+        n,
+    )
+
+
+def test_batch_scores_match_per_user_scoring_with_training_features(pipeline):
+    data = pipeline["data"]
+    users = np.arange(len(data.household_keys))
+
+    keys, product_ids, scores = score_users(pipeline["model"], data, users, n=10)
+
+    for key, row_products, row_scores in zip(keys, product_ids, scores):
+        expected_products, catalog_scores = reference(pipeline, key)
+        np.testing.assert_allclose(row_scores, catalog_scores[:10], rtol=1e-6)
+        # Внутри ничьей порядок не определён — товары сверяем только на уникальных скорах
+        unique = [np.sum(np.isclose(catalog_scores, s)) == 1 for s in row_scores]
+        assert list(row_products[unique]) == list(np.asarray(expected_products)[unique])
+
+
+class RecordingModel:
+    def __init__(self, model):
+        self.model = model
+        self.features = None
+
+    def predict(self, features):
+        self.features = features
+        return self.model.predict(features)
+
+
+def test_notebook_inference_differs_only_in_documented_features(pipeline):
+    from tests import notebook_reference as nb
+
+    data = pipeline["data"]
+    enriched = pipeline["enriched_df"]
+    # Пользователь, купивший товары нескольких категорий и брендов, — иначе причуды не видны
+    spread = enriched.groupby("user_id")[["COMMODITY_DESC", "BRAND"]].nunique().min(axis=1)
+    encoded = spread.idxmax()
+    assert spread[encoded] > 1
+    user = np.searchsorted(np.sort(enriched["user_id"].unique()), encoded)
+    model = RecordingModel(pipeline["model"])
+
+    nb.recommend_for_user(
+        data.household_keys[user],
+        model,
+        enriched,
+        pipeline["user_features"],
+        pipeline["item_features"],
+        pipeline["encoders"],
+    )
+    notebook = model.features
+    ours = pair_features(data, np.array([user]), all_items(data, 1))
+    extra = ours.shape[1] - 5
+
+    # Пользователь, товар, покупки и популярность совпадают
+    np.testing.assert_allclose(notebook[:, : extra + 2], ours[:, : extra + 2], rtol=1e-6)
+
+    # Категория и бренд в ноутбуке — покупки товара в первой колонке unstack,
+    # то есть в первой по алфавиту категории (бренде) пользователя
+    bought = enriched[enriched["user_id"] == encoded]
+    for offset, column in ((2, "COMMODITY_DESC"), (3, "BRAND")):
+        first = bought[bought[column] == bought[column].min()]
+        expected = first.groupby("item_id")["QUANTITY"].sum().reindex(data.item_ids, fill_value=0)
+        np.testing.assert_array_equal(notebook[:, extra + offset], expected.to_numpy())
+        assert not np.allclose(notebook[:, extra + offset], ours[:, extra + offset])
+
+    # Ранг в ноутбуке — позиция товара в каталоге, а не ранг покупки
+    np.testing.assert_array_equal(notebook[:, -1], np.arange(1, len(data.item_ids) + 1))
+    assert not np.array_equal(notebook[:, -1], ours[:, -1])
+
+
+def test_rank_ties_follow_item_id_not_column_order(pipeline):
+    data = pipeline["data"]
+    # item_features ноутбука — в порядке первого появления товара, не по item_id
+    assert not np.all(np.diff(data.item_ids) > 0)
+
+    enriched = pipeline["enriched_df"].sort_values("item_id")
+    expected = enriched.groupby("user_id")["QUANTITY"].rank(method="first", ascending=False)
+    rows = np.searchsorted(np.sort(enriched["user_id"].unique()), enriched["user_id"])
+    cols = pd.Index(data.item_ids).get_indexer(enriched["item_id"])
+    got = np.asarray(data.user_rank[rows, cols]).ravel()
+    np.testing.assert_array_equal(got, expected.to_numpy())
+
+
+def test_select_top_n_matches_full_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.random((20, 100)).astype(np.float32)
+
+    positions, top = select_top_n(scores, 7)
+
+    np.testing.assert_array_equal(positions, np.argsort(-scores, axis=1)[:, :7])
+    np.testing.assert_array_equal(top, -np.sort(-scores, axis=1)[:, :7])
+    assert select_top_n(scores, 0)[0].shape == (20, 0)
+
+
+def stack(chunks):
+    parts = list(chunks)
+    return tuple(np.concatenate([part[i] for part in parts]) for i in range(3))
+
+
+def test_pool_and_chunks_do_not_change_result(pipeline):
+    model, data = pipeline["model"], pipeline["data"]
+
+    inline = stack(iter_recommendations(model, data, 10, workers=1))
+    pooled = stack(iter_recommendations(model, data, 10, chunk_pairs=1000, workers=2))
+
+    for a, b in zip(inline, pooled):
+        np.testing.assert_array_equal(a, b)
+    np.testing.assert_array_equal(inline[0], data.household_keys)
+
+
+def test_recommendation_table_has_notebook_layout(pipeline):
+    table = generate_recommendation_table(
+        pipeline["model"],
+        pipeline["enriched_df"],
+        pipeline["user_features"],
+        pipeline["item_features"],
+        pipeline["encoders"],
+        top_n=5,
+        workers=1,
+    )
+
+    assert list(table.columns[:8]) == ["household_key"] + DEMO_COLUMNS
+    assert [f"rec_{i}" for i in range(1, 6)] == list(table.columns[8:13])
+    data = pipeline["data"]
+    _, product_ids, _ = score_users(pipeline["model"], data, np.arange(len(table)), 5)
+    np.testing.assert_array_equal(table["household_key"], data.household_keys)
+    np.testing.assert_array_equal(table[[f"rec_{i}" for i in range(1, 6)]], product_ids)
+    demo = pipeline["enriched_df"].groupby("household_key")[DEMO_COLUMNS].first()
+    assert table[DEMO_COLUMNS].values.tolist() == demo.values.tolist()
+
+
+def test_saved_data_scores_the_same(tmp_path, pipeline):
+    model, data = pipeline["model"], pipeline["data"]
+    out_dir = str(tmp_path / "scoring_data")
+    save_scoring_data(data, out_dir)
+    save_scoring_data(data, out_dir)
+
+    loaded = load_scoring_data(out_dir)
+
+    users = np.arange(5)
+    for a, b in zip(score_users(model, data, users, 10), score_users(model, loaded, users, 10)):
+        np.testing.assert_array_equal(a, b)
+    pd.testing.assert_frame_equal(
+        loaded.demographics, data.demographics.reindex(columns=DEMO_COLUMNS), check_dtype=False
+    )
+
+
+def test_csv_is_written_for_import(tmp_path, pipeline):
+    model, data = pipeline["model"], pipeline["data"]
+    path = str(tmp_path / "recommendations_results.csv")
+
+    assert write_recommendations_csv(path, model, data, 12, workers=1) == len(data.household_keys)
+
+    keys, products = load_recommendations_csv(path)
+    np.testing.assert_array_equal(keys, data.household_keys)
+    np.testing.assert_array_equal(products, score_users(model, data, np.arange(len(keys)), 12)[1])
+    assert {f"score_{i}" for i in range(1, 13)} <= set(pd.read_csv(path, nrows=0).columns)
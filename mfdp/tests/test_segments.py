@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from app import segments
+from app.segments import GLOBAL_SEGMENT, SegmentFallback, compute_segments, refresh_segments
+from app.snapshot import refresh_snapshot
+from app.snapshot_versions import SEGMENTS_TABLE
+from app.utils import render_products
+
+HOUSEHOLDS = {
+    1: ("A", [10, 11, 12]),
+    2: ("A", [11, 13]),
+    3: ("B", [20, 10]),
+}
+SEGMENT_A = "|".join(["A"] * len(segments.SEGMENT_COLUMNS))
+PROFILE_A = {column: "A" for column in segments.SEGMENT_COLUMNS}
+
+
+@pytest.fixture
+def no_segments(monkeypatch):
+    monkeypatch.setattr(segments, "_segments", None)
+
+
+@pytest.fixture
+def imported(run_import, make_recommendations_csv, pg_cursor, no_segments):
+    run_import(make_recommendations_csv(HOUSEHOLDS))
+    return pg_cursor
+
+
+def stored_segments(cursor, snapshot_id=1):
+    cursor.execute(
+        f"SELECT segment_key, households, recommendations FROM {SEGMENTS_TABLE} "
+        "WHERE snapshot_id = %s ORDER BY segment_key",
+        (snapshot_id,),
+    )
+    return cursor.fetchall()
+
+
+def test_import_ranks_segment_products_by_hits_then_places(imported):
+    # 11 есть у обоих в сегменте A; 10 и 13 по одному разу — выше тот, что ближе к началу
+    assert stored_segments(imported) == [
+        (GLOBAL_SEGMENT, 3, [10, 11, 20, 13, 12]),
+        (SEGMENT_A, 2, [11, 10, 13, 12]),
+        ("|".join(["B"] * len(segments.SEGMENT_COLUMNS)), 1, [20, 10]),
+    ]
+
+
+def test_recompute_with_smaller_top_n(imported):
+    assert compute_segments(imported, 1, top_n=2) == 2
+
+    assert [row[2] for row in stored_segments(imported)] == [[10, 11], [11, 10], [20, 10]]
+
+
+def test_lookup_prefers_segment_and_falls_back_to_popular():
+    fallback = SegmentFallback(1, {GLOBAL_SEGMENT: ["popular"], SEGMENT_A: ["a"], "": []})
+
+    assert fallback.lookup(PROFILE_A) == ("segment", ["a"])
+    assert fallback.lookup({"age_desc": "Z"}) == ("popular", ["popular"])
+    assert fallback.lookup({}) == ("popular", ["popular"])
+
+    body, kind = fallback.render(99, PROFILE_A)
+    assert kind == "segment"
+    assert json.loads(body)["fallback"] == "segment"
+    assert json.loads(body)["household_key"] == 99
+    text, _ = fallback.render(99, {}, telegram=True)
+    assert "99" in text
+
+
+def test_refresh_follows_active_snapshot(imported):
+    assert refresh_segments()
+    assert segments.get_segments().version == 1
+    assert not refresh_segments()
+
+
+def test_api_answers_misses_from_segments(api_client, imported):
+    refresh_snapshot()
+    refresh_segments()
+    url = "/api/v1/recommendations/999"
+
+    segment = api_client.get(url, params=PROFILE_A)
+    popular = api_client.get(url)
+
+    assert segment.status_code == 200
+    assert segment.headers["X-Recommendations-Fallback"] == "segment"
+    assert segment.json()["recommendations"] == render_products([11, 10, 13, 12])
+    assert popular.headers["X-Recommendations-Fallback"] == "popular"
+    assert popular.json()["recommendations"] == render_products([10, 11, 20, 13, 12])
+    assert api_client.get(url, params={"fallback": "false"}).status_code == 404
+    # Известное домохозяйство отвечает своим списком, без пометки
+    known = api_client.get("/api/v1/recommendations/1")
+    assert "X-Recommendations-Fallback" not in known.headers
+
+
+def test_api_without_segments_is_404(api_client, imported):
+    refresh_snapshot()
+
+    assert api_client.get("/api/v1/recommendations/999").status_code == 404
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("sklearn")
+
+from offline.similarity import (  # noqa: E402
+    load_neighbours,
+    recommend_user_based,
+    save_neighbours,
+    user_neighbours,
+)
+from tests import notebook_reference as nb  # noqa: E402
+
+K = 5
+
+
+@pytest.fixture(scope="module")
+def interactions():
+    """Матрица ноутбука по сырым покупкам: частоты разные, ничьих по косинусу почти нет."""
+    rng = np.random.default_rng(7)
+    transactions = pd.DataFrame(
+        {
+            "household_key": rng.integers(1, 70, 4000) * 5,
+            "PRODUCT_ID": rng.integers(1, 150, 4000),
+        }
+    )
+    matrix, user_id_map, product_id_map = nb.create_interaction_matrix(transactions)
+    return matrix, user_id_map, product_id_map
+
+
+@pytest.mark.parametrize("workers, block_mb", [(1, 256), (2, 0)])
+def test_neighbours_match_dense_cosine(interactions, workers, block_mb):
+    matrix, user_id_map, _ = interactions
+    keys = np.array(list(user_id_map))
+
+    graph = user_neighbours(matrix, keys, k=K, block_mb=block_mb, workers=workers)
+
+    dense = nb.calculate_user_similarity(matrix)
+    np.fill_diagonal(dense, 0)
+    np.testing.assert_allclose(graph.weights, -np.sort(-dense, axis=1)[:, :K], atol=1e-5)
+    rows = np.arange(len(keys))[:, None]
+    np.testing.assert_allclose(dense[rows, graph.indices], graph.weights, atol=1e-5)
+
+
+def test_recommend_user_based_matches_notebook_votes(interactions):
+    matrix, user_id_map, product_id_map = interactions
+    keys = np.array(list(user_id_map))
+    graph = user_neighbours(matrix, keys, k=K, workers=1)
+    similarity = nb.calculate_user_similarity(matrix)
+    product_ids = np.array(list(product_id_map))
+    users = np.arange(len(keys))
+
+    recommended = recommend_user_based(graph, matrix, users, n=10)
+
+    for user in users:
+        expected = nb.recommend_user_based(
+            keys[user], matrix, similarity, user_id_map, product_id_map, k=K, n=10
+        )
+        neighbours = np.argsort(similarity[user])[::-1][1 : K + 1]
+        votes = pd.Series(np.asarray((matrix[neighbours] > 0).sum(axis=0)).ravel(), product_ids)
+        got = product_ids[recommended[user][recommended[user] >= 0]]
+        # Порядок внутри ничьей в ноутбуке — порядок словаря; сравниваем голоса
+        assert list(votes[got]) == list(votes[expected])
+        assert not set(got) & set(product_ids[matrix[user].indices])
+
+
+def test_saved_graph_is_aligned_to_other_order(tmp_path, interactions):
+    matrix, user_id_map, _ = interactions
+    keys = np.array(list(user_id_map))
+    graph = user_neighbours(matrix, keys, k=K, workers=1)
+    out_dir = str(tmp_path / "neighbours")
+    save_neighbours(graph, out_dir)
+    save_neighbours(graph, out_dir)
+
+    loaded = load_neighbours(out_dir)
+    reversed_keys = keys[::-1].copy()
+    aligned = loaded.align(np.append(reversed_keys, -1))
+
+    assert np.array_equal(aligned.indices[0], len(keys) - 1 - graph.indices[-1])
+    np.testing.assert_allclose(aligned.weights[0], graph.weights[-1])
+    # Неизвестный пользователь — без соседей
+    assert (aligned.indices[-1] == -1).all()
+    # Без выпавших соседей граф тот же
+    assert np.array_equal(loaded.align(keys).indices, graph.indices)
@@ -0,0 +1,194 @@
+import pytest
+
+from app import snapshot_versions as sv
+from app.snapshot import get_snapshot, refresh_snapshot
+
+
+def versions(cursor):
+    cursor.execute(f"SELECT id, status FROM {sv.VERSIONS_TABLE} ORDER BY id")
+    return cursor.fetchall()
+
+
+def served_keys(cursor):
+    cursor.execute(f"SELECT household_key FROM {sv.TABLE} ORDER BY household_key")
+    return [row[0] for row in cursor.fetchall()]
+
+
+def table_exists(cursor, name):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (name,))
+    return cursor.fetchone()[0]
+
+
+@pytest.fixture
+def imports(run_import, make_recommendations_csv):
+    """Импорт CSV, где каждое домохозяйство из keys получает один и тот же список."""
+
+    def run(keys, *flags, name=None):
+        households = {key: ("A", [key * 10, key * 10 + 1]) for key in keys}
+        run_import(make_recommendations_csv(households, name or f"{min(keys)}.csv"), *flags)
+
+    return run
+
+
+def test_import_promotes_and_view_follows_active(imports, pg_cursor):
+    imports([1, 2])
+    assert versions(pg_cursor) == [(1, "active")]
+    assert served_keys(pg_cursor) == [1, 2]
+
+    imports([3], "--no-promote")
+    assert versions(pg_cursor) == [(1, "active"), (2, "loaded")]
+    assert served_keys(pg_cursor) == [1, 2]
+
+    sv.promote(pg_cursor, 2)
+    pg_cursor.connection.commit()
+    assert versions(pg_cursor) == [(1, "loaded"), (2, "active")]
+    assert served_keys(pg_cursor) == [3]
+
+
+def test_reimport_of_active_file_is_skipped(imports, pg_cursor):
+    imports([1, 2], name="same.csv")
+    imports([1, 2], name="same.csv")
+    assert versions(pg_cursor) == [(1, "active")]
+
+    imports([1, 2], "--force", name="same.csv")
+    assert versions(pg_cursor) == [(1, "loaded"), (2, "active")]
+
+
+def test_rollback_follows_activation_order(imports, pg_cursor):
+    imports([1])
+    imports([2])
+    # Загружен, но ни разу не был активным — откат его не выбирает
+    imports([3], "--no-promote")
+
+    assert sv.rollback(pg_cursor) == 1
+    pg_cursor.connection.commit()
+    assert served_keys(pg_cursor) == [1]
+
+    # Следующий откат возвращает снапшот, активный до 1-го, — это 2-й
+    assert sv.rollback(pg_cursor) == 2
+    assert served_keys(pg_cursor) == [2]
+
+
+def test_rollback_without_previous_snapshot(imports, pg_cursor):
+    with pytest.raises(ValueError):
+        sv.rollback(pg_cursor)
+    imports([1])
+    with pytest.raises(ValueError):
+        sv.rollback(pg_cursor)
+
+
+def test_promote_rejects_unusable_snapshots(imports, pg_cursor):
+    imports([1])
+    failed = sv.register_snapshot(pg_cursor, "broken.csv", "0" * 64)
+    sv.mark_failed(pg_cursor, failed)
+    pg_cursor.connection.commit()
+
+    for snapshot_id in (failed, 99):
+        with pytest.raises(ValueError):
+            sv.promote(pg_cursor, snapshot_id)
+        pg_cursor.connection.rollback()
+    # Повторный промоут активного — без изменений
+    sv.promote(pg_cursor, 1)
+    assert versions(pg_cursor) == [(1, "active"), (failed, "failed")]
+
+
+def test_failed_snapshot_loses_its_table(pg_cursor, pg_db):
+    snapshot_id = sv.register_snapshot(pg_cursor, "broken.csv", "0" * 64)
+    pg_cursor.execute(f"CREATE TABLE {sv.snapshot_table_name(snapshot_id)} (x int)")
+    sv.mark_failed(pg_cursor, snapshot_id)
+
+    assert versions(pg_cursor) == [(snapshot_id, "failed")]
+    assert not table_exists(pg_cursor, sv.snapshot_table_name(snapshot_id))
+
+
+def test_garbage_collection_keeps_active_and_recent(imports, pg_cursor):
+    imports([1])
+    for key in range(2, 6):
+        imports([key], "--no-promote")
+    # Импорт сам чистит всё сверх SNAPSHOT_RETENTION=3 неактивных
+    assert versions(pg_cursor)[1] == (2, "deleted")
+
+    assert sv.collect_garbage(pg_cursor, retention=2) == [3]
+    assert versions(pg_cursor) == [
+        (1, "active"),
+        (2, "deleted"),
+        (3, "deleted"),
+        (4, "loaded"),
+        (5, "loaded"),
+    ]
+    for snapshot_id, exists in ((1, True), (2, False), (3, False), (5, True)):
+        assert table_exists(pg_cursor, sv.snapshot_table_name(snapshot_id)) is exists
+    pg_cursor.execute(f"SELECT DISTINCT snapshot_id FROM {sv.SEGMENTS_TABLE} ORDER BY 1")
+    assert [row[0] for row in pg_cursor.fetchall()] == [1, 4, 5]
+
+
+def test_garbage_collection_keeps_rollback_target(imports, pg_cursor):
+    imports([1])
+    imports([2])
+    # Четыре импорта без промоута не вытесняют 1-й — единственную цель отката
+    for key in range(3, 7):
+        imports([key], "--no-promote")
+
+    assert versions(pg_cursor) == [
+        (1, "loaded"),
+        (2, "active"),
+        (3, "deleted"),
+        (4, "loaded"),
+        (5, "loaded"),
+        (6, "loaded"),
+    ]
+    assert sv.collect_garbage(pg_cursor, retention=0) == [6, 5, 4]
+    assert sv.rollback(pg_cursor) == 1
+    assert served_keys(pg_cursor) == [1]
+
+
+def insert_live_rows(cursor, keys):
+    cursor.executemany(
+        f"INSERT INTO {sv.TABLE} (household_key, recommendations) VALUES (%s, %s)",
+        [(key, [key]) for key in keys],
+    )
+
+
+def test_populated_live_table_is_adopted(imports, pg_cursor):
+    # База без миграций: живая таблица из create_all с данными
+    insert_live_rows(pg_cursor, [7, 8])
+    pg_cursor.connection.commit()
+
+    imports([1])
+    # Живая таблица становится снапшотом при первом промоуте — после регистрации нового
+    assert versions(pg_cursor) == [(1, "active"), (2, "loaded")]
+    assert served_keys(pg_cursor) == [1]
+    pg_cursor.execute(f"SELECT source_file, row_count FROM {sv.VERSIONS_TABLE} WHERE id = 2")
+    assert pg_cursor.fetchone() == ("legacy", 2)
+
+    assert sv.rollback(pg_cursor) == 2
+    assert served_keys(pg_cursor) == [7, 8]
+
+
+def test_empty_or_outdated_live_table_is_dropped(imports, pg_cursor):
+    # Таблица старой схемы, без кандидатов и готовых ответов
+    pg_cursor.execute(f"ALTER TABLE {sv.TABLE} DROP COLUMN payload")
+    insert_live_rows(pg_cursor, [7])
+    pg_cursor.connection.commit()
+
+    imports([1])
+    assert versions(pg_cursor) == [(1, "active")]
+    assert served_keys(pg_cursor) == [1]
+    with pytest.raises(ValueError):
+        sv.rollback(pg_cursor)
+
+
+def test_service_snapshot_follows_promote_and_rollback(imports, pg_cursor):
+    imports([1, 2])
+    assert refresh_snapshot()
+    assert get_snapshot().version == 1
+    assert not refresh_snapshot()
+
+    imports([3])
+    assert refresh_snapshot()
+    assert (get_snapshot().version, list(get_snapshot().keys)) == (2, [3])
+
+    sv.rollback(pg_cursor)
+    pg_cursor.connection.commit()
+    assert refresh_snapshot()
+    assert (get_snapshot().version, list(get_snapshot().keys)) == (1, [1, 2])
@@ -0,0 +1,252 @@
+"""Скоринг XGBRanker по запросу для домохозяйств, которых нет в снапшоте.
+
+Модель (xgb_ranker_model.pkl из ноутбука) и признаки (python -m offline.scoring
+... --save-data, массивы отображаются в память) загружаются один раз при
+старте воркера. Запросы всех консьюмеров собираются в микро-пачки: до
+ONDEMAND_BATCH_USERS домохозяйств или ONDEMAND_MAX_WAIT секунд ожидания;
+на пачку — один predict и векторный top-N (offline.scoring.score_users).
+Результат пишется строкой активного снапшота (upsert через представление
+user_recommendations) и кэшируется в процессе.
+
+Скорить можно только домохозяйства с признаками в данных пайплайна,
+остальные по-прежнему получают 404. Нужны зависимости requirements-offline.txt.
+"""
+import os
+import pickle
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+from app.metrics import ONDEMAND_SCORING_SECONDS, ONDEMAND_SCORING_USERS
+
+ONDEMAND_SCORING = os.getenv("ONDEMAND_SCORING", "0") == "1"
+RANKER_MODEL_PATH = os.getenv("RANKER_MODEL_PATH", "data/xgb_ranker_model.pkl")
+ONDEMAND_MAX_WAIT = float(os.getenv("ONDEMAND_MAX_WAIT", "0.02"))  # секунд
+# Домохозяйств в микро-пачке; 0 — сколько помещается в SCORING_CHUNK_PAIRS пар
+ONDEMAND_BATCH_USERS = int(os.getenv("ONDEMAND_BATCH_USERS", "0"))
+ONDEMAND_TIMEOUT = float(os.getenv("ONDEMAND_TIMEOUT", "10"))  # ожидание результата
+ONDEMAND_CACHE_SIZE = int(os.getenv("ONDEMAND_CACHE_SIZE", "100000"))
+# Скорить кандидатов (offline.candidates), а не весь каталог
+ONDEMAND_CANDIDATES = os.getenv("ONDEMAND_CANDIDATES", "1") == "1"
+ONDEMAND_WRITE_BACK = os.getenv("ONDEMAND_WRITE_BACK", "1") == "1"
+
+_STOP = object()
+
+
+class OnDemandScorer:
+    """Микро-пакетный скоринг в фоновом потоке.
+
+    submit() кладёт домохозяйство в очередь и сразу отдаёт Future; поток
+    забирает из очереди всё, что пришло за max_wait, и скорит одним predict.
+    Результат Future — готовое JSON-тело ответа или None, если скорить нечем.
+    """
+
+    def __init__(
+        self,
+        model,
+        data,
+        generator=None,
+        n: Optional[int] = None,
+        batch_users: int = ONDEMAND_BATCH_USERS,
+        max_wait: float = ONDEMAND_MAX_WAIT,
+        write_back: bool = ONDEMAND_WRITE_BACK,
+    ):
+        from offline.scoring import SCORING_CHUNK_PAIRS, SCORING_TOP_N
+
+        self.model = model
+        self.data = data
+        self.generator = generator
+        self.n = n or SCORING_TOP_N
+        per_user = generator.size if generator is not None else len(data.item_ids)
+        # Размер пачки ограничен памятью матрицы признаков, как чанки офлайн-скоринга
+        self.batch_users = batch_users or max(1, SCORING_CHUNK_PAIRS // max(per_user, 1))
+        self.max_wait = max_wait
+        self.write_back = write_back
+
+        keys = np.asarray(data.household_keys)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+        self._queue = queue.Queue()
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="ondemand-scorer", daemon=True)
+        self._thread.start()
+
+    def row(self, household_key: int) -> int:
+        """Строка домохозяйства в ScoringData; -1 — признаков нет."""
+        pos = int(np.searchsorted(self._sorted_keys, household_key))
+        if pos < len(self._sorted_keys) and self._sorted_keys[pos] == household_key:
+            return int(self._order[pos])
+        return -1
+
+    def submit(self, household_key: int, fresh: bool = False) -> Future:
+        future = Future()
+        if not fresh:
+            cached = self._cached(household_key)
+            if cached is not None:
+                future.set_result(cached)
+                return future
+        row = self.row(household_key)
+        if row < 0:
+            future.set_result(None)
+        else:
+            self._queue.put((row, future))
+        return future
+
+    def score(self, household_keys: Iterable[int], fresh=()) -> Dict[int, Optional[bytes]]:
+        """Готовые тела ответов для ключей; None — не найден или скоринг не уложился в таймаут."""
+        futures = {key: self.submit(key, key in fresh) for key in household_keys}
+        deadline = time.monotonic() + ONDEMAND_TIMEOUT
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except Exception as e:
+                print(f"Скоринг по запросу для {key} не удался: {e}")
+                results[key] = None
+        return results
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join(timeout=ONDEMAND_TIMEOUT)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_users:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            try:
+                self._score_batch(batch)
+            except Exception as e:
+                # Поток скоринга не должен умереть: ожидающие получат ошибку
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            if stopping:
+                return
+
+    def _score_batch(self, batch):
+        rows = np.unique([row for row, _ in batch])
+        with ONDEMAND_SCORING_SECONDS.time():
+            try:
+                records = self.score_rows(rows)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                return
+            if self.write_back:
+                # Ответ отдаём и без записи: строка появится при следующем запросе
+                try:
+                    self.store(records)
+                except Exception as e:
+                    print(f"Не удалось записать {len(records)} строк скоринга в БД: {e}")
+        ONDEMAND_SCORING_USERS.observe(len(rows))
+
+        payloads = {record["household_key"]: record["payload"] for record in records}
+        self._remember(payloads)
+        keys = self.data.household_keys
+        for row, future in batch:
+            future.set_result(payloads.get(int(keys[row])))
+
+    def score_rows(self, rows: np.ndarray):
+        """Строки user_recommendations для строк ScoringData — в формате import_csv."""
+        from import_csv import parse_row, render_chunk
+        from offline.scoring import csv_header, iter_rows, score_users
+
+        chunk = score_users(self.model, self.data, rows, self.n, self.generator)
+        header = csv_header(self.n)
+        rec_columns = [f"rec_{i + 1}" for i in range(self.n)]
+        score_columns = [f"score_{i + 1}" for i in range(self.n)]
+        records = [
+            parse_row(dict(zip(header, values)), rec_columns, score_columns)
+            for values in iter_rows(self.data, [chunk])
+        ]
+        render_chunk(records)
+        return records
+
+    def store(self, records):
+        """Upsert в активный снапшот: представление user_recommendations обновляемое."""
+        from sqlalchemy.dialects.postgresql import insert
+
+        from app.database import get_engine
+        from app.models import UserRecommendation
+
+        table = UserRecommendation.__table__
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.household_key],
+            set_={
+                column.name: statement.excluded[column.name]
+                for column in table.columns
+                if not column.primary_key
+            },
+        )
+        columns = [column.name for column in table.columns]
+        with get_engine().begin() as connection:
+            connection.execute(
+                statement, [{name: record[name] for name in columns} for record in records]
+            )
+
+    def _cached(self, household_key: int) -> Optional[bytes]:
+        with self._cache_lock:
+            payload = self._cache.get(household_key)
+            if payload is not None:
+                self._cache.move_to_end(household_key)
+            return payload
+
+    def _remember(self, payloads: Dict[int, bytes]):
+        with self._cache_lock:
+            for key, payload in payloads.items():
+                self._cache[key] = payload
+                self._cache.move_to_end(key)
+            while len(self._cache) > ONDEMAND_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+
+_scorer: Optional[OnDemandScorer] = None
+
+
+def start_ondemand_scorer() -> Optional[OnDemandScorer]:
+    """Загружает модель и признаки один раз на процесс; без ONDEMAND_SCORING=1 — None."""
+    global _scorer
+    if not ONDEMAND_SCORING:
+        return None
+    from offline.scoring import SCORING_DATA_DIR, load_scoring_data
+
+    started = time.perf_counter()
+    with open(RANKER_MODEL_PATH, "rb") as f:
+        model = pickle.load(f)
+    data = load_scoring_data(SCORING_DATA_DIR)
+    generator = None
+    if ONDEMAND_CANDIDATES:
+        from offline.candidates import CandidateGenerator
+
+        generator = CandidateGenerator(data)
+    _scorer = OnDemandScorer(model, data, generator)
+    print(
+        f"Скоринг по запросу: {len(data.household_keys)} домохозяйств с признаками, "
+        f"пачка до {_scorer.batch_users}, ожидание {_scorer.max_wait * 1000:.0f} мс, "
+        f"загрузка {time.perf_counter() - started:.1f} с"
+    )
+    return _scorer
+
+
+def get_scorer() -> Optional[OnDemandScorer]:
+    return _scorer